@@ -1,45 +1,121 @@
-import duckdb, pandas as pd, pathlib, re
+import duckdb, pandas as pd, pathlib, re, time
+from services.anomaly import METRICS, current_anomalies, is_tracked, update_anomalies
+from services.catalog import get_catalog
+from services.ingest import run_ingestion
+from services import lineage
+from services.nl2sql import CONFIDENCE_THRESHOLD, match_intent
+from services.quality import load_profile, profile_tables
+from services.query_examples import get_store
+from services.query_log import get_log
+from services.schema_index import nl2sql_prompt
+from services.snapshots import (current_version, needs_snapshot_connection, resolve_version, restore_snapshot,
+                                snapshot_connection)
+from services.sql_repair import repair
+from services.workflow import run_workflow
 
 class FCLMAgent:
-    def __init__(self, db_path):
-        self.con = duckdb.connect(db_path, read_only=True)
+    def __init__(self, db_path, con=None):
+        # A borrowed connection (e.g. a Streamlit session cursor, lib/resources.py) is left to its owner
+        self.owns_con = con is None
+        self.con = duckdb.connect(db_path, read_only=True) if con is None else con
         self.db_path = db_path
 
     def nl2sql(self, question, llm_func):
         """
         Use an LLM function to convert NL to SQL. llm_func should accept a prompt and return SQL.
+        Common questions are answered by the rule-based intent matcher, and questions already answered
+        by validated SQL reuse it, without calling it.
         """
-        prompt = f"Convert this business question to SQL for DuckDB: {question}"
-        sql = llm_func(prompt)
+        match = match_intent(question, get_catalog(self.con, self.db_path))
+        if match and match["confidence"] >= CONFIDENCE_THRESHOLD:
+            return match["sql"]
+        example = get_store().lookup(question)
+        if example is not None:
+            return example["sql"]
+        # Only the tables/columns relevant to the question go into the prompt (services/schema_index.py)
+        sql = llm_func(nl2sql_prompt(question, con=self.con, db_path=self.db_path)["prompt"])
         return sql
 
-    def run_query(self, sql):
+    def check_sql(self, sql, llm_func=None):
+        """
+        Bind SQL with EXPLAIN and repair bad table/column names (services/sql_repair.py).
+        llm_func, if given, gets a repair prompt when the catalog alone cannot fix the error.
+        """
+        return repair(sql, con=self.con, catalog=get_catalog(self.con, self.db_path), llm_fix=llm_func)
+
+    def run_query(self, sql, as_of=None, question=None, validate=True):
+        """
+        Run SQL and append it to the query log; with ``question``, the outcome is also recorded
+        as a few-shot example (services/query_examples.py). With ``validate``, the SQL is checked
+        and locally repaired first, so bad names fail without a scan.
+        """
+        start = time.perf_counter()
         try:
-            result = self.con.execute(sql).fetchdf()
-            return result
+            # Without as_of, queries follow the served version, which restore_snapshot may have moved
+            version = resolve_version(as_of) if as_of else current_version()
+            on_snapshot = needs_snapshot_connection(version)
+            if validate and not on_snapshot:
+                checked = self.check_sql(sql)
+                sql = checked["sql"]
+                if not checked["valid"]:
+                    raise ValueError(checked["error"])
+            if on_snapshot:
+                con = snapshot_connection(version)
+                try:
+                    result = con.execute(sql).fetchdf()
+                finally:
+                    con.close()
+            else:
+                result = self.con.execute(sql).fetchdf()
         except Exception as e:
+            if question:
+                get_store().record(question, sql, success=False, source="agent")
+            get_log().log(question, sql, source="agent", latency_ms=(time.perf_counter() - start) * 1e3, error=e)
             return f"Error: {e}"
+        latency_ms = (time.perf_counter() - start) * 1e3
+        if question:
+            get_store().record(question, sql, success=True, latency_ms=latency_ms, row_count=len(result), source="agent")
+        get_log().log(question, sql, source="agent", latency_ms=latency_ms, row_count=len(result))
+        return result
 
-    def data_quality_check(self, table):
+    def data_quality_check(self, table=None):
         """
-        Check for missing values in all columns of a table.
+        Per-column DQ profile (nulls, IQR/z-score outliers, type conformity, duplicate keys)
+        over all rows of a table, or of every table when none is given.
         """
-        sql = f"SELECT COUNT(*) AS total_rows, " + ", ".join([
-            f"SUM(CASE WHEN {col} IS NULL THEN 1 ELSE 0 END) AS {col}_missing"
-            for col in self.con.execute(f"PRAGMA table_info('{table}')").fetchdf()['name']
-        ]) + f" FROM {table}"
-        return self.run_query(sql)
+        try:
+            profile = load_profile(self.con, table)
+            if profile.empty:
+                # Nothing stored yet (read-only connection): profile now without saving
+                profile = profile_tables(self.con, [table] if table else None, incremental=False, store=False)
+            return profile
+        except Exception as e:
+            return f"Error: {e}"
 
     def refresh_data(self, raw_dir="data/raw"):
-        """Re-ingest all CSVs from raw_dir into DuckDB."""
-        RAW = pathlib.Path(raw_dir)
-        for csv_path in RAW.glob("*.csv"):
-            table = re.sub(r"[^a-z0-9_]", "_", csv_path.stem.lower())
-            self.con.execute(f"""
-                CREATE OR REPLACE TABLE {table} AS
-                SELECT * FROM read_csv_auto('{csv_path.as_posix()}', header=True, sample_size=-1);
-            """)
-        return "✅ Data refresh complete."
+        """Re-ingest all CSVs from raw_dir into DuckDB and snapshot the result."""
+        # The ingest needs a write connection, so release ours while it runs
+        if self.owns_con:
+            self.con.close()
+        try:
+            result = run_ingestion(self.db_path, raw_dir)
+        finally:
+            if self.owns_con:
+                self.con = duckdb.connect(self.db_path, read_only=True)
+        return f"✅ Data refresh complete (snapshot {result['version']})."
+
+    def restore_snapshot(self, as_of):
+        """Serve queries from an earlier snapshot (version id or ISO timestamp)."""
+        version = restore_snapshot(resolve_version(as_of))
+        return f"✅ Restored snapshot {version}."
+
+    def trace_lot(self, lot_id, stage=None):
+        """Lineage summary of a lot plus its raw rows per process stage (cure, gas, o2)."""
+        try:
+            return {"summary": lineage.lot_summary(lot_id, con=self.con),
+                    "rows": lineage.lot_rows(lot_id, stage, con=self.con)}
+        except Exception as e:
+            return f"Error: {e}"
 
     def export_data(self, table, fmt="csv", out_dir="outputs"):
         """Export a table to CSV, Excel, or Parquet."""
@@ -75,40 +151,41 @@ class FCLMAgent:
         }
         return workflows.get(workflow_name, ["Workflow not found."])
 
-    def monitor_anomalies(self, table, column):
-        """Detect simple outliers (z-score > 3) in a numeric column."""
-        sql = f"""
-        SELECT {column}, AVG({column}) AS mean, STDDEV_SAMP({column}) AS std
-        FROM {table}
-        WHERE {column} IS NOT NULL
+    def monitor_anomalies(self, table, column=None, machine=None, limit=100):
         """
-        stats = self.run_query(sql)
-        if isinstance(stats, pd.DataFrame) and not stats.empty:
-            mean = stats['mean'][0]
-            std = stats['std'][0]
-            outlier_sql = f"""
-            SELECT * FROM {table}
-            WHERE ABS({column} - {mean}) > 3 * {std}
-            """
-            return self.run_query(outlier_sql)
-        return stats
+        Current outliers per Machine_ID (Welford, EWMA and rolling z-scores > 3), read from
+        the state kept up to date by ingestion. Only columns without state are scored on the fly;
+        a tracked column with no current outliers returns an empty frame.
+        """
+        try:
+            anomalies = current_anomalies(self.con, table, column, machine, limit)
+            if anomalies.empty and not is_tracked(self.con, table, column):
+                anomalies = update_anomalies(self.con, [table], [column] if column else METRICS,
+                                             backfill=True, store=False)
+                if machine is not None and not anomalies.empty:
+                    anomalies = anomalies[anomalies["machine_id"] == machine]
+                anomalies = anomalies.tail(limit)
+            return anomalies
+        except Exception as e:
+            return f"Error: {e}"
 
     def integrate_external_api(self, api_name, params):
         """Stub for external API integration (Power BI, SAP, etc.)."""
         # Implement actual API calls here
         return f"Called external API '{api_name}' with params {params}"
 
-    def multi_step_task(self, steps):
-        """Orchestrate multi-step agent actions."""
-        results = []
-        for step in steps:
-            action = step.get("action")
-            args = step.get("args", {})
-            if hasattr(self, action):
-                results.append(getattr(self, action)(**args))
-            else:
-                results.append(f"Unknown action: {action}")
-        return results
+    def run_workflow(self, steps, max_workers=4, use_cache=True):
+        """
+        Run steps as a dependency graph (see services.workflow): independent steps in parallel,
+        "$step_id" arguments bound to upstream outputs. Returns results, timings and cache hits.
+        """
+        return run_workflow(self, steps, max_workers, use_cache)
+
+    def multi_step_task(self, steps, max_workers=4):
+        """Orchestrate multi-step agent actions; returns each step's result in the given order."""
+        report = self.run_workflow(steps, max_workers)
+        return [r.to_pandas() if hasattr(r, "to_pandas") else r
+                for r in (report["results"][k] for k in report["order"])]
 
 # Example usage (replace llm_func with your LLM call):
 # agent = FCLMAgent('db/fclm.duckdb')
@@ -116,9 +193,10 @@ class FCLMAgent:
 # result = agent.run_query(sql)
 # dq = agent.data_quality_check('cure_table1')
 # agent.refresh_data()
+# agent.restore_snapshot('2025-08-01T00:00:00')
 # agent.export_data('cure_table1', fmt='xlsx')
 # guide = agent.guide_workflow('monthly_failures')
-# anomalies = agent.monitor_anomalies('cure_table1', 'failure_rate')
+# anomalies = agent.monitor_anomalies('cure_table1', 'RTD1_Temp_C')
 # api_response = agent.integrate_external_api('PowerBI', {'param1': 'value1'})
 # multi_step_results = agent.multi_step_task([
 #     {"action": "nl2sql", "args": {"question": "Show monthly failures by machine", "llm_func": llm_func}},
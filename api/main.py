@@ -2,21 +2,55 @@
 Power BI Integration Agent API
 - FastAPI app with CORS, API-key auth, and all required endpoints
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Any
 import logging
 import os
 import re
-from services.nl2sql import nl2sql_with_guardrails
+import threading
+import time
+from services.nl2sql import UnboundSQL, nl2sql_with_guardrails
 from services.db import safe_execute_select
 from services.exporter import export_df
+from services import rollups, snapshots, speculative, sql_repair, timeseries
+from services.db import connect
+from services.query_log import SYNTHETIC_SOURCES, get_log
+from services.streaming import read_metrics
+from services.versioning import data_version
 
 API_KEY = os.getenv("API_KEY", "demo-key")
 OUTPUTS_DIR = "outputs"
+WARM_UP_QUERIES = int(os.getenv("WARM_UP_QUERIES", "10"))
 
-app = FastAPI(title="Power BI Integration Agent")
+def warm_up(limit: int = WARM_UP_QUERIES):
+    """Translate and run the most frequent logged questions so catalogs, indexes and DuckDB's cache are warm."""
+    for entry in get_log().frequent(limit, exclude_sources=SYNTHETIC_SOURCES):
+        try:
+            safe_execute_select(nl2sql_with_guardrails(entry["question"])["sql"])
+        except Exception as e:
+            logging.getLogger("uvicorn.error").warning(f"Warm-up of '{entry['question']}' failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app):
+    if WARM_UP_QUERIES:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+
+app = FastAPI(title="Power BI Integration Agent", lifespan=lifespan)
+
+@app.exception_handler(snapshots.UnknownSnapshot)
+async def unknown_snapshot_handler(request: Request, exc: snapshots.UnknownSnapshot):
+    """An ``as_of`` naming no snapshot is a missing resource on every endpoint, not a server error."""
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+@app.exception_handler(UnboundSQL)
+async def unbound_sql_handler(request: Request, exc: UnboundSQL):
+    """Generated SQL the repair loop could not bind: the question cannot be answered as asked."""
+    return JSONResponse(status_code=422, content={"detail": str(exc)})
 
 # Enable CORS for Power BI Desktop
 app.add_middleware(
@@ -27,6 +61,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def log_source(request: Request, default: str) -> str:
+    """Query log source of a request; load tests send X-Query-Source: benchmark."""
+    return request.headers.get("X-Query-Source") or default
+
 # Simple API-key header auth
 def get_api_key(request: Request):
     key = request.headers.get("X-API-Key")
@@ -35,7 +73,7 @@ def get_api_key(request: Request):
     return key
 
 class NL2SQLRequest(BaseModel):
-    question: str = Field(..., example="Show monthly failures by machine")
+    question: str = Field(..., examples=["Show monthly failures by machine"])
 
 class NL2SQLResponse(BaseModel):
     sql: str
@@ -44,6 +82,7 @@ class NL2SQLResponse(BaseModel):
 
 class QueryRequest(BaseModel):
     sql: str
+    as_of: Optional[str] = Field(None, examples=["2025-08-01T00:00:00"])
 
 class QueryResponse(BaseModel):
     rows: List[Any]
@@ -51,6 +90,7 @@ class QueryResponse(BaseModel):
 
 class PowerBIQueryRequest(BaseModel):
     question: str
+    as_of: Optional[str] = None
 
 class PowerBIQueryResponse(BaseModel):
     sql: str
@@ -61,7 +101,8 @@ class PowerBIQueryResponse(BaseModel):
 
 class ExportRequest(BaseModel):
     question: str
-    format: str = Field(..., regex="^(csv|parquet|xlsx)$")
+    format: str = Field(..., pattern="^(csv|parquet|xlsx)$")
+    as_of: Optional[str] = None
 
 class ExportResponse(BaseModel):
     path: str
@@ -74,36 +115,115 @@ class RefreshResponse(BaseModel):
     path: str
     rowcount: int
 
+class KPIRequest(BaseModel):
+    name: str = Field(..., examples=["failures_by_machine"])
+    table: Optional[str] = Field(None, examples=["cure_table1"])
+    start: Optional[str] = Field(None, examples=["2025-08-01"])
+    end: Optional[str] = None
+
+class KPIResponse(BaseModel):
+    rows: List[Any]
+    columns: List[str]
+
+class TimeSeriesRequest(BaseModel):
+    table: str = Field(..., examples=["o2_gas_data_fclm"])
+    time_column: str = Field(..., examples=["DateTime"])
+    value_column: Optional[str] = Field(None, examples=["O2_Purity_%"])
+    start: Optional[str] = Field(None, examples=["2025-08-01"])
+    end: Optional[str] = None
+    width_px: int = timeseries.WIDTH_PX
+    mode: str = "minmax"
+    as_of: Optional[str] = None
+
+class TimeSeriesResponse(BaseModel):
+    points: List[Any]
+    bucket: Optional[str]
+    rows: int
+    mode: str
+
+class SnapshotInfo(BaseModel):
+    version: str
+    created_at: str
+    tables: List[str]
+
+class SnapshotListResponse(BaseModel):
+    current: Optional[str]
+    live: Optional[str]
+    versions: List[SnapshotInfo]
+
+class RestoreRequest(BaseModel):
+    as_of: str = Field(..., examples=["20250801T080000000000Z"])
+
+class RestoreResponse(BaseModel):
+    current: str
+
 @app.post("/nl2sql", response_model=NL2SQLResponse, tags=["nl2sql"])
 def nl2sql_endpoint(req: NL2SQLRequest, api_key: str = Depends(get_api_key)):
     """Translate NL question to SQL with guardrails."""
     result = nl2sql_with_guardrails(req.question)
     return result
 
+@app.get("/nl2sql/metrics", tags=["nl2sql"])
+def nl2sql_metrics_endpoint(api_key: str = Depends(get_api_key)):
+    """EXPLAIN validation and repair outcomes for generated SQL."""
+    return sql_repair.metrics()
+
 @app.post("/query", response_model=QueryResponse, tags=["query"])
-def query_endpoint(req: QueryRequest, api_key: str = Depends(get_api_key)):
+def query_endpoint(req: QueryRequest, request: Request, api_key: str = Depends(get_api_key)):
     """Execute SELECT-only SQL and return rows."""
-    df = safe_execute_select(req.sql)
+    start = time.perf_counter()
+    try:
+        df = safe_execute_select(req.sql, as_of=req.as_of)
+    except Exception as e:
+        get_log().log(sql=req.sql, user=request.headers.get("X-User"), source=log_source(request, "query"), error=e,
+                      latency_ms=(time.perf_counter() - start) * 1e3)
+        raise
+    get_log().log(sql=req.sql, user=request.headers.get("X-User"), source=log_source(request, "query"),
+                  latency_ms=(time.perf_counter() - start) * 1e3, row_count=len(df))
     return {"rows": df.to_dict(orient="records"), "columns": list(df.columns)}
 
 @app.post("/powerbi/query", response_model=PowerBIQueryResponse, tags=["powerbi"])
-def powerbi_query_endpoint(req: PowerBIQueryRequest, api_key: str = Depends(get_api_key)):
-    """Power BI DirectQuery: NL→SQL→Query→rows."""
-    nl2sql_result = nl2sql_with_guardrails(req.question)
-    df = safe_execute_select(nl2sql_result["sql"])
-    return {
-        "sql": nl2sql_result["sql"],
-        "rationale": nl2sql_result["rationale"],
-        "viz_hints": nl2sql_result["viz_hints"],
-        "rows": df.to_dict(orient="records"),
-        "columns": list(df.columns)
-    }
+def powerbi_query_endpoint(req: PowerBIQueryRequest, request: Request, api_key: str = Depends(get_api_key)):
+    """Power BI DirectQuery: NL→SQL→Query→rows, with the likely SQL running while the LLM translates."""
+    return speculative.query(req.question, as_of=req.as_of, user=request.headers.get("X-User"),
+                             source=log_source(request, "powerbi"))
+
+@app.get("/powerbi/speculation", tags=["powerbi"])
+def speculation_metrics_endpoint(api_key: str = Depends(get_api_key)):
+    """Speculative execution hit rate and wasted/saved query time."""
+    return speculative.metrics()
+
+@app.post("/kpi", response_model=KPIResponse, tags=["kpi"])
+def kpi_endpoint(req: KPIRequest, api_key: str = Depends(get_api_key)):
+    """Failures by machine, throughput and status KPIs from the pre-aggregated rollups."""
+    try:
+        df = rollups.kpi(req.name, req.table, req.start, req.end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"rows": df.to_dict(orient="records"), "columns": list(df.columns)}
+
+@app.post("/timeseries", response_model=TimeSeriesResponse, tags=["timeseries"])
+def timeseries_endpoint(req: TimeSeriesRequest, api_key: str = Depends(get_api_key)):
+    """Time-bucketed, downsampled series: at most width_px points whatever the number of rows."""
+    con = connect(req.as_of)
+    try:
+        result = timeseries.series(con, req.table, req.time_column, req.value_column, req.start, req.end,
+                                   req.width_px, req.mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        con.close()
+    points = result["points"].assign(time=lambda d: d["time"].astype(str))
+    return {"points": points.to_dict(orient="records"), "bucket": result["bucket"], "rows": result["rows"],
+            "mode": result["mode"]}
 
 @app.post("/export", response_model=ExportResponse, tags=["export"])
 def export_endpoint(req: ExportRequest, api_key: str = Depends(get_api_key)):
     """Export NL→SQL results to file."""
     nl2sql_result = nl2sql_with_guardrails(req.question)
-    df = safe_execute_select(nl2sql_result["sql"])
+    df = safe_execute_select(nl2sql_result["sql"], as_of=req.as_of)
     slug = re.sub(r"[^a-z0-9_]+", "_", req.question.lower())[:32]
     out_path = os.path.join(OUTPUTS_DIR, f"{slug}.{req.format}")
     export_df(df, out_path, req.format)
@@ -116,6 +236,30 @@ def refresh_endpoint(req: RefreshRequest, api_key: str = Depends(get_api_key)):
     # TODO: Implement job tracking and lookup
     raise HTTPException(status_code=501, detail="Not implemented")
 
+@app.get("/snapshots", response_model=SnapshotListResponse, tags=["snapshots"])
+def snapshots_endpoint(api_key: str = Depends(get_api_key)):
+    """List data snapshots and the version currently served."""
+    return snapshots.load_manifest()
+
+@app.post("/snapshots/restore", response_model=RestoreResponse, tags=["snapshots"])
+def restore_endpoint(req: RestoreRequest, api_key: str = Depends(get_api_key)):
+    """Serve queries from an earlier snapshot (version id or ISO timestamp)."""
+    try:
+        version = snapshots.restore_snapshot(snapshots.resolve_version(req.as_of))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"current": version}
+
+@app.get("/usage", tags=["usage"])
+def usage_endpoint(days: int = 30, api_key: str = Depends(get_api_key)):
+    """Query log analytics: per-day usage plus the most frequent questions."""
+    return {"daily": get_log().usage(days).to_dict(orient="records"), "frequent": get_log().frequent(10, days=days)}
+
+@app.get("/ingest/metrics", tags=["ingest"])
+def ingest_metrics_endpoint(api_key: str = Depends(get_api_key)):
+    """Streaming ingestion lag/throughput metrics and the current data version."""
+    return {"data_version": data_version(), **read_metrics()}
+
 # Add logging
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
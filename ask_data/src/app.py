@@ -5,10 +5,13 @@ import nl_to_sql
 import chart_picker
 import settings
 from tenacity import retry, stop_after_attempt, wait_fixed
-import diskcache
+import time
+# db puts the project root on sys.path
+from services.query_examples import get_store
+from services.query_log import get_log
 
-# Disk cache for schema and query results
-cache = diskcache.Cache(".askdata_cache")
+# Signed-in user when Streamlit authentication is configured
+user = st.user.get("email")
 
 
 # --- Welcome Banner / Hero Section ---
@@ -59,23 +62,20 @@ def sidebar():
     st.sidebar.header("Settings")
     st.sidebar.write(f"**DB Engine:** {settings.DB_ENGINE}")
     if st.sidebar.button("Refresh Schema"):
-        cache.pop("schema", None)
+        db.invalidate_schema()
     safe_mode = st.sidebar.checkbox("Safe Mode", value=settings.SAFE_MODE)
-    history = cache.get("history", [])
+    # Newest first, one entry per question, from the shared query log
+    history = get_log().recent(20)
     st.sidebar.subheader("Query History")
-    for i, h in enumerate(reversed(history[-20:])):
+    for i, h in enumerate(history):
         if st.sidebar.button(f"{h['question'][:40]}", key=f"hist_{i}"):
             st.session_state["question"] = h["question"]
     return safe_mode
 
 safe_mode = sidebar()
 
-# Get schema (cached)
-@st.cache_data(ttl=600)
-def get_schema():
-    return db.get_schema_info()
-
-schema = get_schema()
+# Schema comes from the catalog, which reloads only when the data version changes
+schema = db.get_schema_info()
 
 # Main chat input
 if "question" not in st.session_state:
@@ -88,7 +88,13 @@ if st.button("Submit") and question.strip():
     st.session_state["question"] = question
     # NL→SQL
     try:
-        sql_info = nl_to_sql.nl_to_sql(question, schema)
+        # A question answered before by SQL that ran reuses it without another LLM call
+        example = get_store().lookup(question)
+        cache_hit = example is not None
+        if cache_hit:
+            sql_info = {"sql": example["sql"], "rationale": f"Reused the validated SQL of '{example['question']}'."}
+        else:
+            sql_info = nl_to_sql.nl_to_sql(question, schema)
         sql = sql_info["sql"]
         rationale = sql_info["rationale"]
         st.code(sql, language="sql")
@@ -98,7 +104,7 @@ if st.button("Submit") and question.strip():
             # Only allow tables in schema, SELECT only, LIMIT
             import re
             tables_in_sql = set(re.findall(r'from\s+([\w_]+)', sql, re.I))
-            allowed_tables = set(db.get_schema_info().keys())
+            allowed_tables = set(schema.keys())
             if not tables_in_sql.issubset(allowed_tables):
                 raise ValueError(f"Table(s) {tables_in_sql - allowed_tables} not allowed in SQL.")
             if not sql.lower().startswith("select"):
@@ -113,7 +119,18 @@ if st.button("Submit") and question.strip():
                 return con.execute(sql).fetchdf()
             else:
                 return pd.read_sql(sql, con)
-        df = run_query()
+        start = time.perf_counter()
+        try:
+            df = run_query()
+        except Exception as e:
+            get_store().record(question, sql, success=False, source="ask_data")
+            get_log().log(question, sql, user=user, source="ask_data", cache_hit=cache_hit, error=e,
+                          latency_ms=(time.perf_counter() - start) * 1e3)
+            raise
+        latency_ms = (time.perf_counter() - start) * 1e3
+        get_store().record(question, sql, success=True, latency_ms=latency_ms, row_count=len(df), source="ask_data")
+        get_log().log(question, sql, user=user, source="ask_data", latency_ms=latency_ms, row_count=len(df),
+                      cache_hit=cache_hit)
         # --- Result Summary Cards ---
         st.markdown("#### Result Summary")
         card_cols = st.columns(3)
@@ -123,27 +140,21 @@ if st.button("Submit") and question.strip():
         # --- Chart/Table Toggle ---
         toggle = st.toggle("Show Table", value=st.session_state["show_table"])
         st.session_state["show_table"] = toggle
+        job = None
         if not toggle:
-            chart_picker.pick_chart(df)
+            job = chart_picker.pick_chart(df)
         else:
             st.dataframe(df)
         # --- Improved Downloads ---
         st.download_button("Download CSV", df.to_csv(index=False), "result.csv")
         try:
-            import io
-            import plotly.io as pio
-            fig = chart_picker.pick_chart(df)
-            if fig is not None:
-                buf = io.BytesIO()
-                pio.write_image(fig, buf, format="png")
-                st.download_button("Download Chart as PNG", buf.getvalue(), "chart.png")
+            # The PNG is drawn from the same binned/sampled data as the chart on the page
+            png = chart_picker.chart_png(job or chart_picker.chart_job(df))
+            if png is not None:
+                st.download_button("Download Chart as PNG", png, "chart.png")
         except Exception:
             pass
         # Narrative (placeholder)
         st.info(f"This result answers: '{question}'. (Narrative generation coming soon.)")
-        # Save to history
-        history = cache.get("history", [])
-        history.append({"question": question, "sql": sql})
-        cache["history"] = history[-20:]
     except Exception as e:
         st.error(f"Error: {e}")
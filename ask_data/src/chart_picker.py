@@ -1,49 +1,84 @@
+import io
 import pandas as pd
 import streamlit as st
-import altair as alt
-import plotly.express as px
+import db
+# db puts the project root on sys.path
+from services import binning
+from services.charts import render
+
+LINE_WIDTH_PX = 800
+
+def column_kinds(df: pd.DataFrame):
+    """
+    Classify result columns once from their dtype. Aliases and expressions can reuse a base column's
+    name, so the ingestion stats are only asked about text columns, which may hold dates.
+    """
+    kinds = {}
+    for c in df.columns:
+        if pd.api.types.is_numeric_dtype(df[c]):
+            kind = "numeric"
+        elif pd.api.types.is_datetime64_any_dtype(df[c]):
+            kind = "temporal"
+        else:
+            kind = "temporal" if db.get_column_kind(c) == "temporal" else "categorical"
+        kinds[c] = kind
+    return kinds
+
+def _render(job):
+    """Draw a services.binning chart job; the data is already bounded in size."""
+    df, x, y = job["data"], job["x"], job["y"]
+    # Chart libraries load on first draw so reruns without a chart skip them
+    if job["kind"] == "bar":
+        import altair as alt
+        chart = alt.Chart(df).mark_bar().encode(x=alt.X(x, sort=None), y=y)
+        st.altair_chart(chart, use_container_width=True)
+    elif job["kind"] == "line":
+        import altair as alt
+        chart = alt.Chart(df).mark_line().encode(x=x, y=y)
+        st.altair_chart(chart, use_container_width=True)
+    elif job["kind"] == "scatter":
+        import plotly.express as px
+        fig = px.scatter(df, x=x, y=y, color=job["color"])
+        st.plotly_chart(fig, use_container_width=True)
+    elif job["kind"] == "bins2d":
+        import plotly.express as px
+        fig = px.density_heatmap(df, x=x, y=y, z="count", histfunc="sum",
+                                 nbinsx=binning.BINS[0], nbinsy=binning.BINS[1])
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.dataframe(df)
+    if job["note"]:
+        st.caption(job["note"])
+
+def chart_job(df: pd.DataFrame):
+    """The bounded chart for a result (see services/binning.py)."""
+    return binning.chart_job(df, column_kinds(df), width_px=LINE_WIDTH_PX)
+
+def chart_png(job):
+    """PNG bytes of a chart job, drawn from the same aggregated data as the page; None for tables."""
+    if job is None or job["kind"] == "table":
+        return None
+    buf = io.BytesIO()
+    render(job, buf)
+    return buf.getvalue()
 
 def pick_chart(df: pd.DataFrame):
+    """Draw the chart for ``df`` and return its job (None when there is nothing, or one chart per source table)."""
     try:
         if df.empty:
             st.info("No data to display.")
             return None
-        cols = df.columns.tolist()
         # If SourceTable column exists, group and plot by SourceTable
-        if "SourceTable" in cols:
+        if "SourceTable" in df.columns:
             for table in df["SourceTable"].unique():
                 st.subheader(f"Source: {table}")
-                subdf = df[df["SourceTable"] == table]
-                subcols = [c for c in subdf.columns if c != "SourceTable"]
-                if len(subcols) == 2 and pd.api.types.is_numeric_dtype(subdf[subcols[1]]):
-                    chart = alt.Chart(subdf).mark_bar().encode(x=subcols[0], y=subcols[1])
-                    st.altair_chart(chart, use_container_width=True)
-                elif any(pd.api.types.is_datetime64_any_dtype(subdf[c]) for c in subcols) and len(subcols) >= 2:
-                    date_col = next(c for c in subcols if pd.api.types.is_datetime64_any_dtype(subdf[c]))
-                    metric_col = next(c for c in subcols if c != date_col and pd.api.types.is_numeric_dtype(subdf[c]))
-                    chart = alt.Chart(subdf).mark_line().encode(x=date_col, y=metric_col)
-                    st.altair_chart(chart, use_container_width=True)
-                elif sum(pd.api.types.is_numeric_dtype(subdf[c]) for c in subcols) == 2 and len(subdf) <= 5000:
-                    num_cols = [c for c in subcols if pd.api.types.is_numeric_dtype(subdf[c])]
-                    fig = px.scatter(subdf, x=num_cols[0], y=num_cols[1])
-                    st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.dataframe(subdf)
-        else:
-            if len(cols) == 2 and pd.api.types.is_numeric_dtype(df[cols[1]]):
-                chart = alt.Chart(df).mark_bar().encode(x=cols[0], y=cols[1])
-                st.altair_chart(chart, use_container_width=True)
-            elif any(pd.api.types.is_datetime64_any_dtype(df[c]) for c in cols) and len(cols) >= 2:
-                date_col = next(c for c in cols if pd.api.types.is_datetime64_any_dtype(df[c]))
-                metric_col = next(c for c in cols if c != date_col and pd.api.types.is_numeric_dtype(df[c]))
-                chart = alt.Chart(df).mark_line().encode(x=date_col, y=metric_col)
-                st.altair_chart(chart, use_container_width=True)
-            elif sum(pd.api.types.is_numeric_dtype(df[c]) for c in cols) == 2 and len(df) <= 5000:
-                num_cols = [c for c in cols if pd.api.types.is_numeric_dtype(df[c])]
-                fig = px.scatter(df, x=num_cols[0], y=num_cols[1])
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.dataframe(df)
+                subdf = df[df["SourceTable"] == table].drop(columns="SourceTable")
+                _render(chart_job(subdf))
+            return None
+        job = chart_job(df)
+        _render(job)
+        return job
     except Exception as e:
         st.error(f"Visualization error: {e}")
         st.dataframe(df)
+        return None
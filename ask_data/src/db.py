@@ -1,9 +1,15 @@
 import os
+import sys
 import duckdb
 import pandas as pd
 from sqlalchemy import create_engine, text
 from settings import DB_ENGINE, DB_PATH
 
+# Shared schema catalog lives in the project-level services package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from services.catalog import get_catalog, invalidate as invalidate_schema
+from services.stats import column_stats, is_numeric, is_temporal
+
 # Pluggable DB connection (default: DuckDB)
 def get_engine():
     if DB_ENGINE == 'duckdb':
@@ -17,12 +23,17 @@ def get_engine():
 
 def get_schema_info():
     if DB_ENGINE == 'duckdb':
-        con = duckdb.connect(DB_PATH)
-        tables = con.execute("SHOW TABLES").fetchdf()['name'].tolist()
-        schema = {}
-        for t in tables:
-            cols = con.execute(f"DESCRIBE {t}").fetchdf()[['column_name', 'column_type']]
-            schema[t] = cols.to_dict('records')
-        return schema
+        return get_catalog(db_path=DB_PATH).schema_info()
     # Add Postgres/other support as needed
     raise NotImplementedError()
+
+def get_column_kind(column):
+    """'numeric', 'temporal' or 'categorical' from the ingestion stats, None if the column is unknown."""
+    if DB_ENGINE != 'duckdb':
+        return None
+    s = column_stats(column, db_path=DB_PATH)
+    if s is None:
+        return None
+    if is_numeric(s["column_type"]):
+        return "numeric"
+    return "temporal" if is_temporal(s["column_type"]) else "categorical"
@@ -0,0 +1,258 @@
+"""
+Process-wide shared resources for the Streamlit pages.
+
+Streamlit re-runs a page script on every widget interaction. The database
+handle and the LLM client are created once per process (``st.cache_resource``)
+and every session reads through its own cursor of the shared handle. Table
+lists, row counts, schemas, previews, stats and the dashboard explorer's
+filter options and chart aggregates are cached with ``st.cache_data`` keyed
+by the data version, so a rerun on unchanged data does not touch DuckDB at
+all and new ingested data is picked up on the next rerun.
+
+DuckDB lets no other process write to the file while a read handle is open,
+and ingestion (scripts/ingest.py, the streaming daemon) runs as a separate
+process. The shared handle is therefore opened on demand and closed after
+``IDLE_S`` seconds without use; sessions get a fresh cursor transparently.
+Cursors hold a lease from ``execute`` until the result is fetched, and the
+handle is never closed while a lease is out, so long queries finish first.
+"""
+import duckdb, pandas as pd, threading, time
+import streamlit as st
+from typing import Callable, Dict, List, Optional
+import config
+from services.catalog import get_catalog
+from services.versioning import data_version
+
+IDLE_S = 10.0
+# A statement whose result is never fetched stops counting as in use after this long
+MAX_LEASE_S = 900.0
+CACHE_TTL_S = 3600
+PREVIEW_ROWS = 1000
+
+
+class LeasedCursor:
+    """A DuckDB cursor that keeps its connection open from ``execute`` until the result is fetched."""
+    FETCH = ("fetchdf", "fetch_df", "df", "fetchall", "fetchone", "fetchmany", "fetchnumpy",
+             "fetch_arrow_table", "arrow")
+
+    def __init__(self, db: "SharedDatabase", cur):
+        self._db = db
+        self._cur = cur
+
+    def execute(self, *args, **kwargs):
+        self._db._lease(self)
+        try:
+            self._cur.execute(*args, **kwargs)
+        except BaseException:
+            self._db._return(self)
+            raise
+        if self._cur.description is None:
+            self._db._return(self)
+        return self
+
+    def __getattr__(self, name):
+        attr = getattr(self._cur, name)
+        if name not in self.FETCH:
+            return attr
+
+        def fetch(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self._db._return(self)
+        return fetch
+
+
+class SharedDatabase:
+    """One read-only connection per process, handing out cursors; closed when idle."""
+    def __init__(self, db_path: str, idle_s: float = IDLE_S, clock: Callable[[], float] = time.monotonic):
+        self.db_path = db_path
+        self.idle_s = idle_s
+        self.clock = clock
+        self.generation = 0
+        self._con = None
+        self._cursors = []
+        self._leases: Dict[LeasedCursor, float] = {}
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def cursor(self, owner: Dict):
+        """The cursor held in ``owner`` (e.g. a session's state), renewed when the connection was reopened."""
+        with self._lock:
+            if self._con is None:
+                self._con = duckdb.connect(self.db_path, read_only=True)
+                self.generation += 1
+                threading.Thread(target=self._close_when_idle, args=(self.generation,), daemon=True).start()
+            if owner.get("generation") != self.generation:
+                owner["cursor"] = LeasedCursor(self, self._con.cursor())
+                owner["generation"] = self.generation
+                self._cursors.append(owner["cursor"])
+            self._last_used = self.clock()
+            return owner["cursor"]
+
+    def _lease(self, cur: LeasedCursor):
+        with self._lock:
+            self._leases[cur] = self._last_used = self.clock()
+
+    def _return(self, cur: LeasedCursor):
+        with self._lock:
+            self._leases.pop(cur, None)
+            self._last_used = self.clock()
+
+    def in_use(self) -> bool:
+        now = self.clock()
+        return any(now - since < MAX_LEASE_S for since in self._leases.values())
+
+    def _reap(self, generation: int) -> bool:
+        """Close the connection if it is idle and unleased; True once this generation is closed."""
+        with self._lock:
+            if self.generation != generation or self._con is None:
+                return True
+            if not self.in_use() and self.clock() - self._last_used >= self.idle_s:
+                self._close()
+                return True
+            return False
+
+    def _close_when_idle(self, generation: int):
+        while True:
+            time.sleep(self.idle_s / 2)
+            if self._reap(generation):
+                return
+
+    def _close(self):
+        for cur in self._cursors:
+            cur.close()
+        self._con.close()
+        self._con, self._cursors, self._leases = None, [], {}
+
+    def close(self):
+        """Release the file now, e.g. before starting a writer process (interrupts queries in flight)."""
+        with self._lock:
+            if self._con is not None:
+                self._close()
+
+
+@st.cache_resource
+def database(db_path: str = config.DB_PATH) -> SharedDatabase:
+    return SharedDatabase(db_path)
+
+
+def cursor(db_path: str = config.DB_PATH):
+    """This session's cursor on the shared database handle."""
+    owner = st.session_state.setdefault(f"_duckdb_cursor:{db_path}", {})
+    return database(db_path).cursor(owner)
+
+
+def release(db_path: str = config.DB_PATH):
+    database(db_path).close()
+
+
+@st.cache_resource
+def llm(key: str = "default"):
+    # Imported here so pages that never call the LLM do not load the gateway
+    from services.claude_llm import ClaudeLLM
+    return ClaudeLLM(key=key)
+
+
+def agent(db_path: str = config.DB_PATH):
+    """An agent reading through this session's cursor (cheap to create on every rerun)."""
+    from agent import FCLMAgent
+    return FCLMAgent(db_path, con=cursor(db_path))
+
+
+# --- data-version keyed caches ------------------------------------------------
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=16)
+def _tables(db_path: str, version: str) -> List[str]:
+    return get_catalog(cursor(db_path), db_path).tables()
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=16)
+def _row_counts(db_path: str, version: str) -> Dict[str, int]:
+    from services.rollups import table_totals
+    con = cursor(db_path)
+    # Record counts come from the KPI rollups; tables they do not track are counted directly
+    counts = table_totals(con)
+    for table in _tables(db_path, version):
+        if counts.get(table) is None:
+            counts[table] = con.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+    return counts
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=64)
+def _schema(db_path: str, table: str, version: str) -> Dict[str, List[str]]:
+    cols = get_catalog(cursor(db_path), db_path).columns(table)
+    return {"columns": [c["column_name"] for c in cols], "types": [c["column_type"] for c in cols]}
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=32)
+def _preview(db_path: str, table: str, limit: int, version: str) -> pd.DataFrame:
+    return cursor(db_path).execute(f'SELECT * FROM "{table}" LIMIT {int(limit)}').fetchdf()
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=64)
+def _table_stats(db_path: str, table: str, version: str) -> pd.DataFrame:
+    from services.stats import table_stats as load
+    return load(table, cursor(db_path))
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=16)
+def _quality_summary(db_path: str, version: str) -> pd.DataFrame:
+    from services.quality import load_profile, summarize
+    return summarize(load_profile(cursor(db_path)))
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=32)
+def _filter_options(db_path: str, table: str, version: str) -> Dict[str, Dict]:
+    from services.explorer import filter_options as load
+    return load(cursor(db_path), table, db_path)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=256)
+def _aggregate(db_path: str, table: str, chart: str, column: str, filters: tuple, value, version: str) -> pd.DataFrame:
+    from services.explorer import aggregate as run
+    return run(cursor(db_path), table, chart, column, filters, value)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=64)
+def _filtered_rows(db_path: str, table: str, filters: tuple, limit: int, version: str) -> Dict:
+    from services.explorer import filtered_rows as run
+    return run(cursor(db_path), table, filters, limit)
+
+
+def tables(db_path: str = config.DB_PATH) -> List[str]:
+    return _tables(db_path, data_version())
+
+
+def row_counts(db_path: str = config.DB_PATH) -> Dict[str, int]:
+    return _row_counts(db_path, data_version())
+
+
+def schema(table: str, db_path: str = config.DB_PATH) -> Dict[str, List[str]]:
+    return _schema(db_path, table, data_version())
+
+
+def preview(table: str, limit: int = PREVIEW_ROWS, db_path: str = config.DB_PATH) -> pd.DataFrame:
+    return _preview(db_path, table, limit, data_version())
+
+
+def table_stats(table: str, db_path: str = config.DB_PATH) -> pd.DataFrame:
+    return _table_stats(db_path, table, data_version())
+
+
+def quality_summary(db_path: str = config.DB_PATH) -> pd.DataFrame:
+    return _quality_summary(db_path, data_version())
+
+
+def filter_options(table: str, db_path: str = config.DB_PATH) -> Dict[str, Dict]:
+    return _filter_options(db_path, table, data_version())
+
+
+def aggregate(table: str, chart: str, column: str, filters: tuple = (), value: Optional[str] = None,
+              db_path: str = config.DB_PATH) -> pd.DataFrame:
+    """Chart data for (table, chart, column, filters, value), cached per data version."""
+    return _aggregate(db_path, table, chart, column, tuple(filters), value, data_version())
+
+
+def filtered_rows(table: str, filters: tuple = (), limit: int = PREVIEW_ROWS, db_path: str = config.DB_PATH) -> Dict:
+    return _filtered_rows(db_path, table, tuple(filters), limit, data_version())
@@ -1,17 +1,23 @@
+"""
+Dashboard charts drawn from data aggregated in DuckDB (services/explorer.py).
+"""
 import streamlit as st
 import pandas as pd
 
-def bar_chart(df, col):
-    counts = df[col].value_counts().head(10)
-    st.bar_chart(counts)
+def bar_chart(counts: pd.DataFrame):
+    """counts: (value, count) rows, most frequent first."""
+    st.bar_chart(counts.set_index("value")["count"])
 
-def pie_chart(df, col):
-    counts = df[col].value_counts()
-    st.write("Pie/Donut Chart")
-    st.write(counts)
-    st.pyplot()
+def pie_chart(counts: pd.DataFrame):
+    """counts: (value, count) slices, the tail already folded into "Other"."""
+    # Imported on first draw so opening a page does not load matplotlib
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(5, 5))
+    ax.pie(counts["count"], labels=counts["value"], autopct="%1.0f%%", wedgeprops={"width": 0.45})
+    ax.axis("equal")
+    st.pyplot(fig)
+    plt.close(fig)
 
-def timeseries_chart(df, dt_col):
-    df[dt_col] = pd.to_datetime(df[dt_col], errors='coerce')
-    ts = df.groupby(df[dt_col].dt.date).size()
-    st.line_chart(ts)
+def timeseries_chart(points: pd.DataFrame, label: str = "count"):
+    """points: downsampled (time, value) rows in time order (services/timeseries.py)."""
+    st.line_chart(points.set_index("time")["value"].rename(label))
@@ -1,6 +1,8 @@
 import streamlit as st
-from lib.data_io import connect_db, list_tables, get_table, get_schema
+from lib import resources
 from lib.viz import bar_chart, pie_chart, timeseries_chart
+from services.explorer import datetime_column
+from services.stats import is_numeric
 
 
 st.set_page_config(page_title="FCLM Dashboard", layout="wide")
@@ -13,54 +15,63 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-conn = connect_db()
-tables = list_tables(conn)
+# Shared per-process handle and data-version keyed caches (lib/resources.py)
+tables = resources.tables()
 
 # Animated KPI Cards
 st.markdown("<h3 style='color:#1e3c72;'>📊 Key Metrics</h3>", unsafe_allow_html=True)
 kpi_cols = st.columns(len(tables))
+totals = resources.row_counts()
 for i, table in enumerate(tables):
-    count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
-    kpi_cols[i].metric(label=f"{table} records", value=count)
+    kpi_cols[i].metric(label=f"{table} records", value=totals.get(table))
 
 # Table & Chart Section
 st.markdown("<h3 style='color:#1e3c72;'>📋 Table & Chart Explorer</h3>", unsafe_allow_html=True)
 selected_table = st.selectbox("Select FCLM table", tables)
 if selected_table:
-    schema = get_schema(conn, selected_table)
-    df = get_table(conn, selected_table)
-    st.markdown("### Table Preview")
-    st.dataframe(df.head(50))
+    schema = resources.schema(selected_table)
+    types = dict(zip(schema["columns"], schema["types"]))
+    # Filters and chart aggregates run in DuckDB over the full table; options come from precomputed values
+    options = resources.filter_options(selected_table)
+    filters = []
+    with st.expander("🔎 Filters", expanded=False):
+        st.markdown("<div style='color:#6366f1; font-size:1.1em; margin-bottom:8px;'>Select filters to refine your view</div>", unsafe_allow_html=True)
+        if st.button("Reset Filters", key="reset_filters"):
+            for c in options:
+                st.session_state.pop(f"filter_{selected_table}_{c}", None)
+        filter_cols = st.columns(max(1, min(4, len(options))))
+        for idx, (c, opt) in enumerate(options.items()):
+            key = f"filter_{selected_table}_{c}"
+            if opt["kind"] == "values":
+                picked = filter_cols[idx % 4].multiselect(f"🧩 {c}", opt["values"], key=key)
+                if picked:
+                    filters.append((c, "in", tuple(picked)))
+            elif opt["max"] > opt["min"]:
+                lo, hi = filter_cols[idx % 4].slider(f"📏 {c}", opt["min"], opt["max"], (opt["min"], opt["max"]), key=key)
+                if (lo, hi) != (opt["min"], opt["max"]):
+                    filters.append((c, "between", (lo, hi)))
+    filters = tuple(filters)
+    result = resources.filtered_rows(selected_table, filters)
+    st.markdown(f"### Table Preview ({result['total']:,} matching rows)")
+    st.dataframe(result["rows"].head(50))
     chart_type = st.radio("Chart Type", ["Bar", "Pie/Donut", "Time-Series"])
-    col = st.selectbox("Column for chart", schema["columns"])
-    if chart_type == "Bar":
-        bar_chart(df, col)
-    elif chart_type == "Pie/Donut":
-        pie_chart(df, col)
-    elif chart_type == "Time-Series":
-        dt_col = next((c for c in schema["columns"] if "date" in c.lower() or "time" in c.lower()), None)
+    if chart_type == "Time-Series":
+        dt_col = datetime_column(types)
         if dt_col:
-            timeseries_chart(df, dt_col)
+            numeric = [c for c, t in types.items() if c != dt_col and is_numeric(t)]
+            metric = st.selectbox("Value", ["Row count"] + numeric)
+            value = None if metric == "Row count" else metric
+            # Bucketed and downsampled in DuckDB: at most a few hundred points reach the browser
+            timeseries_chart(resources.aggregate(selected_table, "timeseries", dt_col, filters, value),
+                             label=metric)
         else:
             st.warning("No datetime column available for time-series chart.")
-    with st.expander("🔎 Filters", expanded=False):
-        st.markdown("<div style='color:#6366f1; font-size:1.1em; margin-bottom:8px;'>Select filters to refine your view</div>", unsafe_allow_html=True)
-        filter_cols = st.columns(min(4, len(schema["columns"])))
-        filter_values = {}
-        for idx, c in enumerate(schema["columns"]):
-            if df[c].dtype == "object":
-                vals = df[c].unique().tolist()
-                filter_values[c] = filter_cols[idx % 4].selectbox(f"🧩 {c}", ["All"] + vals, key=f"filter_{c}")
-        reset = st.button("Reset Filters", key="reset_filters")
-        filtered_df = df.copy()
-        if reset:
-            for c in filter_values:
-                st.session_state[f"filter_{c}"] = "All"
-        for c, val in filter_values.items():
-            if val != "All":
-                filtered_df = filtered_df[filtered_df[c] == val]
-        st.markdown("<div style='margin-top:10px;'></div>", unsafe_allow_html=True)
-        st.dataframe(filtered_df)
+    else:
+        col = st.selectbox("Column for chart", schema["columns"])
+        if chart_type == "Bar":
+            bar_chart(resources.aggregate(selected_table, "bar", col, filters))
+        else:
+            pie_chart(resources.aggregate(selected_table, "pie", col, filters))
 
 # Business Impact Highlights
 st.markdown("""
@@ -5,10 +5,12 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 
 import streamlit as st
-import duckdb
 import pandas as pd
 
 from ask_data.src.nl_to_sql import nl_to_sql
+from lib import resources
+from services.catalog import get_catalog
+from services.sql_repair import gateway_fix, repair
 
 
 st.markdown("""
@@ -20,19 +22,11 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-db_path = "db/fclm.duckdb"
-conn = duckdb.connect(db_path)
+conn = resources.cursor()
 
 # --- Schema Introspection ---
-def get_schema(conn): 
-    tables = conn.execute("SHOW TABLES").fetchdf()["name"].tolist() 
-    schema = {} 
-    for t in tables: 
-        cols = conn.execute(f"PRAGMA table_info('{t}')").fetchdf() 
-        schema[t] = [{"column_name": row[1], "column_type": row[2]} for row in cols.values] 
-    return schema 
-
-schema = get_schema(conn)
+schema_catalog = get_catalog(conn)
+schema = schema_catalog.schema_info()
 
 # --- NL→SQL Parser/Router ---
 
@@ -144,7 +138,15 @@ if question:
         <div style='color:#334155; font-size:1.04em; margin-top:6px;'>{rationale}</div>
     </div>
     """, unsafe_allow_html=True)
+    # Bind with EXPLAIN first: bad names are fixed from the catalog (or by the LLM) before any scan
+    checked = repair(sql, con=conn, catalog=schema_catalog, llm_fix=gateway_fix)
+    if checked["repairs"]:
+        sql = checked["sql"]
+        st.caption("Repaired before running: " + "; ".join(r["error"] for r in checked["repairs"]))
+        st.code(sql, language="sql")
     try:
+        if not checked["valid"]:
+            raise ValueError(checked["error"])
         df = conn.execute(sql).fetchdf()
         st.markdown("<div style='background-color:#f4f8fb; border-radius:10px; padding:16px 20px; margin-bottom:18px;'><h4 style='color:#2a5298; margin-bottom:8px;'>📊 Query Result</h4></div>", unsafe_allow_html=True)
         if df.empty:
@@ -1,5 +1,5 @@
 import streamlit as st
-from lib.data_io import connect_db, list_tables, get_table
+from lib import resources
 
 st.set_page_config(page_title="FCLM Data Browser", layout="wide")
 st.markdown("""
@@ -8,14 +8,20 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-conn = connect_db()
-tables = list_tables(conn)
+tables = resources.tables()
 selected_table = st.selectbox("Select table", tables)
 if selected_table:
-    df = get_table(conn, selected_table)
+    df = resources.preview(selected_table)
     st.dataframe(df.head(50))
     st.download_button("Download CSV", df.to_csv(index=False), f"{selected_table}_preview.csv")
     st.markdown("---")
     st.markdown(f"### Table Explorer for {selected_table}")
-    st.write(f"Rows: {len(df)} | Columns: {', '.join(df.columns)}")
-    st.dataframe(df.describe(include='all').transpose())
+    stats = resources.table_stats(selected_table)
+    if stats.empty:
+        st.write(f"Rows: {len(df)} (preview) | Columns: {', '.join(df.columns)}")
+        st.info("Column statistics are computed at ingestion; run a data refresh to see them.")
+    else:
+        st.write(f"Rows: {stats['row_count'].iloc[0]} | Columns: {', '.join(df.columns)}")
+        st.dataframe(stats.set_index("column_name")[[
+            "column_type", "null_count", "distinct_count", "min_value", "max_value",
+            "mean", "stddev", "quantiles", "top_values", "outlier_count"]])
@@ -1,6 +1,6 @@
 import streamlit as st
 import os
-from lib.data_io import connect_db, list_tables
+from lib import resources
 from datetime import datetime
 
 st.set_page_config(page_title="FCLM Database Info", layout="wide")
@@ -11,8 +11,8 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 DB_PATH = "db/fclm.duckdb"
-conn = connect_db()  # single write connection for all operations
-tables = list_tables(conn)
+conn = resources.cursor()  # this session's cursor on the shared read-only handle
+tables = resources.tables()
 
 st.markdown(f"**Database Path:** {DB_PATH}")
 if os.path.exists(DB_PATH):
@@ -20,31 +20,20 @@ if os.path.exists(DB_PATH):
     st.markdown(f"**Last Modified:** {datetime.fromtimestamp(os.path.getmtime(DB_PATH)).strftime('%Y-%m-%d %H:%M:%S')}")
 
 # --- Data Quality Checks ---
+# Profiles cover every row and are refreshed by ingestion (incrementally for streamed batches)
 st.markdown("### Data Quality Checks")
-import numpy as np
-for t in tables:
-    df = conn.execute(f"SELECT * FROM {t} LIMIT 1000").fetchdf()
-    missing = df.isnull().sum().sum()
-    outliers = 0
-    for col in df.select_dtypes(include=[np.number]).columns:
-        vals = df[col].dropna()
-        if len(vals) > 0:
-            q1, q3 = np.percentile(vals, [25, 75])
-            iqr = q3 - q1
-            outliers += ((vals < q1 - 1.5*iqr) | (vals > q3 + 1.5*iqr)).sum()
-    schema = conn.execute(f"PRAGMA table_info('{t}')").fetchdf()
-    mismatches = 0
-    for i, col in enumerate(schema['name']):
-        expected = schema['type'][i]
-        actual = str(df[col].dtype)
-        if expected.lower() not in actual.lower():
-            mismatches += 1
-    st.write(f"**{t}**: {len(df)} rows | Missing: {missing} | Outliers: {outliers} | Schema mismatches: {mismatches}")
+dq = resources.quality_summary()
+if dq.empty:
+    st.info("No data-quality profile yet, run a data refresh.")
+for r in dq.to_dict("records"):
+    st.write(f"**{r['table_name']}**: {r['row_count']} rows | Missing: {r['null_count']} | "
+             f"Outliers (IQR/z): {r['iqr_outliers']}/{r['zscore_outliers']} | "
+             f"Type mismatches: {r['nonconforming']} | Duplicate keys: {r['duplicate_keys']}")
 
 st.markdown("### Tables and Row Counts")
+counts = resources.row_counts()
 for t in tables:
-    count = conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
-    st.write(f"{t}: {count} rows")
+    st.write(f"{t}: {counts.get(t)} rows")
 
 st.markdown("### Read-Only SQL Runner (SELECT only)")
 
@@ -67,24 +56,31 @@ st.markdown("### Audit Log (last 20 queries)")
 
 # --- Data Versioning ---
 st.markdown("### Data Versioning (Snapshot & Restore)")
-selected_table = st.selectbox("Select table to snapshot/restore", tables)
-SNAPSHOT_TABLE = f"{selected_table}_snapshot"
-if st.button(f"Snapshot {selected_table}"):
-    conn.execute(f"CREATE OR REPLACE TABLE {SNAPSHOT_TABLE} AS SELECT * FROM {selected_table}")
-    st.success(f"Snapshot of {selected_table} saved as {SNAPSHOT_TABLE}")
-if st.button(f"Restore {selected_table} from snapshot"):
-    try:
-        conn.execute(f"CREATE OR REPLACE TABLE {selected_table} AS SELECT * FROM {SNAPSHOT_TABLE}")
-        st.success(f"{selected_table} restored from snapshot.")
-    except Exception as e:
-        st.error(f"Restore failed: {e}")
+from services import snapshots
+manifest = snapshots.load_manifest()
+st.markdown(f"**Serving snapshot:** {manifest['current'] or 'live tables'}")
+if st.button("Snapshot all tables"):
+    version = snapshots.create_snapshot(conn, tables)
+    st.success(f"Snapshot {version} saved")
+versions = [v["version"] for v in reversed(manifest["versions"])]
+if versions:
+    selected_version = st.selectbox("Select snapshot to restore", versions)
+    if st.button(f"Restore {selected_version}"):
+        try:
+            snapshots.restore_snapshot(selected_version)
+            st.success(f"Now serving snapshot {selected_version}.")
+        except Exception as e:
+            st.error(f"Restore failed: {e}")
 
 # --- Scheduled Data Refresh (Manual Trigger) ---
 st.markdown("### Data Refresh")
 import subprocess
 if st.button("Refresh Data from CSVs"):
     try:
+        # The ingest writes to the file, which DuckDB only allows once no read handle is open
+        resources.release()
         result = subprocess.run(["python3", "scripts/ingest.py"], capture_output=True, text=True)
+        conn = resources.cursor()
         if result.returncode == 0:
             st.success("Data refreshed from CSVs.")
         else:
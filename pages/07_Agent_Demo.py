@@ -2,13 +2,14 @@ import streamlit as st
 import pandas as pd
 from typing import Any
 
-from services.agent import FCLMAgent
-from services.claude_llm import ClaudeLLM
+from lib import resources
+from services import sql_repair
 
 st.set_page_config(page_title="FCLM Agent Demo", layout="wide")
 
-agent = FCLMAgent("db/fclm.duckdb")
-llm = ClaudeLLM()
+# One LLM client per process, the agent reads through this session's cursor (lib/resources.py)
+agent = resources.agent()
+llm = resources.llm("agent_demo")
 
 st.title("\U0001F916 FCLM Agent Chatbot (Claude + Data)")
 
@@ -41,12 +42,9 @@ if run:
         try:
             with st.spinner("Processing..."):
                 if mode == "General":
-                    # general Q&A via Claude
-                    resp = llm.ask(q)
-                    text = llm_text(resp)
-
+                    # general Q&A via Claude, streamed as it is generated
                     st.subheader("Answer")
-                    st.write(text)
+                    resp = st.write_stream(llm.stream(q))
 
                     with st.expander("Raw LLM output"):
                         st.write(resp)
@@ -97,7 +95,16 @@ if run:
                                 st.code(sql_to_run)
                         else:
                             try:
-                                result = agent.run_query(sql_to_run)
+                                # Bind with EXPLAIN and repair bad names (catalog first, then the LLM)
+                                checked = agent.check_sql(sql_to_run, llm_func)
+                                if checked["repairs"]:
+                                    sql_to_run = checked["sql"]
+                                    with st.expander(f"Repaired SQL ({len(checked['repairs'])} fix(es), {checked['ms']:.0f} ms)"):
+                                        for r in checked["repairs"]:
+                                            st.caption(f"{r['kind']}: {r['error']}")
+                                        st.code(sql_to_run)
+                                result = agent.run_query(sql_to_run, question=q, validate=False) if checked["valid"] \
+                                    else f"Error: {checked['error']}"
                                 if isinstance(result, pd.DataFrame):
                                     if result.empty:
                                         st.info("Query ran successfully but returned no rows.")
@@ -112,6 +119,11 @@ if run:
         except Exception as e:
             st.error(f"Agent failed: {e}")
 
+with st.expander("LLM gateway metrics"):
+    st.json(llm.metrics())
+    st.caption("SQL validation and repair")
+    st.json(sql_repair.metrics())
+
 st.markdown("---")
 
 st.header("Utilities")
@@ -131,6 +143,8 @@ with col1:
 with col2:
     st.subheader("Automate Data Refresh")
     if st.button("Refresh Data from CSVs", key="refresh"):
+        # The ingest needs the file lock, so the shared read handle is released first
+        resources.release()
         msg = agent.refresh_data()
         st.success(msg)
         st.info("All tables reloaded.")
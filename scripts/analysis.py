@@ -1,43 +1,42 @@
 # scripts/analysis.py
+import argparse
 import duckdb
 import pathlib
+import sys
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import seaborn as sns
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 DB   = ROOT / "db" / "fclm.duckdb"
 OUT  = ROOT / "outputs"
 OUT.mkdir(parents=True, exist_ok=True)
+sys.path.insert(0, str(ROOT))
+
+from services.catalog import get_catalog
+from services.charts import render_charts
+from services.lineage import LINEAGE_TABLE, stage_for_table
+from services.failures import failure_predicate
+from services.rollups import date_expr
 
 con = duckdb.connect(DB.as_posix())
 
+STATUS_CANDIDATES = ("status", "defect", "result", "outcome", "remarks")
+DATE_CANDIDATES = ("datetime", "date_time", "timestamp", "date", "time")
+
 def get_tables_and_counts():
-    tables = con.execute("SHOW TABLES").fetchall()
     result = []
-    for t in tables:
-        name = t[0]
+    for name in get_catalog(con, DB).tables():
         count = con.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
         result.append({'table': name, 'row_count': count})
     return pd.DataFrame(result)
 
 def find_col(table, *candidates):
-    cols = [r[1] for r in con.execute(f"PRAGMA table_info('{table}')").fetchall()]
-    name_map = {c.lower(): c for c in cols}
-    for cand in candidates:
-        lc = cand.lower()
-        if lc in name_map:
-            return name_map[lc]
-    for cand in candidates:
-        lc = cand.lower()
-        for k, original in name_map.items():
-            if lc in k:
-                return original
-    return None
+    return get_catalog(con, DB).find_column(table, *candidates)
 
 def join_tables_on_key(tables, key_candidates=("lot_id", "batch_id", "order_id")):
-    # Find common key
+    """
+    Pair up tables sharing a key. Returns (name, join SQL, key, left table, right table) tuples;
+    nothing is executed here, the KPIs below aggregate over the join inside DuckDB.
+    """
     key_map = {}
     for t in tables:
         key = find_col(t, *key_candidates)
@@ -45,7 +44,6 @@ def join_tables_on_key(tables, key_candidates=("lot_id", "batch_id", "order_id")
             key_map[t] = key
     if len(key_map) < 2:
         return []
-    # Join each pair of tables on the first found key
     joins = []
     key_items = list(key_map.items())
     for i in range(len(key_items)):
@@ -53,105 +51,108 @@ def join_tables_on_key(tables, key_candidates=("lot_id", "batch_id", "order_id")
             t1, k1 = key_items[i]
             t2, k2 = key_items[j]
             if k1 == k2:
-                query = f"SELECT * FROM {t1} LEFT JOIN {t2} USING ({k1})"
-                df = con.execute(query).fetchdf()
-                joins.append((f"{t1}__{t2}", df, k1))
+                query = f"SELECT * FROM {t1} AS l LEFT JOIN {t2} AS r USING ({k1})"
+                joins.append((f"{t1}__{t2}", query, k1, t1, t2))
     return joins
 
-def compute_kpis(df, base_key):
-    # Failure/rework rate
-    status_col = None
-    for c in df.columns:
-        if any(x in c.lower() for x in ["status", "defect", "result", "outcome", "remarks"]):
-            status_col = c
-            break
+def _failure_flag(alias, table):
+    return failure_predicate(get_catalog(con, DB).column_names(table), alias)
+
+def compute_kpis(join):
+    """Failure rate, status counts and monthly throughput of the left table over the join, in DuckDB."""
+    _, _, key, t1, t2 = join
+    status_col = find_col(t1, *STATUS_CANDIDATES)
     if not status_col:
         return None
-    failure_keywords = ("fail", "rework", "leak", "reject", "error")
-    df["is_failure"] = df[status_col].astype(str).str.lower().apply(lambda x: any(kw in x for kw in failure_keywords))
-    failure_rate = df["is_failure"].mean()
-    status_counts = df[status_col].value_counts().reset_index().rename(columns={"index": status_col, status_col: "count"})
-    # Monthly throughput
-    dt_col = None
-    for c in df.columns:
-        if any(x in c.lower() for x in ["datetime", "date_time", "timestamp", "date", "time"]):
-            dt_col = c
-            break
+    source = f"{t1} AS l LEFT JOIN {t2} AS r USING ({key})"
+    failure_rate = con.execute(f"SELECT AVG(({_failure_flag('l', t1)})::INT) FROM {source}").fetchone()[0]
+    status_counts = con.execute(f"""
+        SELECT l."{status_col}" AS "{status_col}", COUNT(*) AS count
+        FROM {source} GROUP BY 1 ORDER BY 2 DESC
+    """).fetchdf()
     monthly = None
+    dt_col = find_col(t1, *DATE_CANDIDATES)
     if dt_col:
-        df["parsed_date"] = pd.to_datetime(df[dt_col], errors="coerce")
-        monthly = df.dropna(subset=["parsed_date"]).groupby(pd.Grouper(key="parsed_date", freq="M")).size().reset_index(name="count")
+        day = date_expr(dt_col, get_catalog(con, DB).column_type(t1, dt_col), "l")
+        monthly = con.execute(f"""
+            SELECT date_trunc('month', {day}) AS parsed_date, COUNT(*) AS count
+            FROM {source} WHERE {day} IS NOT NULL GROUP BY 1 ORDER BY 1
+        """).fetchdf()
     return {
         "failure_rate": failure_rate,
         "status_counts": status_counts,
         "monthly_throughput": monthly
     }
 
-def plot_failure_correlation(joins):
-    """Create a heatmap of failure correlations between tables."""
-    failure_rates = {}
-    # Extract failure info from each join
-    for join_name, df, _ in joins:
-        tables = join_name.split('__')
-        status_cols = []
-        # Find status columns for both tables
-        for c in df.columns:
-            if any(x in c.lower() for x in ["status", "defect", "result", "outcome", "remarks"]):
-                for t in tables:
-                    if t in c:  # Match column to its source table
-                        status_cols.append((t, c))
-        
-        if len(status_cols) == 2:  # We need both tables' status
-            failure_keywords = ("fail", "rework", "leak", "reject", "error")
-            for table, col in status_cols:
-                df[f"{table}_failure"] = df[col].astype(str).str.lower().apply(
-                    lambda x: any(kw in x for kw in failure_keywords)
-                )
-            failure_rates[join_name] = df[[f"{t}_failure" for t, _ in status_cols]]
-
-    # Create correlation matrix
-    all_tables = list(set(t for join in joins for t in join[0].split('__')))
+def _has_lineage():
+    return get_catalog(con, DB).has_table(LINEAGE_TABLE)
+
+def failure_correlations(joins):
+    """
+    Correlation of failures between every joined pair, as a table x table matrix. Stages tracked
+    in the lot lineage table are correlated on per-lot failure rates; other pairs fall back to
+    the failure flags over the raw join.
+    """
+    all_tables = sorted(set(t for join in joins for t in join[3:]))
     corr_matrix = pd.DataFrame(index=all_tables, columns=all_tables, dtype=float)
-    
-    # Fill correlation matrix
-    for join_name, failures in failure_rates.items():
-        t1, t2 = join_name.split('__')
-        corr = failures.corr().iloc[0,1]  # Get correlation between the two failure columns
+    lineage_ready = _has_lineage()
+    for _, _, key, t1, t2 in joins:
+        s1, s2 = stage_for_table(t1), stage_for_table(t2)
+        if lineage_ready and s1 and s2:
+            corr = con.execute(f"""
+                SELECT CORR({s1}_failure_rate, {s2}_failure_rate) FROM {LINEAGE_TABLE}
+                WHERE {s1}_runs > 0 AND {s2}_runs > 0
+            """).fetchone()[0]
+        else:
+            f1, f2 = _failure_flag("l", t1), _failure_flag("r", t2)
+            if not (f1 and f2):
+                continue
+            corr = con.execute(f"""
+                SELECT CORR(({f1})::DOUBLE, ({f2})::DOUBLE)
+                FROM {t1} AS l JOIN {t2} AS r USING ({key})
+            """).fetchone()[0]
         corr_matrix.loc[t1, t2] = corr
         corr_matrix.loc[t2, t1] = corr
-    
-    # Fill diagonal with 1.0
     for t in all_tables:
         corr_matrix.loc[t, t] = 1.0
-    
-    # Create heatmap
-    plt.figure(figsize=(10, 8))
-    sns.heatmap(corr_matrix, annot=True, cmap='RdYlBu_r', center=0, vmin=-1, vmax=1)
-    plt.title('Failure Correlation Between Processes')
-    plt.tight_layout()
-    plt.savefig(OUT / 'failure_correlation_heatmap.png')
-    plt.close()
-    print("📊 Saved failure correlation heatmap")
+    return corr_matrix
+
+def plot_failure_correlation(joins):
+    """Render a heatmap of failure correlations between tables (skipped when unchanged)."""
+    job = {"name": "failure_correlation_heatmap.png", "kind": "heatmap",
+           "title": "Failure Correlation Between Processes", "data": failure_correlations(joins)}
+    if render_charts([job], OUT)["rendered"]:
+        print("📊 Saved failure correlation heatmap")
+
+def export_join(join, path):
+    """Stream a full joined table to CSV with COPY; rows never pass through pandas."""
+    con.execute(f"COPY ({join[1]}) TO '{pathlib.Path(path).as_posix()}' (HEADER, DELIMITER ',')")
 
 def main():
+    parser = argparse.ArgumentParser(description="Cross-table failure KPIs")
+    parser.add_argument("--export-joins", action="store_true",
+                        help="also write each full pairwise join to outputs/joined_data_*.csv")
+    args = parser.parse_args()
     # 1. Show tables and row counts
     tables_df = get_tables_and_counts()
     tables_df.to_csv(OUT / "tables_and_counts.csv", index=False)
     print(tables_df)
-    # 2. Join tables pairwise
+    # 2. Pair tables on a shared key
     tables = tables_df['table'].tolist()
     joins = join_tables_on_key(tables)
     if not joins:
         print("No common key found for joining tables.")
         return
-    
+
     # Add visualization
     plot_failure_correlation(joins)
-    
-    for join_name, joined_df, join_key in joins:
-        joined_df.to_csv(OUT / f"joined_data_{join_name}.csv", index=False)
+
+    for join in joins:
+        join_name = join[0]
+        if args.export_joins:
+            export_join(join, OUT / f"joined_data_{join_name}.csv")
         # 3. Compute KPIs
-        kpis = compute_kpis(joined_df, join_key)
+        kpis = compute_kpis(join)
         if not kpis:
             print(f"No status column found for KPI computation in join {join_name}.")
             continue
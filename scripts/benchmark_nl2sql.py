@@ -0,0 +1,190 @@
+# scripts/benchmark_nl2sql.py
+"""
+Load test of the NL→SQL paths without calling Anthropic.
+
+Drives POST /nl2sql, POST /powerbi/query and the Streamlit agent path
+(FCLMAgent.nl2sql + run_query, split into its SQL and query stages) at each
+concurrency level, and reports throughput and p50/p95/p99 latency per stage.
+The LLM backend defaults to the in-process replay of config/llm_recordings.jsonl
+(services/llm_backends.py); ``--backend anthropic`` uses the real SDK, which
+talks to scripts/mock_llm_server.py when ANTHROPIC_BASE_URL points at it.
+The API is called in-process unless ``--url`` names a running server.
+In-process runs use a throwaway example store and query log, so nothing
+lands in db/, and the store is kept empty so replayed answers never
+short-circuit later requests through the example lookup
+(``--keep-examples`` measures with the store warming up instead).
+
+    python scripts/benchmark_nl2sql.py --concurrency 1,4,16 --requests 64 --median-ms 300 --rate-limit-rate 0.02
+"""
+import argparse, json, os, pathlib, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+OUT  = ROOT / "outputs"
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)  # services/db.py opens db/fclm.duckdb relative to the working directory
+
+RULE_QUESTIONS = ["Count failures by machine in o2 gas", "Status distribution of oxygen",
+                  "Daily throughput for curing", "Average humidity by machine in curing"]
+STAGES = ("nl2sql", "powerbi_query", "agent")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="NL→SQL throughput / tail-latency benchmark")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=48, help="requests per stage and level")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--questions", choices=("mixed", "llm", "rules"), default="mixed",
+                        help="recorded (LLM) questions, template-matched ones, or both")
+    parser.add_argument("--backend", choices=("replay", "anthropic"), default="replay")
+    parser.add_argument("--url", default=None, help="benchmark a running API instead of the in-process app")
+    parser.add_argument("--keep-examples", action="store_true",
+                        help="let recorded answers accumulate in the example store across levels")
+    for name in ("median-ms", "p95-ms", "rate-limit-rate", "overloaded-rate", "tokens-per-s"):
+        parser.add_argument(f"--{name}", type=float, default=None, help="replay profile (LLM_REPLAY_*)")
+    return parser.parse_args()
+
+
+def configure(args):
+    # Must happen before the gateway creates its client and the stores are imported
+    os.environ["LLM_BACKEND"] = args.backend
+    scratch = pathlib.Path(tempfile.mkdtemp(prefix="nl2sql_bench_"))
+    os.environ["QUERY_EXAMPLES_DB"] = str(scratch / "query_examples.sqlite")
+    os.environ["QUERY_LOG_DB"] = str(scratch / "query_log.sqlite")
+    for name in ("median_ms", "p95_ms", "rate_limit_rate", "overloaded_rate", "tokens_per_s"):
+        if getattr(args, name) is not None:
+            os.environ[f"LLM_REPLAY_{name.upper()}"] = str(getattr(args, name))
+
+
+def freeze_examples():
+    """Keep the (throwaway) example store empty so every request takes the path being measured."""
+    from services.query_examples import ExampleStore
+    ExampleStore.record = lambda self, *args, **kwargs: None
+
+
+def questions(kind):
+    from services.llm_backends import Recordings
+    recorded = [p["question"] for p in Recordings.load().pairs]
+    return {"llm": recorded, "rules": RULE_QUESTIONS, "mixed": recorded + RULE_QUESTIONS}[kind]
+
+
+def api_caller(url):
+    """POST callable; one in-process TestClient per worker thread, or requests against ``url``."""
+    # Tagged so the API's warm-up never replays benchmark questions
+    headers = {"X-API-Key": os.getenv("API_KEY", "demo-key"), "X-Query-Source": "benchmark"}
+    if url:
+        import requests
+        session = threading.local()
+
+        def post(path, payload):
+            if not hasattr(session, "s"):
+                session.s = requests.Session()
+            r = session.s.post(url.rstrip("/") + path, json=payload, headers=headers, timeout=120)
+            r.raise_for_status()
+            return r.json()
+        return post
+    from fastapi.testclient import TestClient
+    from api.main import app
+    clients = threading.local()
+
+    def post(path, payload):
+        if not hasattr(clients, "c"):
+            clients.c = TestClient(app)
+        r = clients.c.post(path, json=payload, headers=headers)
+        r.raise_for_status()
+        return r.json()
+    return post
+
+
+def agent_caller():
+    """The Streamlit agent page path: NL→SQL (rules, else the LLM) then the query."""
+    from agent import FCLMAgent
+    from services.claude_llm import ClaudeLLM
+    from services.nl2sql import extract_sql
+    agents = threading.local()
+    llm = ClaudeLLM(key="agent_demo")
+
+    def run(question, timings):
+        if not hasattr(agents, "a"):
+            agents.a = FCLMAgent(str(ROOT / "db" / "fclm.duckdb"))
+        start = time.perf_counter()
+        sql = extract_sql(agents.a.nl2sql(question, llm.ask))
+        timings["agent.sql"] = time.perf_counter() - start
+        start = time.perf_counter()
+        result = agents.a.run_query(sql)
+        timings["agent.query"] = time.perf_counter() - start
+        if isinstance(result, str):
+            raise RuntimeError(result)
+    return run
+
+
+def run_level(stage, call, qs, concurrency, n):
+    """Fire n requests at the given concurrency; returns per-request {stage: seconds} and errors."""
+    samples, errors = [], []
+
+    def one(i):
+        timings = {}
+        start = time.perf_counter()
+        try:
+            call(qs[i % len(qs)], timings)
+            timings[stage] = time.perf_counter() - start
+            samples.append(timings)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n)))
+    return samples, errors, time.perf_counter() - start
+
+
+def summarize(stage, concurrency, samples, errors, wall):
+    rows = []
+    for name in sorted({k for s in samples for k in s}):
+        ms = np.array([s[name] for s in samples if name in s]) * 1e3
+        rows.append({"stage": name, "concurrency": concurrency, "requests": len(ms), "errors": len(errors),
+                     "throughput_rps": round(len(samples) / wall, 2) if name == stage else None,
+                     "p50_ms": round(np.percentile(ms, 50), 1), "p95_ms": round(np.percentile(ms, 95), 1),
+                     "p99_ms": round(np.percentile(ms, 99), 1), "max_ms": round(ms.max(), 1)})
+    if not samples:
+        rows.append({"stage": stage, "concurrency": concurrency, "requests": 0, "errors": len(errors)})
+    return rows
+
+
+def main():
+    args = parse_args()
+    configure(args)
+    if not args.keep_examples:
+        freeze_examples()
+    qs = questions(args.questions)
+    post = api_caller(args.url)
+    calls = {
+        "nl2sql": lambda q, t: post("/nl2sql", {"question": q}),
+        "powerbi_query": lambda q, t: post("/powerbi/query", {"question": q}),
+        "agent": agent_caller(),
+    }
+    rows, failures = [], {}
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        for stage in args.stages.split(","):
+            samples, errors, wall = run_level(stage, calls[stage], qs, concurrency, args.requests)
+            rows += summarize(stage, concurrency, samples, errors, wall)
+            if errors:
+                failures[f"{stage}@{concurrency}"] = errors[:3]
+
+    df = pd.DataFrame(rows)
+    OUT.mkdir(parents=True, exist_ok=True)
+    df.to_csv(OUT / "nl2sql_benchmark.csv", index=False)
+    print(df.to_string(index=False))
+    from services.llm_gateway import get_gateway
+    print("\nLLM gateway:", json.dumps(get_gateway().metrics()))
+    if not args.url:
+        from services import speculative
+        print("Speculative execution:", json.dumps(speculative.metrics()))
+    if failures:
+        print("Sample errors:", json.dumps(failures, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# scripts/benchmark_prompts.py
+"""
+Prompt size and latency of NL→SQL prompts, full schema vs relevance-pruned.
+
+"full" is the previous prompt: every table with its column stats plus the
+lot lineage columns. "pruned" is what FCLMAgent.nl2sql now sends
+(services/schema_index.py). Sizes use ~4 characters per token; with --live
+each prompt is also sent through the LLM gateway, which reports measured
+input tokens and latency. Results go to outputs/prompt_benchmark.csv.
+"""
+import argparse, duckdb, pathlib, sys, time
+import pandas as pd
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+DB   = ROOT / "db" / "fclm.duckdb"
+OUT  = ROOT / "outputs"
+sys.path.insert(0, str(ROOT))
+
+from services import lineage, stats
+from services.schema_index import nl2sql_prompt
+
+QUESTIONS = [
+    "Which machines had the most failures last month?",
+    "Average oxygen purity per machine in the O2 system",
+    "Which lots had leaks in gas mixing and failures in curing?",
+    "What is the humidity trend in curing?",
+    "Compare pressure of open and closed valves in O2 runs",
+    "Temperature by operator in curing",
+    "Flow rate of GMC02 in gas mixing over time",
+    "Cure failure rate per lot",
+]
+
+def full_prompt(question, con):
+    prompt = f"Convert this business question to SQL for DuckDB: {question}"
+    context = stats.prompt_context(con=con, db_path=DB)
+    if context:
+        prompt += f"\n\nAvailable tables (with value ranges):\n{context}"
+    lot_context = lineage.prompt_context(con=con)
+    if lot_context:
+        prompt += f"\n\n{lot_context}"
+    return prompt
+
+def pruned_prompt(question, con):
+    return nl2sql_prompt(question, con=con, db_path=DB)["prompt"]
+
+def timed(fn, *args, runs=20):
+    fn(*args)  # warm the per-version caches
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = fn(*args)
+    return result, (time.perf_counter() - start) / runs * 1e3
+
+def main():
+    parser = argparse.ArgumentParser(description="NL→SQL prompt size/latency benchmark")
+    parser.add_argument("--live", action="store_true", help="also send every prompt to Claude (needs ANTHROPIC_API_KEY)")
+    args = parser.parse_args()
+    con = duckdb.connect(DB.as_posix(), read_only=True)
+    gateway = None
+    if args.live:
+        from services.llm_gateway import get_gateway
+        gateway = get_gateway()
+
+    rows = []
+    for question in QUESTIONS:
+        for variant, build in (("full", full_prompt), ("pruned", pruned_prompt)):
+            prompt, build_ms = timed(build, question, con)
+            row = {"question": question, "variant": variant, "chars": len(prompt),
+                   "approx_tokens": len(prompt) // 4, "build_ms": round(build_ms, 3)}
+            if gateway:
+                before = gateway.metrics()["input_tokens"]
+                start = time.perf_counter()
+                gateway.complete(prompt, key="benchmark", max_tokens=256)
+                row["llm_latency_s"] = round(time.perf_counter() - start, 3)
+                row["input_tokens"] = gateway.metrics()["input_tokens"] - before
+            rows.append(row)
+    con.close()
+
+    df = pd.DataFrame(rows)
+    OUT.mkdir(parents=True, exist_ok=True)
+    df.to_csv(OUT / "prompt_benchmark.csv", index=False)
+    numeric = [c for c in ("chars", "approx_tokens", "build_ms", "llm_latency_s", "input_tokens") if c in df]
+    summary = df.groupby("variant")[numeric].mean().round(2)
+    print(df.to_string(index=False))
+    print("\nMean per question:")
+    print(summary.to_string())
+    full, pruned = summary.loc["full", "approx_tokens"], summary.loc["pruned", "approx_tokens"]
+    print(f"\nPruned prompts are {100 * (1 - pruned / full):.0f}% smaller")
+
+if __name__ == "__main__":
+    main()
@@ -6,48 +6,33 @@ from datetime import datetime, timedelta
 import re
 from rich.console import Console
 from rich.table import Table
+import sys
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 DB   = ROOT / "db" / "fclm.duckdb"
+sys.path.insert(0, str(ROOT))
+
+from services.catalog import get_catalog
+from services.failures import failure_predicate
+from services.rollups import kpi
+
 con  = duckdb.connect(DB.as_posix())
 console = Console()
 
+# Templates with a "kpi" key are answered from the KPI rollups (services/rollups.py)
 QUERY_TEMPLATES = {
     "1": {
         "name": "Show failure counts by machine",
-        "sql": """
-            SELECT {machine_col} as machine, COUNT(*) as failure_count
-            FROM {table}
-            WHERE LOWER({status_col}) LIKE '%fail%'
-               OR LOWER({status_col}) LIKE '%error%'
-               OR LOWER({status_col}) LIKE '%reject%'
-            GROUP BY {machine_col}
-            ORDER BY failure_count DESC
-        """
+        "kpi": "failures_by_machine",
     },
     "2": {
         "name": "Show daily throughput last 30 days",
-        "sql": """
-            SELECT 
-                DATE_TRUNC('day', {date_col}::TIMESTAMP) as day,
-                COUNT(*) as count
-            FROM {table}
-            WHERE {date_col}::TIMESTAMP > CURRENT_DATE - INTERVAL '30 days'
-            GROUP BY 1
-            ORDER BY 1
-        """
+        "kpi": "daily_throughput",
+        "days": 30,
     },
     "3": {
         "name": "Show status distribution",
-        "sql": """
-            SELECT 
-                {status_col} as status,
-                COUNT(*) as count,
-                (COUNT(*) * 100.0 / SUM(COUNT(*)) OVER ()) as percentage
-            FROM {table}
-            GROUP BY 1
-            ORDER BY 2 DESC
-        """
+        "kpi": "status_distribution",
     },
     "4": {
         "name": "Show recent failures",
@@ -57,9 +42,7 @@ QUERY_TEMPLATES = {
                 {machine_col} as machine,
                 {status_col} as status
             FROM {table}
-            WHERE LOWER({status_col}) LIKE '%fail%'
-               OR LOWER({status_col}) LIKE '%error%'
-               OR LOWER({status_col}) LIKE '%reject%'
+            WHERE {failure_filter}
             ORDER BY {date_col} DESC
             LIMIT 10
         """
@@ -68,17 +51,11 @@ QUERY_TEMPLATES = {
 
 def find_column(table, *patterns):
     """Find column in table matching any of the patterns."""
-    cols = con.execute(f"PRAGMA table_info('{table}')").fetchall()
-    for col in cols:
-        col_name = col[1].lower()
-        for pattern in patterns:
-            if pattern.lower() in col_name:
-                return col[1]
-    return None
+    return get_catalog(con, DB).find_column(table, *patterns)
 
 def get_tables():
     """Get list of available tables."""
-    return [t[0] for t in con.execute("SHOW TABLES").fetchall()]
+    return get_catalog(con, DB).tables()
 
 def display_results(df):
     """Display results in a nice table format."""
@@ -129,8 +106,19 @@ def main():
             console.print("[red]Invalid query number[/]")
             continue
             
+        template = QUERY_TEMPLATES[query_id]
+        if "kpi" in template:
+            try:
+                start = datetime.now().date() - timedelta(days=template["days"]) if "days" in template else None
+                console.print("\n[bold]Results:[/]")
+                display_results(kpi(template["kpi"], table, start=start, con=con))
+            except Exception as e:
+                console.print(f"[red]Error:[/] {str(e)}")
+            console.print("\n" + "─" * 80)
+            continue
+
         # Dynamically determine which columns are needed for the selected query
-        template_sql = QUERY_TEMPLATES[query_id]["sql"]
+        template_sql = template["sql"]
         needed = {}
         if "{status_col}" in template_sql:
             needed["status_col"] = find_column(table, "status", "result", "outcome")
@@ -138,6 +126,9 @@ def main():
             needed["machine_col"] = find_column(table, "machine", "tool", "station")
         if "{date_col}" in template_sql:
             needed["date_col"] = find_column(table, "date", "time", "timestamp")
+        if "{failure_filter}" in template_sql:
+            # is_failure is computed at ingestion from the shared failure rules
+            needed["failure_filter"] = failure_predicate(get_catalog(con, DB).column_names(table))
 
         missing = [k for k, v in needed.items() if v is None]
         if missing:
@@ -150,7 +141,8 @@ def main():
                 table=table,
                 status_col=needed.get("status_col", ""),
                 machine_col=needed.get("machine_col", ""),
-                date_col=needed.get("date_col", "")
+                date_col=needed.get("date_col", ""),
+                failure_filter=needed.get("failure_filter", "")
             )
 
             console.print("\n[bold]Results:[/]")
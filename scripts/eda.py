@@ -1,16 +1,20 @@
-import duckdb, pathlib, pandas as pd
+import duckdb, pathlib, pandas as pd, sys
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 DB   = ROOT / "db" / "fclm.duckdb"
 OUT  = ROOT / "outputs"
 OUT.mkdir(parents=True, exist_ok=True)
+sys.path.insert(0, str(ROOT))
+
+from services.catalog import get_catalog
 
 con = duckdb.connect(DB.as_posix())
-tables = [t[0] for t in con.execute("SHOW TABLES").fetchall()]
+catalog = get_catalog(con, DB)
+tables = catalog.tables()
 
 lines = ["# FCLM Demo — Data Dictionary\n"]
 for t in tables:
-    info = con.execute(f"DESCRIBE {t}").fetchdf()
+    info = pd.DataFrame(catalog.columns(t))
     head = con.execute(f"SELECT * FROM {t} LIMIT 5").fetchdf()
     lines.append(f"## {t}\n\n**Schema**\n\n{info.to_markdown(index=False)}\n")
     lines.append(f"**Sample rows**\n\n{head.to_markdown(index=False)}\n")
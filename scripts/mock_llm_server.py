@@ -0,0 +1,92 @@
+# scripts/mock_llm_server.py
+"""
+Local stand-in for the Anthropic Messages API.
+
+Answers POST /v1/messages (plain JSON or server-sent events when
+``stream`` is true) from the recorded question→SQL pairs, with the latency
+and error profile of services/llm_backends.ReplayProfile (LLM_REPLAY_*).
+Point the app at it with ANTHROPIC_BASE_URL=http://127.0.0.1:8765; the real
+SDK, the gateway's retries and the SSE parsing are all exercised, without
+calling Anthropic.
+
+    python scripts/mock_llm_server.py --port 8765 --median-ms 300 --p95-ms 1200 --rate-limit-rate 0.02
+"""
+import argparse, asyncio, json, os, pathlib, sys, uuid
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from services.llm_backends import OverloadedError, Recordings, ReplayProfile
+
+ERROR_TYPES = {429: "rate_limit_error", 529: "overloaded_error"}
+
+
+def create_app(recordings=None, profile=None) -> FastAPI:
+    app = FastAPI(title="Mock Anthropic Messages API")
+    app.state.recordings = recordings or Recordings.load()
+    app.state.profile = profile or ReplayProfile.from_env()
+    app.state.requests = 0
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        profile = app.state.profile
+        prompt = body["messages"][-1]["content"]
+        if isinstance(prompt, list):
+            prompt = " ".join(block.get("text", "") for block in prompt)
+        text = app.state.recordings.answer(prompt)
+        usage = {"input_tokens": max(1, len(prompt) // 4), "output_tokens": max(1, len(text) // 4)}
+        message = {"id": f"msg_{uuid.uuid4().hex[:24]}", "type": "message", "role": "assistant",
+                   "model": body.get("model", "mock"), "stop_reason": "end_turn", "stop_sequence": None}
+
+        await asyncio.sleep(profile.latency_s())
+        error = profile.error()
+        if error:
+            status = 529 if isinstance(error, OverloadedError) else 429
+            return JSONResponse({"type": "error", "error": {"type": ERROR_TYPES[status], "message": str(error)}},
+                                status_code=status)
+        if not body.get("stream"):
+            return {**message, "content": [{"type": "text", "text": text}], "usage": usage}
+
+        async def events():
+            def event(name, data):
+                return f"event: {name}\ndata: {json.dumps({'type': name, **data})}\n\n"
+            yield event("message_start", {"message": {**message, "content": [], "stop_reason": None,
+                                                      "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 1}}})
+            yield event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+            for chunk in profile.chunks(text):
+                if profile.tokens_per_s:
+                    await asyncio.sleep(1 / profile.tokens_per_s)
+                yield event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": chunk}})
+            yield event("content_block_stop", {"index": 0})
+            yield event("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                          "usage": {"output_tokens": usage["output_tokens"]}})
+            yield event("message_stop", {})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Anthropic Messages API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    for name, default in (("median-ms", 400), ("p95-ms", 1500), ("rate-limit-rate", 0), ("overloaded-rate", 0),
+                          ("tokens-per-s", 200)):
+        parser.add_argument(f"--{name}", type=float, default=None, help=f"default: LLM_REPLAY_* or {default}")
+    parser.add_argument("--recordings", default=None, help="question→SQL JSONL (default config/llm_recordings.jsonl)")
+    args = parser.parse_args()
+    for name in ("median_ms", "p95_ms", "rate_limit_rate", "overloaded_rate", "tokens_per_s"):
+        if getattr(args, name) is not None:
+            os.environ[f"LLM_REPLAY_{name.upper()}"] = str(getattr(args, name))
+    recordings = Recordings.load(args.recordings) if args.recordings else None
+
+    import uvicorn
+    uvicorn.run(create_app(recordings), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
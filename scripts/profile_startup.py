@@ -0,0 +1,80 @@
+# scripts/profile_startup.py
+"""
+Cold-start profiler for the API and Streamlit entry points.
+
+Runs each entry point in a fresh interpreter with ``-X importtime`` and reports
+the cumulative import time of every top-level module, and lists the heavy
+optional libraries each one loads. Import time is also reported relative to
+the entry point's framework (FastAPI, Streamlit) imported on its own in the
+same run, which cancels out how fast the machine is. ``--record`` writes
+those ratios (plus headroom) to tests/cold_start_budget.json, which
+tests/test_cold_start.py enforces together with the heavy-module check.
+"""
+import json, pathlib, subprocess, sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+BUDGET_FILE = ROOT / "tests" / "cold_start_budget.json"
+HEADROOM = 1.75
+# pyarrow is left out: recent pandas imports it on its own
+HEAVY_MODULES = ("anthropic", "openpyxl", "plotly", "altair", "seaborn", "matplotlib")
+
+# Streamlit entry scripts raise NoSessionContext outside `streamlit run`; imports are done by then
+ENTRY_POINTS = {
+    "api/main.py": "import api.main",
+    "app.py": "import runpy\ntry:\n    runpy.run_path('app.py')\nexcept Exception:\n    pass",
+}
+# What each entry point's framework imports by itself (Streamlit loads plotly for its chart theme)
+FRAMEWORKS = {"api/main.py": "import fastapi", "app.py": "import streamlit"}
+
+def profile(code: str):
+    """Return (total seconds, [(module, cumulative seconds)]) for the two outermost import levels."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=ROOT, capture_output=True, text=True)
+    total, modules = 0.0, []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented two spaces per level; outer ones include their children
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        seconds = int(cumulative) / 1e6
+        if level == 0:
+            total += seconds
+        if level <= 1:
+            modules.append((name.strip(), seconds))
+    return total, sorted(modules, key=lambda m: -m[1])
+
+def measure(code: str, runs: int = 3) -> float:
+    """Best-of-N total import time, to damp noise from a cold disk cache."""
+    return min(profile(code)[0] for _ in range(runs))
+
+def relative_import_time(entry: str, runs: int = 3) -> float:
+    """An entry point's import time as a multiple of its framework's own import time."""
+    return measure(ENTRY_POINTS[entry], runs) / measure(FRAMEWORKS[entry], runs)
+
+def heavy_imports(code: str) -> set:
+    """The ``HEAVY_MODULES`` in sys.modules after running ``code`` in a fresh interpreter."""
+    probe = f"{code}\nimport sys\nprint(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True)
+    lines = proc.stdout.splitlines()
+    return set(lines[-1].split()) if lines else set()
+
+def main():
+    record = "--record" in sys.argv
+    budget = {}
+    for entry, code in ENTRY_POINTS.items():
+        total, modules = profile(code)
+        print(f"\n{entry}: {total:.3f}s total import time")
+        for name, seconds in modules[:15]:
+            print(f"  {seconds:8.3f}s  {name}")
+        extra = heavy_imports(code) - heavy_imports(FRAMEWORKS[entry])
+        print(f"  heavy modules loaded: {', '.join(sorted(extra)) or 'none'}")
+        ratio = relative_import_time(entry)
+        print(f"  {ratio:.2f}x the import time of `{FRAMEWORKS[entry]}`")
+        budget[entry] = round(ratio * HEADROOM, 2)
+    if record:
+        BUDGET_FILE.write_text(json.dumps(budget, indent=2) + "\n")
+        print(f"\nRecorded budget to {BUDGET_FILE}: {budget}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# scripts/stream_ingest.py
+import argparse, os, pathlib, sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from services.streaming import LANDING_DIR, MicroBatchIngestor
+
+parser = argparse.ArgumentParser(description="Stream CSV drops from a landing directory into DuckDB.")
+parser.add_argument("--landing-dir", default=os.getenv("INGEST_LANDING_DIR", str(LANDING_DIR)))
+parser.add_argument("--batch-size", type=int, default=int(os.getenv("INGEST_BATCH_SIZE", 500)),
+                    help="Commit once this many rows are buffered for a file")
+parser.add_argument("--max-latency", type=float, default=float(os.getenv("INGEST_MAX_LATENCY", 2.0)),
+                    help="Commit buffered rows at most this many seconds after they were seen")
+args = parser.parse_args()
+
+ingestor = MicroBatchIngestor(args.landing_dir, batch_size=args.batch_size, max_latency=args.max_latency)
+print(f"👀 Watching {args.landing_dir} (batch_size={args.batch_size}, max_latency={args.max_latency}s)")
+try:
+    ingestor.run_forever()
+except KeyboardInterrupt:
+    ingestor.poll()
+    ingestor.flush(force=True)
+    print("✅ Flushed pending rows:", ingestor.metrics)
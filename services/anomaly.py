@@ -0,0 +1,230 @@
+"""
+Per-machine streaming anomaly detection.
+
+Online statistics are kept per (table, Machine_ID, metric) in
+``_anomaly_state``: Welford count/mean/M2, an EWMA with its exponentially
+weighted variance and the last ``WINDOW`` values for a rolling z-score. Each
+update only reads rows past the table's rowid watermark, scores every new
+value against the statistics accumulated before it and folds the batch into
+the state, so the cost follows the new data rather than the table size. A
+backfill runs the same vectorized code over the whole table. Flagged rows are
+appended to ``_anomalies``.
+"""
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+STATE_TABLE = "_anomaly_state"
+EVENTS_TABLE = "_anomalies"
+GROUP_COLUMN = "Machine_ID"
+METRICS = ("RTD1_Temp_C", "Pressure_psi", "FlowRate_sccm")
+Z_THRESHOLD = 3.0
+EWMA_ALPHA = 0.1
+WINDOW = 50
+# No verdicts until a machine/metric has this much history
+MIN_SAMPLES = 30
+SCORES = ["welford_z", "ewma_z", "rolling_z"]
+
+
+def _create_tables(con):
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            table_name VARCHAR, machine_id VARCHAR, metric VARCHAR, n BIGINT, mean DOUBLE, m2 DOUBLE,
+            ewma DOUBLE, ewm_var DOUBLE, recent DOUBLE[], max_rowid BIGINT, updated_at TIMESTAMP
+        )
+    """)
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {EVENTS_TABLE} (
+            table_name VARCHAR, row_id BIGINT, machine_id VARCHAR, metric VARCHAR, value DOUBLE,
+            expected DOUBLE, welford_z DOUBLE, ewma_z DOUBLE, rolling_z DOUBLE, detected_at TIMESTAMP
+        )
+    """)
+
+
+def _exists(con, table: str) -> bool:
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table]
+    ).fetchone()[0] > 0
+
+
+def _empty_state() -> Dict:
+    return {"n": 0, "mean": 0.0, "m2": 0.0, "ewma": None, "ewm_var": 0.0, "recent": []}
+
+
+def _zscore(dev, std, valid):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.abs(dev) / std
+    return np.where(valid & (std > 0), z, np.nan)
+
+
+def score_values(values: np.ndarray, state: Dict) -> tuple:
+    """
+    Score ``values`` (in arrival order) against ``state`` and return (scores, new_state).
+    Each value is compared with the statistics of everything before it, computed with
+    prefix sums instead of a per-row loop.
+    """
+    n0, mean0, m2_0 = state["n"], state["mean"], state["m2"]
+    if n0 == 0:
+        mean0 = float(values[0])
+    count = len(values)
+
+    # Welford: prior mean/M2 at every position from prefix sums of deviations
+    d = values - mean0
+    D = np.concatenate(([0.0], np.cumsum(d)))
+    Q = np.concatenate(([0.0], np.cumsum(d * d)))
+    n_prev = n0 + np.arange(count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_prev = mean0 + np.where(n_prev > 0, D[:-1] / n_prev, 0.0)
+        m2_prev = m2_0 + Q[:-1] - np.where(n_prev > 0, D[:-1] ** 2 / n_prev, 0.0)
+        std_prev = np.sqrt(np.where(n_prev > 1, np.maximum(m2_prev, 0.0) / (n_prev - 1), 0.0))
+    enough = n_prev >= MIN_SAMPLES
+    welford_z = _zscore(values - mean_prev, std_prev, enough)
+
+    # EWMA and its variance are both linear recurrences, so pandas' ewm(adjust=False)
+    # seeded with the previous state evaluates them in one pass
+    e0 = float(values[0]) if state["ewma"] is None else state["ewma"]
+    ewma = pd.Series(np.concatenate(([e0], values))).ewm(alpha=EWMA_ALPHA, adjust=False).mean().to_numpy()
+    dev = values - ewma[:-1]
+    var_in = (1 - EWMA_ALPHA) * dev * dev
+    ewm_var = pd.Series(np.concatenate(([state["ewm_var"]], var_in))).ewm(
+        alpha=EWMA_ALPHA, adjust=False).mean().to_numpy()
+    ewma_z = _zscore(dev, np.sqrt(ewm_var[:-1]), enough)
+
+    # Rolling window over the carried-over tail plus the new values
+    window = np.concatenate((np.asarray(state["recent"], dtype=float), values))
+    rolling = pd.Series(window).rolling(WINDOW, min_periods=MIN_SAMPLES)
+    roll_mean = rolling.mean().shift(1).to_numpy()[-count:]
+    roll_std = rolling.std().shift(1).to_numpy()[-count:]
+    rolling_z = _zscore(values - roll_mean, roll_std, ~np.isnan(roll_mean))
+
+    n = n0 + count
+    new_state = {
+        "n": n, "mean": mean0 + D[-1] / n, "m2": m2_0 + Q[-1] - D[-1] ** 2 / n,
+        "ewma": float(ewma[-1]), "ewm_var": float(ewm_var[-1]), "recent": window[-WINDOW:].tolist(),
+    }
+    scores = {"expected": mean_prev, "welford_z": welford_z, "ewma_z": ewma_z, "rolling_z": rolling_z}
+    return scores, new_state
+
+
+def _load_state(con, table: str) -> tuple:
+    if not _exists(con, STATE_TABLE):
+        return {}, -1
+    rows = con.execute(f"""
+        SELECT machine_id, metric, n, mean, m2, ewma, ewm_var, recent, max_rowid
+        FROM {STATE_TABLE} WHERE table_name = ?
+    """, [table]).fetchall()
+    state = {(r[0], r[1]): {"n": r[2], "mean": r[3], "m2": r[4], "ewma": r[5], "ewm_var": r[6],
+                            "recent": r[7] or []} for r in rows}
+    return state, max((r[8] for r in rows), default=-1)
+
+
+def _metrics(con, table: str, metrics) -> tuple:
+    columns = [r[0] for r in con.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = 'main' AND table_name = ?",
+        [table]).fetchall()]
+    group = GROUP_COLUMN if GROUP_COLUMN in columns else None
+    return [m for m in metrics if m in columns], group
+
+
+def update_table(con, table: str, metrics=METRICS, backfill: bool = False, store: bool = True) -> pd.DataFrame:
+    """Fold rows past the watermark (all rows with ``backfill``) into the state; returns new anomalies."""
+    metrics, group = _metrics(con, table, metrics)
+    if not metrics:
+        return pd.DataFrame()
+    state, watermark = ({}, -1) if backfill else _load_state(con, table)
+    max_rowid = con.execute(f"SELECT COALESCE(MAX(rowid), -1) FROM {table}").fetchone()[0]
+    if max_rowid < watermark:
+        # Table was replaced: its rowids restarted, so rebuild from scratch
+        state, watermark = {}, -1
+    group_expr = f'"{group}"::VARCHAR' if group else "'*'"
+    cols = ", ".join(f'"{m}"::DOUBLE AS "{m}"' for m in metrics)
+    new = con.execute(f"""
+        SELECT rowid AS row_id, {group_expr} AS machine_id, {cols}
+        FROM {table} WHERE rowid > {watermark} ORDER BY rowid
+    """).fetchdf()
+
+    events = []
+    for machine, rows in new.groupby("machine_id", sort=False, dropna=False):
+        for metric in metrics:
+            valid = rows[rows[metric].notna()]
+            if valid.empty:
+                continue
+            key = (machine, metric)
+            scores, state[key] = score_values(valid[metric].to_numpy(dtype=float), state.get(key, _empty_state()))
+            flagged = np.fmax.reduce([scores[s] for s in SCORES]) > Z_THRESHOLD
+            if flagged.any():
+                events.append(pd.DataFrame({
+                    "row_id": valid["row_id"].to_numpy()[flagged], "machine_id": machine, "metric": metric,
+                    "value": valid[metric].to_numpy()[flagged],
+                    **{k: v[flagged] for k, v in scores.items()},
+                }))
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    anomalies = pd.concat(events, ignore_index=True) if events else pd.DataFrame(
+        columns=["row_id", "machine_id", "metric", "value", "expected", *SCORES])
+    anomalies.insert(0, "table_name", table)
+    anomalies["detected_at"] = now
+    if store:
+        _create_tables(con)
+        state_df = pd.DataFrame([
+            {"table_name": table, "machine_id": m, "metric": metric, **s,
+             "max_rowid": max(max_rowid, watermark), "updated_at": now}
+            for (m, metric), s in state.items()
+        ])
+        con.execute(f"DELETE FROM {STATE_TABLE} WHERE table_name = ?", [table])
+        if backfill or watermark < 0:
+            con.execute(f"DELETE FROM {EVENTS_TABLE} WHERE table_name = ?", [table])
+        if not state_df.empty:
+            con.execute(f"INSERT INTO {STATE_TABLE} BY NAME SELECT * FROM state_df")
+        if not anomalies.empty:
+            con.execute(f"INSERT INTO {EVENTS_TABLE} BY NAME SELECT * FROM anomalies")
+    return anomalies
+
+
+def update_anomalies(con, tables=None, metrics=METRICS, backfill: bool = False, store: bool = True) -> pd.DataFrame:
+    """Update every table that carries one of ``metrics``; returns the anomalies found in this run."""
+    if tables is None:
+        tables = [r[0] for r in con.execute("SHOW TABLES").fetchall() if not r[0].startswith("_")]
+    found = [update_table(con, t, metrics, backfill, store) for t in tables]
+    found = [f for f in found if not f.empty]
+    return pd.concat(found, ignore_index=True) if found else pd.DataFrame()
+
+
+def current_anomalies(con, table: Optional[str] = None, metric: Optional[str] = None,
+                      machine: Optional[str] = None, limit: int = 100) -> pd.DataFrame:
+    """Most recent stored anomalies, optionally for one table, metric or machine."""
+    if not _exists(con, EVENTS_TABLE):
+        return pd.DataFrame()
+    filters, params = [], []
+    for column, value in (("table_name", table), ("metric", metric), ("machine_id", machine)):
+        if value is not None:
+            filters.append(f"{column} = ?")
+            params.append(value)
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+    return con.execute(f"""
+        SELECT * FROM {EVENTS_TABLE} {where}
+        ORDER BY detected_at DESC, row_id DESC LIMIT {int(limit)}
+    """, params).fetchdf()
+
+
+def is_tracked(con, table: str, metric: Optional[str] = None) -> bool:
+    """Whether ingestion keeps running state for ``table`` (and ``metric``)."""
+    if not _exists(con, STATE_TABLE):
+        return False
+    where, params = "table_name = ?", [table]
+    if metric is not None:
+        where, params = where + " AND metric = ?", params + [metric]
+    return con.execute(f"SELECT COUNT(*) FROM {STATE_TABLE} WHERE {where}", params).fetchone()[0] > 0
+
+
+def machine_state(con, table: Optional[str] = None) -> pd.DataFrame:
+    """Running mean/std/EWMA per machine and metric."""
+    if not _exists(con, STATE_TABLE):
+        return pd.DataFrame()
+    where = "WHERE table_name = ?" if table else ""
+    return con.execute(f"""
+        SELECT table_name, machine_id, metric, n, mean,
+               CASE WHEN n > 1 THEN sqrt(m2 / (n - 1)) END AS std, ewma, sqrt(ewm_var) AS ewm_std, updated_at
+        FROM {STATE_TABLE} {where} ORDER BY table_name, machine_id, metric
+    """, [table] if table else []).fetchdf()
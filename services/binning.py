@@ -0,0 +1,158 @@
+"""
+Bounded chart data for results of any size.
+
+``chart_job`` looks at a result's size and column kinds and aggregates it in
+DuckDB before anything is drawn, so a chart never needs more than a few
+thousand marks:
+
+- time column + metric: bucketed min/max series (``services.timeseries``);
+- category + metric bars: the ``TOP_N`` largest; the rest are left out and
+  counted in the note, since summing them would misstate averages and rates;
+- numeric pairs up to ``RAW_LIMIT`` rows: a plain scatter; above that a
+  ``BINS`` 2D histogram (row counts per cell), or, when a low-cardinality
+  category colours the points, a stratified sample;
+- a lone category: top-N row counts plus one "Other" bar (counts add up);
+- anything else is a table of at most ``RAW_LIMIT`` rows.
+
+The stratified sample draws from every category in proportion to its size
+(at least one row each). A share of rows estimated from an ``n`` of ``N``
+row sample is within ``error_bound(n, N)`` (95% confidence, worst case
+p = 0.5, finite population corrected) of the share in the full result;
+proportional allocation only narrows that.
+
+The jobs use the ``services.charts`` spec (kind, x, y, title, data), so the
+PNG export draws exactly what the page shows.
+"""
+import duckdb, math
+import pandas as pd
+from typing import Dict, List, Optional
+
+RAW_LIMIT = 5000
+TOP_N = 20
+BINS = (80, 60)
+SAMPLE_ROWS = 5000
+Z_95 = 1.96
+SAMPLE_SEED = 0.42
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def error_bound(n: int, total: int, z: float = Z_95) -> float:
+    """Worst-case margin of error of a proportion estimated from ``n`` of ``total`` rows."""
+    if n >= total:
+        return 0.0
+    return z * 0.5 * math.sqrt((1 - n / total) / n)
+
+
+def bins2d(con, source: str, x: str, y: str, bins=BINS) -> pd.DataFrame:
+    """Row counts on a ``bins`` grid over (x, y); one row per non-empty cell, at its centre."""
+    qx, qy = _quote(x), _quote(y)
+    x_lo, x_hi, y_lo, y_hi = con.execute(
+        f"SELECT MIN({qx})::DOUBLE, MAX({qx})::DOUBLE, MIN({qy})::DOUBLE, MAX({qy})::DOUBLE FROM {source}"
+    ).fetchone()
+    if x_lo is None or y_lo is None:
+        return pd.DataFrame(columns=[x, y, "count"])
+    wx, wy = ((x_hi - x_lo) / bins[0]) or 1.0, ((y_hi - y_lo) / bins[1]) or 1.0
+    return con.execute(f"""
+        SELECT {x_lo} + (LEAST(FLOOR(({qx} - {x_lo}) / {wx}), {bins[0] - 1}) + 0.5) * {wx} AS {qx},
+               {y_lo} + (LEAST(FLOOR(({qy} - {y_lo}) / {wy}), {bins[1] - 1}) + 0.5) * {wy} AS {qy},
+               COUNT(*) AS count
+        FROM {source} WHERE {qx} IS NOT NULL AND {qy} IS NOT NULL
+        GROUP BY 1, 2 ORDER BY 1, 2
+    """).fetchdf()
+
+
+def top_n(con, source: str, category: str, value: Optional[str] = None, n: int = TOP_N) -> pd.DataFrame:
+    """
+    Sum of ``value`` (row count without one) for the ``n`` largest categories; ``categories`` counts
+    the categories behind each row. Only row counts add up, so only they fold the rest into "Other".
+    """
+    ref = _quote(category)
+    measure = f"SUM({_quote(value)})::DOUBLE" if value else "COUNT(*)"
+    out = _quote(value or "count")
+    return con.execute(f"""
+        WITH totals AS (
+            SELECT {ref}::VARCHAR AS category, {measure} AS total,
+                   ROW_NUMBER() OVER (ORDER BY {measure} DESC NULLS LAST, {ref}::VARCHAR) AS rank
+            FROM {source} GROUP BY 1
+        )
+        SELECT CASE WHEN rank <= {n} THEN category ELSE 'Other' END AS {ref}, SUM(total) AS {out},
+               COUNT(*) AS categories
+        FROM totals {"" if value is None else f"WHERE rank <= {n}"} GROUP BY 1 ORDER BY MIN(rank)
+    """).fetchdf()
+
+
+def stratified_sample(con, source: str, strata: Optional[str], n: int = SAMPLE_ROWS,
+                      seed: float = SAMPLE_SEED) -> pd.DataFrame:
+    """About ``n`` rows drawn from every ``strata`` group in proportion to its size (at least one each)."""
+    con.execute(f"SELECT setseed({seed})")
+    partition = f"PARTITION BY {_quote(strata)}" if strata else ""
+    return con.execute(f"""
+        SELECT * EXCLUDE (_rn, _size, _total) FROM (
+            SELECT *, ROW_NUMBER() OVER ({partition} ORDER BY random()) AS _rn,
+                   COUNT(*) OVER ({partition}) AS _size, COUNT(*) OVER () AS _total
+            FROM {source}
+        ) WHERE _rn <= CEIL({int(n)} * _size / _total)
+    """).fetchdf()
+
+
+def _job(kind: str, data: pd.DataFrame, strategy: str, rows: int, x=None, y=None, color=None, note=None) -> Dict:
+    title = f"{y} by {x}" if x and y else (x or "")
+    return {"kind": kind, "x": x, "y": y, "color": color, "data": data, "title": title,
+            "strategy": strategy, "rows": rows, "note": note}
+
+
+def chart_job(df: pd.DataFrame, kinds: Dict[str, str], width_px: int = 800) -> Dict:
+    """
+    The chart to draw for ``df`` given each column's kind ("numeric", "temporal", "categorical"):
+    {"kind": "bar" | "line" | "scatter" | "bins2d" | "table", "x", "y", "color", "data", "title",
+     "strategy": "raw" | "timeseries" | "topn" | "bins2d" | "sample", "rows", "note"}.
+    """
+    cols: List[str] = list(df.columns)
+    rows = len(df)
+    numeric = [c for c in cols if kinds.get(c) == "numeric"]
+    temporal = [c for c in cols if kinds.get(c) == "temporal"]
+    categorical = [c for c in cols if kinds.get(c) == "categorical"]
+    con = duckdb.connect()
+    try:
+        con.register("frame", df)
+        # Two numeric columns are a bar chart only while they are small; large ones are scatter data
+        small_or_categorical = cols[0] not in numeric or rows <= TOP_N
+        if len(cols) == 2 and cols[1] in numeric and cols[0] not in temporal and small_or_categorical:
+            if rows <= TOP_N:
+                return _job("bar", df, "raw", rows, cols[0], cols[1])
+            # Values may be averages or rates, so the tail is not summed into an "Other" bar
+            data = top_n(con, "frame", cols[0], cols[1])
+            omitted = df[cols[0]].nunique(dropna=False) - len(data)
+            note = f"Top {len(data):,} of {len(data) + omitted:,} {cols[0]} values; {omitted:,} not shown" \
+                if omitted else None
+            return _job("bar", data.drop(columns="categories"), "topn", rows, cols[0], cols[1], note=note)
+        if temporal and [c for c in numeric if c != temporal[0]]:
+            from services.timeseries import downsample
+            x, y = temporal[0], next(c for c in numeric if c != temporal[0])
+            ts = downsample(df, x, y, width_px=width_px)
+            note = f"{rows:,} rows as {len(ts['points']):,} points ({ts['bucket']} min/max buckets)" \
+                if ts["rows"] > len(ts["points"]) else None
+            return _job("line", ts["points"].rename(columns={"time": x, "value": y}), "timeseries", rows, x, y,
+                        note=note)
+        if len(numeric) >= 2:
+            x, y = numeric[:2]
+            if rows <= RAW_LIMIT:
+                return _job("scatter", df, "raw", rows, x, y)
+            color = next((c for c in categorical if df[c].nunique() <= TOP_N), None)
+            if color:
+                sample = stratified_sample(con, "frame", color)
+                note = (f"Stratified sample of {len(sample):,} of {rows:,} rows by {color}; shares within "
+                        f"±{error_bound(len(sample), rows):.1%} (95%)")
+                return _job("scatter", sample, "sample", rows, x, y, color=color, note=note)
+            return _job("bins2d", bins2d(con, "frame", x, y), "bins2d", rows, x, y,
+                        note=f"{rows:,} rows binned on a {BINS[0]}×{BINS[1]} grid")
+        if len(cols) == 1 and categorical:
+            data = top_n(con, "frame", cols[0])
+            return _job("bar", data.drop(columns="categories"), "topn", rows, cols[0], "count")
+        note = f"First {RAW_LIMIT:,} of {rows:,} rows" if rows > RAW_LIMIT else None
+        return _job("table", df.head(RAW_LIMIT), "raw", rows, note=note)
+    finally:
+        con.close()
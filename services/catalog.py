@@ -0,0 +1,111 @@
+"""
+In-process schema catalog shared by the API, Streamlit pages and scripts.
+
+Table and column metadata is loaded with a single information_schema query
+and cached per (database, data version), so SHOW TABLES / DESCRIBE / PRAGMA
+no longer run on every page render or question. Column lookups are served
+from in-memory name indexes.
+"""
+import difflib, duckdb, pathlib, threading
+from typing import Dict, List, Optional
+from services.versioning import data_version
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+DB_PATH = ROOT / "db" / "fclm.duckdb"
+
+_CATALOGS: Dict[tuple, "Catalog"] = {}
+_LOCK = threading.Lock()
+
+
+class Catalog:
+    def __init__(self, rows, version: str):
+        """rows: (table, column, type) tuples in ordinal order."""
+        self.version = version
+        self._columns: Dict[str, List[Dict]] = {}
+        for table, column, col_type in rows:
+            self._columns.setdefault(table, []).append({"column_name": column, "column_type": col_type})
+        self._tables_lower = {t.lower(): t for t in self._columns}
+        self._names_lower = {t: {c["column_name"].lower(): c["column_name"] for c in cols}
+                             for t, cols in self._columns.items()}
+        self._types = {t: {c["column_name"]: c["column_type"] for c in cols} for t, cols in self._columns.items()}
+
+    def tables(self) -> List[str]:
+        return list(self._columns)
+
+    def has_table(self, table: str) -> bool:
+        return table.lower() in self._tables_lower
+
+    def columns(self, table: str) -> List[Dict]:
+        """[{"column_name", "column_type"}, ...] in table order."""
+        return self._columns.get(self._tables_lower.get(table.lower(), table), [])
+
+    def column_names(self, table: str) -> List[str]:
+        return [c["column_name"] for c in self.columns(table)]
+
+    def column_type(self, table: str, column: str) -> Optional[str]:
+        return self._types.get(table, {}).get(column)
+
+    def schema_info(self) -> Dict[str, List[Dict]]:
+        """Schema in the {table: [{"column_name", "column_type"}]} shape used by ask_data."""
+        return {t: list(cols) for t, cols in self._columns.items()}
+
+    def find_column(self, table: str, *candidates) -> Optional[str]:
+        """
+        Return the FIRST matching column (case-insensitive, substring ok).
+        Exact names win over substrings, earlier candidates over later ones.
+        """
+        names = self._names_lower.get(self._tables_lower.get(table.lower(), table), {})
+        for cand in candidates:
+            if cand.lower() in names:
+                return names[cand.lower()]
+        for cand in candidates:
+            lc = cand.lower()
+            for k, original in names.items():
+                if lc in k:
+                    return original
+        return None
+
+    def closest_columns(self, name: str, table: Optional[str] = None, n: int = 3) -> List[str]:
+        """Fuzzy matches for a (possibly misspelled) column name."""
+        tables = [table] if table else self.tables()
+        names = {}
+        for t in tables:
+            names.update(self._names_lower.get(self._tables_lower.get(t.lower(), t), {}))
+        return [names[k] for k in difflib.get_close_matches(name.lower(), names, n=n, cutoff=0.6)]
+
+
+def _load(con) -> List[tuple]:
+    return con.execute("""
+        SELECT table_name, column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = 'main' AND table_name NOT LIKE '\\_%' ESCAPE '\\'
+        ORDER BY table_name, ordinal_position
+    """).fetchall()
+
+
+def get_catalog(con=None, db_path=DB_PATH) -> Catalog:
+    """Catalog for the current data version; loads once per version."""
+    key = (str(pathlib.Path(db_path).resolve()), data_version())
+    catalog = _CATALOGS.get(key)
+    if catalog is not None:
+        return catalog
+    with _LOCK:
+        if key not in _CATALOGS:
+            owned = con is None
+            con = con or duckdb.connect(str(db_path), read_only=True)
+            try:
+                rows = _load(con)
+            finally:
+                if owned:
+                    con.close()
+            # Older versions are never asked for again
+            for stale in [k for k in _CATALOGS if k[0] == key[0]]:
+                del _CATALOGS[stale]
+            _CATALOGS[key] = Catalog(rows, key[1])
+        return _CATALOGS[key]
+
+
+def invalidate():
+    """Drop cached catalogs, e.g. after tables are created outside ingestion."""
+    with _LOCK:
+        _CATALOGS.clear()
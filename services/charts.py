@@ -0,0 +1,137 @@
+"""
+Batch rendering of the KPI charts written to outputs/.
+
+Chart data is queried concurrently (one DuckDB cursor per query) and each
+chart's input is hashed together with its spec. Charts whose hash matches
+the last render recorded in ``charts_manifest.json`` are skipped; the rest
+are rendered in a process pool on the non-interactive Agg backend. The
+manifest lists every chart with its hash, row count and render time.
+"""
+import hashlib, json, os, pathlib
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from services.failures import category_names
+from services.rollups import kpi
+
+MANIFEST_FILE = "charts_manifest.json"
+# chart -> (kpi, rows kept, plot kind, x, y, title)
+CHARTS = {
+    "status_counts": ("status_distribution", 15, "bar", "status", "count", "{table}: counts by status"),
+    "failures_by_machine": ("failures_by_machine", 20, "bar", "machine", "failures",
+                            "{table}: failures by machine ({categories})"),
+    "monthly_counts": ("monthly_throughput", None, "line", "month", "count", "{table}: monthly counts"),
+}
+
+
+def _query(con, table: str, chart: str) -> Optional[Dict]:
+    name, limit, kind, x, y, title = CHARTS[chart]
+    df = kpi(name, table, con=con).dropna(subset=[x])
+    if limit:
+        df = df.head(limit)
+    if df.empty:
+        return None
+    return {"name": f"{table}_{chart}.png", "kind": kind, "x": x, "y": y, "data": df,
+            "title": title.format(table=table, categories=", ".join(category_names()))}
+
+
+def chart_jobs(con, tables: List[str], charts=None, workers: int = 4) -> List[Dict]:
+    """Chart specs with their data for every (table, chart), queried concurrently on cursors."""
+    pairs = [(t, c) for t in tables for c in (charts or CHARTS)]
+    if not pairs:
+        return []
+
+    def run(pair):
+        cursor = con.cursor()
+        try:
+            return _query(cursor, *pair)
+        finally:
+            cursor.close()
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(pairs))) as pool:
+        return [job for job in pool.map(run, pairs) if job]
+
+
+def data_hash(job: Dict) -> str:
+    """Hash of a chart's spec and input data; unchanged data renders to the same hash."""
+    spec = {k: str(v) for k, v in job.items() if k != "data"}
+    df = job["data"]
+    h = hashlib.sha256(json.dumps(spec, sort_keys=True).encode())
+    h.update(json.dumps([str(c) for c in df.columns]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def render(job: Dict, path) -> str:
+    """Draw one chart to ``path`` (a file name or a binary file object); runs in a worker process."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    df = job["data"]
+    if job["kind"] == "heatmap":
+        import seaborn as sns
+        fig, ax = plt.subplots(figsize=(10, 8))
+        sns.heatmap(df, annot=True, cmap="RdYlBu_r", center=0, vmin=-1, vmax=1, ax=ax)
+        ax.set_title(job["title"])
+    elif job["kind"] == "bins2d":
+        # Row counts per grid cell from services.binning, one row per non-empty cell
+        grid = df.pivot_table(index=job["y"], columns=job["x"], values="count", aggfunc="sum")
+        fig, ax = plt.subplots()
+        mesh = ax.pcolormesh(grid.columns, grid.index, grid.values, shading="nearest", cmap="viridis")
+        fig.colorbar(mesh, ax=ax, label="rows")
+        ax.set(xlabel=job["x"], ylabel=job["y"], title=job["title"])
+    elif job["kind"] == "scatter" and job.get("color"):
+        fig, ax = plt.subplots()
+        for name, group in df.groupby(job["color"]):
+            ax.scatter(group[job["x"]], group[job["y"]], s=6, label=str(name))
+        ax.legend(title=job["color"], fontsize="small")
+        ax.set(xlabel=job["x"], ylabel=job["y"], title=job["title"])
+    else:
+        fig, ax = plt.subplots()
+        df.plot(kind=job["kind"], x=job["x"], y=job["y"], title=job["title"], ax=ax)
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def load_manifest(out_dir) -> Dict[str, Dict]:
+    path = pathlib.Path(out_dir) / MANIFEST_FILE
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _write_manifest(out_dir, manifest: Dict[str, Dict]):
+    path = pathlib.Path(out_dir) / MANIFEST_FILE
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(tmp, path)
+
+
+def render_charts(jobs: List[Dict], out_dir, workers: Optional[int] = None, force: bool = False) -> Dict[str, List[str]]:
+    """Render the charts whose input changed since the last run; returns {"rendered", "skipped"} file names."""
+    out_dir = pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    todo, skipped = [], []
+    for job in jobs:
+        digest = data_hash(job)
+        previous = manifest.get(job["name"], {})
+        if not force and previous.get("hash") == digest and (out_dir / job["name"]).exists():
+            skipped.append(job["name"])
+        else:
+            todo.append((job, digest))
+
+    paths = [str(out_dir / job["name"]) for job, _ in todo]
+    if len(todo) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(todo))) as pool:
+            list(pool.map(render, [job for job, _ in todo], paths))
+    else:
+        for (job, _), path in zip(todo, paths):
+            render(job, path)
+
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    for job, digest in todo:
+        manifest[job["name"]] = {"hash": digest, "title": job["title"], "rows": len(job["data"]), "rendered_at": now}
+    _write_manifest(out_dir, manifest)
+    return {"rendered": [job["name"] for job, _ in todo], "skipped": skipped}
@@ -1,17 +1,19 @@
 # Claude LLM integration for chatbot
-import os
-import anthropic
+from services.llm_gateway import DEFAULT_MODEL, get_gateway
 
 class ClaudeLLM:
-    def __init__(self, api_key=None, model="claude-3-opus-20240229"):
-        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+    """Thin per-page handle on the process-wide LLM gateway (services/llm_gateway.py)."""
+    def __init__(self, api_key=None, model=DEFAULT_MODEL, key="default"):
+        self.gateway = get_gateway(api_key, model)
         self.model = model
-        self.client = anthropic.Anthropic(api_key=self.api_key)
+        self.key = key
 
     def ask(self, prompt):
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=512,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.content[0].text if response.content else "No response."
+        return self.gateway.complete(prompt, key=self.key) or "No response."
+
+    def stream(self, prompt):
+        """Yield the answer's text as it streams in."""
+        return self.gateway.stream(prompt, key=self.key)
+
+    def metrics(self):
+        return self.gateway.metrics()
@@ -2,10 +2,20 @@
 DuckDB connection and safe SELECT execution for Power BI agent
 """
 import duckdb, pandas as pd
-from typing import Any
+from typing import Any, Optional
 import re
+from services import snapshots
 
-def safe_execute_select(sql: str) -> pd.DataFrame:
+DB_PATH = "db/fclm.duckdb"
+
+def connect(as_of: Optional[str] = None):
+    """Read-only connection to the served data version, or to the snapshot at ``as_of``."""
+    version = snapshots.resolve_version(as_of) if as_of else snapshots.current_version()
+    if snapshots.needs_snapshot_connection(version):
+        return snapshots.snapshot_connection(version)
+    return duckdb.connect(DB_PATH, read_only=True)
+
+def check_select(sql: str) -> None:
     # Guardrail: only SELECT allowed
     if not sql.strip().lower().startswith("select"):
         raise ValueError("Only SELECT statements are allowed.")
@@ -14,7 +24,10 @@ def safe_execute_select(sql: str) -> pd.DataFrame:
     for word in forbidden:
         if re.search(rf"\b{word}\b", sql, re.I):
             raise ValueError(f"Forbidden SQL keyword: {word}")
-    con = duckdb.connect("db/fclm.duckdb", read_only=True)
+
+def safe_execute_select(sql: str, as_of: Optional[str] = None) -> pd.DataFrame:
+    check_select(sql)
+    con = connect(as_of)
     try:
         df = con.execute(sql).fetchdf()
     finally:
@@ -0,0 +1,133 @@
+"""
+Server-side filtering and chart aggregation for the dashboard explorer.
+
+Filters are (column, op, value) tuples: ``("Status", "in", ("Fail",))`` or
+``("Pressure_psi", "between", (40.0, 45.0))``. They become a parameterized
+WHERE clause; column names are checked against the table's schema and
+values are only ever bound as parameters. Charts (bar, pie, time series) are
+aggregated by DuckDB over the full table, so the page receives a few dozen
+rows instead of a sample it would have to count itself; time series are
+bucketed and downsampled by ``services.timeseries``. Filter options come
+from the values precomputed at ingestion (``services.stats``), or from one
+grouped scan when a table has no stats yet.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+from services.stats import DB_PATH, MAX_VALUES, column_values, distinct_values, is_numeric, is_temporal, table_stats
+
+TOP_N = 10
+PIE_SLICES = 8
+ROW_LIMIT = 1000
+CHARTS = ("bar", "pie", "timeseries")
+
+Filter = Tuple[str, str, tuple]
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_types(con, table: str) -> Dict[str, str]:
+    return dict(con.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = 'main' AND table_name = ? ORDER BY ordinal_position", [table]
+    ).fetchall())
+
+
+def _checked(types: Dict[str, str], table: str, column: str) -> str:
+    if column not in types:
+        raise ValueError(f"Unknown column '{column}' in table '{table}'")
+    return _quote(column)
+
+
+def where_clause(filters: Sequence[Filter], types: Dict[str, str], table: str) -> Tuple[str, List]:
+    """``WHERE ...`` with ``?`` placeholders and its parameters ("" when there are no filters)."""
+    clauses, params = [], []
+    for column, op, value in filters or ():
+        ref = _checked(types, table, column)
+        if op == "in":
+            values = list(value)
+            if not values:
+                continue
+            clauses.append(f"{ref}::VARCHAR IN ({', '.join('?' * len(values))})")
+            params += [str(v) for v in values]
+        elif op == "between":
+            lo, hi = value
+            clauses.append(f"{ref} BETWEEN ? AND ?")
+            params += [lo, hi]
+        else:
+            raise ValueError(f"Unsupported filter operator '{op}'")
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+
+def filter_options(con, table: str, db_path=DB_PATH) -> Dict[str, Dict]:
+    """
+    {column: {"kind": "values", "values": [...]}} for low-cardinality text columns and
+    {column: {"kind": "range", "min": .., "max": ..}} for numeric ones.
+    """
+    types = column_types(con, table)
+    stats = table_stats(table, con, db_path)
+    values = column_values(table, con)
+    if not values:
+        # Stats predating the value lists (or none yet): list the text columns' values in one grouped scan
+        text = [c for c, t in types.items() if not is_numeric(t) and not is_temporal(t)]
+        df = distinct_values(con, table, text)
+        values = {c: g["value"].tolist() for c, g in df.groupby("column_name", sort=False) if len(g) <= MAX_VALUES}
+    options: Dict[str, Dict] = {}
+    for column, col_type in types.items():
+        if column in values:
+            options[column] = {"kind": "values", "values": values[column]}
+        elif is_numeric(col_type) and not stats.empty:
+            s = stats[stats["column_name"] == column]
+            if len(s) and s.iloc[0]["min_value"] is not None and s.iloc[0]["max_value"] is not None:
+                options[column] = {"kind": "range", "min": float(s.iloc[0]["min_value"]),
+                                   "max": float(s.iloc[0]["max_value"])}
+    return options
+
+
+def aggregate(con, table: str, chart: str, column: str, filters: Sequence[Filter] = (),
+              value: Optional[str] = None) -> pd.DataFrame:
+    """
+    Chart data computed over the full (filtered) table: bar -> top ``TOP_N`` (value, count);
+    pie -> top ``PIE_SLICES`` plus "Other"; timeseries -> (time, value) points over the ``column``
+    timestamps, row counts or the min/max of ``value`` per bucket.
+    """
+    if chart not in CHARTS:
+        raise ValueError(f"Unknown chart '{chart}'. Available: {', '.join(CHARTS)}")
+    if chart == "timeseries":
+        # services.timeseries builds on this module's filters
+        from services.timeseries import series
+        return series(con, table, column, value, filters=filters)["points"]
+    types = column_types(con, table)
+    ref = _checked(types, table, column)
+    where, params = where_clause(filters, types, table)
+    source = f"{_quote(table)} {where}"
+    if chart == "bar":
+        sql = (f"SELECT {ref}::VARCHAR AS value, COUNT(*) AS count FROM {source} "
+               f"GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT {TOP_N}")
+    else:
+        sql = f"""
+            WITH counts AS (
+                SELECT {ref}::VARCHAR AS value, COUNT(*) AS count,
+                       ROW_NUMBER() OVER (ORDER BY COUNT(*) DESC, {ref}::VARCHAR) AS rank
+                FROM {source} GROUP BY 1
+            )
+            SELECT CASE WHEN rank <= {PIE_SLICES} THEN value ELSE 'Other' END AS value, SUM(count)::BIGINT AS count
+            FROM counts GROUP BY 1 ORDER BY MIN(rank)
+        """
+    return con.execute(sql, params).fetchdf()
+
+
+def filtered_rows(con, table: str, filters: Sequence[Filter] = (), limit: int = ROW_LIMIT) -> Dict:
+    """The first ``limit`` matching rows and the total number of matches."""
+    types = column_types(con, table)
+    where, params = where_clause(filters, types, table)
+    total = con.execute(f"SELECT COUNT(*) FROM {_quote(table)} {where}", params).fetchone()[0]
+    rows = con.execute(f"SELECT * FROM {_quote(table)} {where} LIMIT {int(limit)}", params).fetchdf()
+    return {"rows": rows, "total": total}
+
+
+def datetime_column(types: Dict[str, str]) -> Optional[str]:
+    """The column a time series is drawn over: a DATE/TIMESTAMP column, else one named like a date or time."""
+    typed = next((c for c, t in types.items() if t.upper().startswith(("TIMESTAMP", "DATE"))), None)
+    return typed or next((c for c in types if "date" in c.lower() or "time" in c.lower()), None)
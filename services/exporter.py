@@ -2,9 +2,6 @@
 Exporter for DataFrame to CSV, Parquet, XLSX for Power BI agent
 """
 import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
-import openpyxl
 import os
 
 def export_df(df: pd.DataFrame, out_path: str, fmt: str):
@@ -12,9 +9,13 @@ def export_df(df: pd.DataFrame, out_path: str, fmt: str):
     if fmt == "csv":
         df.to_csv(out_path, index=False)
     elif fmt == "parquet":
+        # pyarrow is only loaded for Parquet exports to keep API cold start light
+        import pyarrow as pa
+        import pyarrow.parquet as pq
         table = pa.Table.from_pandas(df)
         pq.write_table(table, out_path)
     elif fmt == "xlsx":
+        # pandas loads openpyxl on demand
         df.to_excel(out_path, index=False)
     else:
         raise ValueError(f"Unsupported export format: {fmt}")
@@ -0,0 +1,144 @@
+"""
+Failure classification defined once and materialized at ingestion.
+
+The rule set in ``config/failure_rules.json`` lists which columns carry the
+outcome (Status) and free-text issues (Remarks, Defect_Type), plus ordered
+keyword categories. Each distinct text value is classified once into
+``_failure_dictionary``. The tables then get ``is_failure`` /
+``failure_category`` and ``has_issue`` / ``issue_category`` columns, filled by
+a join on that dictionary. Consumers filter on these columns instead of
+chaining ``LOWER(col) LIKE '%...%'`` over the raw strings.
+"""
+import json, os, pathlib
+import pandas as pd
+from typing import Dict, Iterable, List, Optional
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+RULES_FILE = pathlib.Path(os.getenv("FAILURE_RULES_FILE", ROOT / "config" / "failure_rules.json"))
+DICTIONARY_TABLE = "_failure_dictionary"
+FAILURE_FLAG, FAILURE_CATEGORY = "is_failure", "failure_category"
+ISSUE_FLAG, ISSUE_CATEGORY = "has_issue", "issue_category"
+# kind -> (rules key listing source columns, flag column, category column)
+KINDS = {
+    "failure": ("failure_columns", FAILURE_FLAG, FAILURE_CATEGORY),
+    "issue": ("issue_columns", ISSUE_FLAG, ISSUE_CATEGORY),
+}
+
+_RULES: Dict[str, Dict] = {}
+
+
+def load_rules(path=RULES_FILE) -> Dict:
+    path = str(path)
+    if path not in _RULES:
+        _RULES[path] = json.loads(pathlib.Path(path).read_text())
+    return _RULES[path]
+
+
+def category_names(rules: Optional[Dict] = None) -> List[str]:
+    return [c["name"] for c in (rules or load_rules())["categories"]]
+
+
+def keywords(rules: Optional[Dict] = None) -> List[str]:
+    return [kw for c in (rules or load_rules())["categories"] for kw in c["keywords"]]
+
+
+def categorize(value, rules: Optional[Dict] = None) -> Optional[str]:
+    """Category of one text value (first matching rule), None when it is not a failure."""
+    if value is None:
+        return None
+    text = str(value).lower()
+    for c in (rules or load_rules())["categories"]:
+        if any(kw in text for kw in c["keywords"]):
+            return c["name"]
+    return None
+
+
+def source_column(columns: Iterable[str], kind: str = "failure", rules: Optional[Dict] = None) -> Optional[str]:
+    """The first configured source column of ``kind`` present in ``columns`` (case-insensitive)."""
+    lower = {c.lower(): c for c in columns}
+    for cand in (rules or load_rules())[KINDS[kind][0]]:
+        if cand.lower() in lower:
+            return lower[cand.lower()]
+    return None
+
+
+def _ref(column: str, alias: Optional[str]) -> str:
+    return f'{alias}."{column}"' if alias else f'"{column}"'
+
+
+def keyword_expr(column: str, alias: Optional[str] = None) -> str:
+    """Raw-text predicate, only for tables that were not classified at ingestion."""
+    ref = _ref(column, alias)
+    return "(" + " OR ".join(f"lower({ref}) LIKE '%{kw}%'" for kw in keywords()) + ")"
+
+
+def failure_predicate(columns: Iterable[str], alias: Optional[str] = None, kind: str = "failure") -> Optional[str]:
+    """Boolean SQL for "this row is a failure" (or has an issue), preferring the materialized flag."""
+    columns = list(columns)
+    flag = KINDS[kind][1]
+    if flag in columns:
+        return f"COALESCE({_ref(flag, alias)}, false)"
+    source = source_column(columns, kind)
+    return f"COALESCE({keyword_expr(source, alias)}, false)" if source else None
+
+
+def _create_dictionary(con):
+    con.execute(f"CREATE TABLE IF NOT EXISTS {DICTIONARY_TABLE} (table_name VARCHAR, column_name VARCHAR, value VARCHAR, category VARCHAR)")
+
+
+def _columns(con, table: str) -> List[str]:
+    return [r[0] for r in con.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = 'main' AND table_name = ? "
+        "ORDER BY ordinal_position", [table]).fetchall()]
+
+
+def classify(con, table: str, since_rowid: int = -1) -> Dict[str, str]:
+    """Fill the classification columns of ``table`` for rows past ``since_rowid``; returns kind -> source column."""
+    rules = load_rules()
+    _create_dictionary(con)
+    columns = _columns(con, table)
+    done = {}
+    for kind, (_, flag, category) in KINDS.items():
+        source = source_column(columns, kind, rules)
+        if not source:
+            continue
+        if flag not in columns:
+            con.execute(f'ALTER TABLE {table} ADD COLUMN {flag} BOOLEAN')
+            con.execute(f'ALTER TABLE {table} ADD COLUMN {category} VARCHAR')
+        # Only text values not seen before are classified, once each
+        new_values = con.execute(f"""
+            SELECT DISTINCT "{source}"::VARCHAR FROM {table} WHERE rowid > {since_rowid} AND "{source}" IS NOT NULL
+            EXCEPT SELECT value FROM {DICTIONARY_TABLE} WHERE table_name = ? AND column_name = ?
+        """, [table, source]).fetchall()
+        if new_values:
+            entries = pd.DataFrame({"table_name": table, "column_name": source,
+                                    "value": [v[0] for v in new_values],
+                                    "category": [categorize(v[0], rules) for v in new_values]})
+            con.execute(f"INSERT INTO {DICTIONARY_TABLE} BY NAME SELECT * FROM entries")
+        con.execute(f"""
+            UPDATE {table} SET {flag} = d.category IS NOT NULL, {category} = d.category
+            FROM {DICTIONARY_TABLE} d
+            WHERE d.table_name = ? AND d.column_name = ? AND d.value = {table}."{source}"::VARCHAR
+              AND {table}.rowid > {since_rowid}
+        """, [table, source])
+        con.execute(f'UPDATE {table} SET {flag} = false WHERE "{source}" IS NULL AND rowid > {since_rowid}')
+        done[kind] = source
+    return done
+
+
+def classify_tables(con, tables, rebuild: bool = False) -> Dict[str, Dict[str, str]]:
+    """Classify freshly loaded tables; with ``rebuild`` their dictionary entries are re-derived from the rules."""
+    result = {}
+    for table in tables:
+        if rebuild:
+            _create_dictionary(con)
+            con.execute(f"DELETE FROM {DICTIONARY_TABLE} WHERE table_name = ?", [table])
+        result[table] = classify(con, table)
+    return result
+
+
+def dictionary(con, table: Optional[str] = None) -> pd.DataFrame:
+    """Distinct text values with their category."""
+    where = "WHERE table_name = ?" if table else ""
+    return con.execute(f"SELECT * FROM {DICTIONARY_TABLE} {where} ORDER BY table_name, column_name, value",
+                       [table] if table else []).fetchdf()
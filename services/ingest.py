@@ -0,0 +1,51 @@
+"""
+CSV ingestion into DuckDB, shared by scripts/ingest.py and the agent refresh
+"""
+import duckdb, pathlib, re
+from typing import Dict, List
+from services import snapshots
+from services.anomaly import update_anomalies
+from services.failures import classify_tables
+from services.lineage import update_lineage
+from services.quality import profile_tables
+from services.rollups import update_rollups
+from services.stats import compute_column_stats
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+RAW_DIR = ROOT / "data" / "raw"
+DB_PATH = ROOT / "db" / "fclm.duckdb"
+
+def table_name(csv_path) -> str:
+    """Table name derived from a CSV file name (O2_Gas_Data_FCLM.csv -> o2_gas_data_fclm)."""
+    return re.sub(r"[^a-z0-9_]", "_", pathlib.Path(csv_path).stem.lower())
+
+def load_raw_csvs(con, raw_dir=RAW_DIR) -> List[str]:
+    """Load every CSV in raw_dir as its own table, replacing existing tables."""
+    tables = []
+    for csv_path in sorted(pathlib.Path(raw_dir).glob("*.csv")):
+        table = table_name(csv_path)
+        con.execute(f"""
+            CREATE OR REPLACE TABLE {table} AS
+            SELECT * FROM read_csv_auto('{csv_path.as_posix()}', header=True, sample_size=-1);
+        """)
+        tables.append(table)
+    return tables
+
+def run_ingestion(db_path=DB_PATH, raw_dir=RAW_DIR) -> Dict:
+    """Full refresh: reload and classify the CSVs, snapshot them, then rebuild stats, DQ, anomalies, KPI rollups and lineage."""
+    pathlib.Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    con = duckdb.connect(str(db_path))
+    try:
+        tables = load_raw_csvs(con, raw_dir)
+        # Failure flags/categories are part of the tables from here on, snapshots included
+        classify_tables(con, tables, rebuild=True)
+        version = snapshots.create_snapshot(con, tables)
+        compute_column_stats(con, tables)
+        profile_tables(con, tables, incremental=False)
+        update_anomalies(con, tables, backfill=True)
+        # Reloaded tables start their rowids over, so their rollups are rebuilt
+        update_rollups(con, tables, rebuild=True)
+        update_lineage(con, tables, rebuild=True)
+    finally:
+        con.close()
+    return {"tables": tables, "version": version}
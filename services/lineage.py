@@ -0,0 +1,202 @@
+"""
+Lot_ID lineage across the curing, gas mixing and O2 stages.
+
+``lot_lineage`` holds one row per lot with run counts, failure counts and
+rates, issue remarks and average process metrics for every stage, so
+cross-process questions are answered without many-to-many joins of the raw
+tables. It is derived from ``_lot_measures``, which stores additive sums per
+(lot, stage, measure). Streamed rows past each table's rowid watermark are
+merged into those sums, and only the lots they touch are re-pivoted.
+``_lot_index`` maps each lot to its row ids per stage for drill-through.
+"""
+import duckdb, pathlib, re
+import pandas as pd
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from services.failures import failure_predicate
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+DB_PATH = ROOT / "db" / "fclm.duckdb"
+
+LINEAGE_TABLE = "lot_lineage"
+MEASURES_TABLE = "_lot_measures"
+INDEX_TABLE = "_lot_index"
+WATERMARK_TABLE = "_lineage_watermarks"
+LOT_COLUMN = "Lot_ID"
+# stage -> (table, averaged metrics); failures and issues come from the failure classification
+STAGES = {
+    "cure": ("cure_table1", ("RTD1_Temp_C", "Pressure_psi", "Humidity")),
+    "gas": ("gas_mixing_system", ("FlowRate_sccm", "Pressure_psi", "Mix_Ratio_percent")),
+    "o2": ("o2_gas_data_fclm", ("FlowRate_sccm", "Pressure_psi", "O2_Purity_%")),
+}
+COUNTS = ("runs", "failures", "issues")
+
+
+def measure_name(metric: str) -> str:
+    """Column-safe name of a metric (O2_Purity_% -> o2_purity)."""
+    return re.sub(r"[^a-z0-9]+", "_", metric.lower()).strip("_")
+
+
+def stage_for_table(table: str) -> Optional[str]:
+    return next((s for s, spec in STAGES.items() if spec[0] == table), None)
+
+
+def _exists(con, table: str) -> bool:
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table]
+    ).fetchone()[0] > 0
+
+
+def _create_tables(con):
+    con.execute(f"CREATE TABLE IF NOT EXISTS {MEASURES_TABLE} (lot_id VARCHAR, stage VARCHAR, measure VARCHAR, total DOUBLE, n BIGINT)")
+    con.execute(f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} (lot_id VARCHAR, stage VARCHAR, row_ids BIGINT[])")
+    con.execute(f"CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (table_name VARCHAR PRIMARY KEY, max_rowid BIGINT, updated_at TIMESTAMP)")
+
+
+def _pivot_sql(where: str = "") -> str:
+    """One row per lot with every stage's measures as columns."""
+    cols = []
+    for stage, (_, metrics) in STAGES.items():
+        pick = lambda m, expr: f"MAX({expr}) FILTER (WHERE stage = '{stage}' AND measure = '{m}')"
+        for m in COUNTS:
+            cols.append(f"COALESCE({pick(m, 'total')}, 0)::BIGINT AS {stage}_{m}")
+        cols.append(f"{pick('failures', 'total')} / {pick('runs', 'total')} AS {stage}_failure_rate")
+        for metric in metrics:
+            name = measure_name(metric)
+            cols.append(f"{pick(name, 'total / NULLIF(n, 0)')} AS {stage}_avg_{name}")
+    any_failure = " OR ".join(f"{stage}_failures > 0" for stage in STAGES)
+    stages_seen = " + ".join(f"({stage}_runs > 0)::INT" for stage in STAGES)
+    return f"""
+        SELECT *, {any_failure} AS any_failure, {stages_seen} AS stages_seen FROM (
+            SELECT lot_id, {', '.join(cols)} FROM {MEASURES_TABLE} {where} GROUP BY lot_id
+        )
+    """
+
+
+def _delta_sql(con, stage: str, watermark: int) -> Optional[str]:
+    table, metrics = STAGES[stage]
+    columns = {r[0] for r in con.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = 'main' AND table_name = ?",
+        [table]).fetchall()}
+    if LOT_COLUMN not in columns:
+        return None
+    flag = lambda kind: (f"COUNT(*) FILTER (WHERE {failure_predicate(columns, kind=kind)})"
+                         if failure_predicate(columns, kind=kind) else "0")
+    measures = [f"{{'measure': 'runs', 'total': COUNT(*)::DOUBLE, 'n': COUNT(*)}}",
+                f"{{'measure': 'failures', 'total': {flag('failure')}::DOUBLE, 'n': COUNT(*)}}",
+                f"{{'measure': 'issues', 'total': {flag('issue')}::DOUBLE, 'n': COUNT(*)}}"]
+    measures += [f"{{'measure': '{measure_name(m)}', 'total': SUM(\"{m}\")::DOUBLE, 'n': COUNT(\"{m}\")}}"
+                 for m in metrics if m in columns]
+    return f"""
+        SELECT lot_id, '{stage}' AS stage, unnest(measures, recursive := true), row_ids FROM (
+            SELECT "{LOT_COLUMN}"::VARCHAR AS lot_id, [{', '.join(measures)}] AS measures,
+                   list(rowid ORDER BY rowid) AS row_ids
+            FROM {table} WHERE rowid > {watermark} AND "{LOT_COLUMN}" IS NOT NULL GROUP BY 1
+        )
+    """
+
+
+def update_lineage(con, tables=None, rebuild: bool = False) -> int:
+    """Merge new stage rows into the per-lot sums and re-pivot the lots they touch; returns lots updated."""
+    _create_tables(con)
+    touched = set()
+    full = rebuild or not _exists(con, LINEAGE_TABLE)
+    for stage, (table, _) in STAGES.items():
+        if (tables is not None and table not in tables) or not _exists(con, table):
+            continue
+        row = con.execute(f"SELECT max_rowid FROM {WATERMARK_TABLE} WHERE table_name = ?", [table]).fetchone()
+        watermark = -1 if rebuild or row is None else row[0]
+        max_rowid = con.execute(f"SELECT COALESCE(MAX(rowid), -1) FROM {table}").fetchone()[0]
+        if max_rowid < watermark:
+            # Table was replaced: its rowids restarted
+            watermark = -1
+        delta = _delta_sql(con, stage, watermark)
+        if delta is None:
+            continue
+        if watermark < 0:
+            touched.update(r[0] for r in con.execute(f"SELECT DISTINCT lot_id FROM {MEASURES_TABLE} WHERE stage = ?", [stage]).fetchall())
+            con.execute(f"DELETE FROM {MEASURES_TABLE} WHERE stage = ?", [stage])
+            con.execute(f"DELETE FROM {INDEX_TABLE} WHERE stage = ?", [stage])
+        if max_rowid > watermark:
+            con.execute(f"CREATE OR REPLACE TEMP TABLE _lineage_delta AS {delta}")
+            con.execute(f"""
+                MERGE INTO {MEASURES_TABLE} AS m USING _lineage_delta AS d
+                ON m.lot_id = d.lot_id AND m.stage = d.stage AND m.measure = d.measure
+                WHEN MATCHED THEN UPDATE SET total = COALESCE(m.total, 0) + COALESCE(d.total, 0), n = m.n + d.n
+                WHEN NOT MATCHED THEN INSERT (lot_id, stage, measure, total, n) VALUES (d.lot_id, d.stage, d.measure, d.total, d.n)
+            """)
+            con.execute(f"""
+                MERGE INTO {INDEX_TABLE} AS i USING (SELECT DISTINCT lot_id, stage, row_ids FROM _lineage_delta) AS d
+                ON i.lot_id = d.lot_id AND i.stage = d.stage
+                WHEN MATCHED THEN UPDATE SET row_ids = list_concat(i.row_ids, d.row_ids)
+                WHEN NOT MATCHED THEN INSERT (lot_id, stage, row_ids) VALUES (d.lot_id, d.stage, d.row_ids)
+            """)
+            touched.update(r[0] for r in con.execute("SELECT DISTINCT lot_id FROM _lineage_delta").fetchall())
+            con.execute("DROP TABLE _lineage_delta")
+        con.execute(f"INSERT OR REPLACE INTO {WATERMARK_TABLE} VALUES (?, ?, ?)",
+                    [table, max(max_rowid, watermark), datetime.now(timezone.utc).replace(tzinfo=None)])
+
+    if full:
+        con.execute(f"CREATE OR REPLACE TABLE {LINEAGE_TABLE} AS {_pivot_sql()} ORDER BY lot_id")
+        return con.execute(f"SELECT COUNT(*) FROM {LINEAGE_TABLE}").fetchone()[0]
+    if touched:
+        lots = pd.DataFrame({"lot_id": sorted(touched)})
+        con.execute(f"DELETE FROM {LINEAGE_TABLE} WHERE lot_id IN (SELECT lot_id FROM lots)")
+        con.execute(f"INSERT INTO {LINEAGE_TABLE} BY NAME {_pivot_sql('WHERE lot_id IN (SELECT lot_id FROM lots)')}")
+    return len(touched)
+
+
+def _connect(con, db_path):
+    return (con, False) if con is not None else (duckdb.connect(str(db_path), read_only=True), True)
+
+
+def lot_summary(lot_id: Optional[str] = None, con=None, db_path=DB_PATH) -> pd.DataFrame:
+    """The lineage row of one lot, or of all lots."""
+    con, owned = _connect(con, db_path)
+    try:
+        if not _exists(con, LINEAGE_TABLE):
+            return pd.DataFrame()
+        if lot_id is None:
+            return con.execute(f"SELECT * FROM {LINEAGE_TABLE} ORDER BY lot_id").fetchdf()
+        return con.execute(f"SELECT * FROM {LINEAGE_TABLE} WHERE lot_id = ?", [lot_id]).fetchdf()
+    finally:
+        if owned:
+            con.close()
+
+
+def lot_rows(lot_id: str, stage: Optional[str] = None, con=None, db_path=DB_PATH) -> Dict[str, pd.DataFrame]:
+    """Raw rows of a lot per stage, fetched by the row ids in the lot index."""
+    con, owned = _connect(con, db_path)
+    try:
+        if not _exists(con, INDEX_TABLE):
+            return {}
+        result = {}
+        for s, (table, _) in STAGES.items():
+            if stage and s != stage:
+                continue
+            row = con.execute(f"SELECT row_ids FROM {INDEX_TABLE} WHERE lot_id = ? AND stage = ?", [lot_id, s]).fetchone()
+            if row and row[0]:
+                ids = pd.DataFrame({"id": row[0]})
+                result[s] = con.execute(f"SELECT * FROM {table} WHERE rowid IN (SELECT id FROM ids) ORDER BY rowid").fetchdf()
+        return result
+    finally:
+        if owned:
+            con.close()
+
+
+def prompt_context(con=None, db_path=DB_PATH, with_columns: bool = True) -> str:
+    """Guidance for NL→SQL: answer cross-process lot questions from lot_lineage."""
+    con, owned = _connect(con, db_path)
+    try:
+        if not _exists(con, LINEAGE_TABLE):
+            return ""
+        cols = [r[0] for r in con.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = ? ORDER BY ordinal_position",
+            [LINEAGE_TABLE]).fetchall()]
+    finally:
+        if owned:
+            con.close()
+    text = (f"For questions that relate stages of the same lot (cure, gas mixing, O2), query {LINEAGE_TABLE} "
+            f"(one row per Lot_ID) instead of joining the raw tables on Lot_ID. "
+            f"*_issues counts remarks such as leaks or flow errors.")
+    return f"{text} Columns: {', '.join(cols)}" if with_columns else text
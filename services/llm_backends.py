@@ -0,0 +1,180 @@
+"""
+Pluggable LLM backends behind the gateway (services/llm_gateway.py).
+
+``LLM_BACKEND`` selects the client the gateway streams from, and setting it
+also lets /nl2sql and /powerbi/query send unmatched questions to the LLM:
+
+- ``anthropic`` (default): the real API. Setting ``ANTHROPIC_BASE_URL`` points
+  the SDK at the local stand-in server (scripts/mock_llm_server.py) instead.
+- ``replay``: an in-process client that answers from recorded question→SQL
+  pairs, with lognormal latency, token pacing and injected rate-limit /
+  overload errors, so the NL→SQL path can be benchmarked offline.
+
+Both the replay client and the mock server read ``config/llm_recordings.jsonl``
+(override with ``LLM_RECORDINGS``) and take their latency/error profile from
+``LLM_REPLAY_*`` variables.
+"""
+import asyncio, json, math, os, pathlib, random, re
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+RECORDINGS_FILE = pathlib.Path(os.getenv("LLM_RECORDINGS", ROOT / "config" / "llm_recordings.jsonl"))
+BACKENDS = ("anthropic", "replay")
+NO_RECORDING_SQL = "SELECT 'no recorded answer' AS note"
+
+
+def backend() -> str:
+    name = os.getenv("LLM_BACKEND", "anthropic")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND '{name}'. Available: {', '.join(BACKENDS)}")
+    return name
+
+
+def configured() -> bool:
+    """
+    Whether the API's NL→SQL fallback may call an LLM. Opt-in: LLM_BACKEND must be set explicitly
+    (the Streamlit chatbot uses the gateway regardless).
+    """
+    return "LLM_BACKEND" in os.environ and (backend() == "replay" or bool(os.getenv("ANTHROPIC_API_KEY")
+                                                                         or os.getenv("ANTHROPIC_BASE_URL")))
+
+
+def make_client(api_key=None):
+    """Async client with the ``messages.stream`` interface of ``anthropic.AsyncAnthropic``."""
+    if backend() == "replay":
+        return ReplayClient()
+    # The anthropic SDK takes ~1s to import; only pay for it on the first call
+    import anthropic
+    # Retries are the gateway's (with backoff across the deadline), not the SDK's
+    return anthropic.AsyncAnthropic(api_key=api_key or os.getenv("ANTHROPIC_API_KEY") or "mock", max_retries=0)
+
+
+# --- recordings ---------------------------------------------------------------
+
+def _tokens(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def question_of(prompt: str) -> str:
+    """The question inside an NL→SQL prompt (services/schema_index.build_prompt), or the prompt itself."""
+    # The last "Question:" is the one asked; earlier ones belong to few-shot examples
+    question = prompt.rsplit("Question:", 1)[-1]
+    return re.sub(r"\s*SQL:\s*$", "", question).strip()
+
+
+class Recordings:
+    def __init__(self, pairs: List[Dict]):
+        self.pairs = pairs
+        self._exact = {p["question"].strip().lower(): p["sql"] for p in pairs}
+        self._tokens = [(_tokens(p["question"]), p["sql"]) for p in pairs]
+
+    @classmethod
+    def load(cls, path=RECORDINGS_FILE) -> "Recordings":
+        path = pathlib.Path(path)
+        lines = path.read_text().splitlines() if path.exists() else []
+        return cls([json.loads(line) for line in lines if line.strip()])
+
+    def answer(self, prompt: str, min_overlap: float = 0.5) -> str:
+        """Recorded SQL for the prompt's question: exact match, else the closest question by token overlap."""
+        question = question_of(prompt)
+        if question.lower() in self._exact:
+            return self._exact[question.lower()]
+        asked = _tokens(question)
+        best, score = NO_RECORDING_SQL, 0.0
+        for tokens, sql in self._tokens:
+            overlap = len(asked & tokens) / max(len(asked | tokens), 1)
+            if overlap > score:
+                best, score = sql, overlap
+        return best if score >= min_overlap else NO_RECORDING_SQL
+
+
+# --- latency / error profile --------------------------------------------------
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class OverloadedError(Exception):
+    status_code = 529
+
+
+class ReplayProfile:
+    def __init__(self, median_ms: float = 400, p95_ms: float = 1500, rate_limit_rate: float = 0.0,
+                 overloaded_rate: float = 0.0, tokens_per_s: float = 200, seed: Optional[int] = None):
+        self.median_ms = median_ms
+        # Lognormal latency with the given median and 95th percentile
+        self.sigma = math.log(max(p95_ms, median_ms) / median_ms) / 1.645 if median_ms > 0 else 0.0
+        self.rate_limit_rate = rate_limit_rate
+        self.overloaded_rate = overloaded_rate
+        self.tokens_per_s = tokens_per_s
+        self.random = random.Random(seed)
+
+    @classmethod
+    def from_env(cls) -> "ReplayProfile":
+        env = lambda name, default: float(os.getenv(f"LLM_REPLAY_{name}", default))
+        seed = os.getenv("LLM_REPLAY_SEED")
+        return cls(median_ms=env("MEDIAN_MS", 400), p95_ms=env("P95_MS", 1500),
+                   rate_limit_rate=env("RATE_LIMIT_RATE", 0), overloaded_rate=env("OVERLOADED_RATE", 0),
+                   tokens_per_s=env("TOKENS_PER_S", 200), seed=int(seed) if seed else None)
+
+    def latency_s(self) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        return self.median_ms / 1000 * math.exp(self.random.gauss(0, self.sigma))
+
+    def error(self) -> Optional[Exception]:
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return RateLimitError("rate_limit_error: replayed 429")
+        if roll < self.rate_limit_rate + self.overloaded_rate:
+            return OverloadedError("overloaded_error: replayed 529")
+        return None
+
+    def chunks(self, text: str, size: int = 4) -> List[str]:
+        return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+# --- in-process replay client -------------------------------------------------
+
+class _ReplayStream:
+    def __init__(self, client: "ReplayClient", kwargs: Dict):
+        self.client, self.kwargs = client, kwargs
+        prompt = kwargs["messages"][-1]["content"]
+        if not isinstance(prompt, str):
+            # Content blocks (a cached prefix and the rest, services/llm_gateway.message_content)
+            prompt = "".join(block["text"] for block in prompt)
+        self.text = client.recordings.answer(prompt)
+        self.input_tokens = max(1, len(prompt) // 4)
+
+    async def __aenter__(self):
+        profile = self.client.profile
+        # Time to first token
+        await asyncio.sleep(profile.latency_s())
+        error = profile.error()
+        if error:
+            raise error
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    async def text_stream(self):
+        profile = self.client.profile
+        for chunk in profile.chunks(self.text):
+            if profile.tokens_per_s:
+                await asyncio.sleep(1 / profile.tokens_per_s)
+            yield chunk
+
+    async def get_final_message(self):
+        usage = SimpleNamespace(input_tokens=self.input_tokens, output_tokens=max(1, len(self.text) // 4))
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=self.text)], usage=usage)
+
+
+class ReplayClient:
+    """Stand-in for ``anthropic.AsyncAnthropic`` answering from recordings."""
+    def __init__(self, recordings: Optional[Recordings] = None, profile: Optional[ReplayProfile] = None):
+        self.recordings = recordings or Recordings.load()
+        self.profile = profile or ReplayProfile.from_env()
+        self.messages = SimpleNamespace(stream=lambda **kwargs: _ReplayStream(self, kwargs))
@@ -0,0 +1,191 @@
+"""
+Shared asynchronous gateway to the Claude API.
+
+One client per (api key, model) serves every page, script and endpoint of
+the process, on one background event loop; it is ``AsyncAnthropic`` or an
+offline stand-in (services/llm_backends.py). Calls wait on a
+global semaphore and a per-key semaphore (the key names the caller, e.g. a
+Power BI workspace), so bursts queue on the loop instead of piling up
+threads. Rate limits, overload and connection errors are retried with
+jittered exponential backoff (tenacity), and the whole call including
+retries runs under a deadline. Tokens are streamed as they arrive, and
+each call's latency, time to first token, attempts and token usage are
+recorded for ``metrics()``. A caller passing the prompt's stable ``prefix``
+(services/schema_index.build_prompt) gets it sent as its own content block
+marked ``cache_control: ephemeral``, so the provider caches it across calls
+(prompts below the model's minimum cacheable length are simply not cached).
+"""
+import asyncio, os, queue, threading, time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from services.llm_backends import make_client
+
+DEFAULT_MODEL = "claude-3-opus-20240229"
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+PER_KEY_CONCURRENCY = int(os.getenv("LLM_PER_KEY_CONCURRENCY", "4"))
+DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "60"))
+MAX_ATTEMPTS = 5
+RETRYABLE_ERRORS = ("RateLimitError", "OverloadedError", "ServiceUnavailableError", "InternalServerError",
+                    "APITimeoutError", "APIConnectionError")
+
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+_GATEWAYS: Dict[tuple, "LLMGateway"] = {}
+
+
+def _loop() -> asyncio.AbstractEventLoop:
+    """The background event loop every synchronous caller submits to."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="llm-gateway", daemon=True).start()
+        return _LOOP
+
+
+def message_content(prompt: str, prefix: Optional[str] = None):
+    """The user message content: the prompt, or a cached prefix block followed by the rest."""
+    if not prefix or not prompt.startswith(prefix) or len(prompt) == len(prefix):
+        return prompt
+    return [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt[len(prefix):]}]
+
+
+def _retryable(exc: BaseException) -> bool:
+    return type(exc).__name__ in RETRYABLE_ERRORS or any(c.__name__ in RETRYABLE_ERRORS for c in type(exc).__mro__)
+
+
+class LLMGateway:
+    def __init__(self, api_key=None, model=DEFAULT_MODEL, client=None, max_concurrency=MAX_CONCURRENCY,
+                 per_key_concurrency=PER_KEY_CONCURRENCY, deadline=DEADLINE_S, max_attempts=MAX_ATTEMPTS,
+                 backoff_max=20.0):
+        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+        self.model = model
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.backoff_max = backoff_max
+        self._client = client
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._per_key_limit = per_key_concurrency
+        self._per_key: Dict[str, asyncio.Semaphore] = {}
+        self._calls = deque(maxlen=1000)
+        self._totals = {"calls": 0, "errors": 0, "retries": 0, "input_tokens": 0, "output_tokens": 0,
+                        "cache_read_tokens": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = make_client(self.api_key)
+        return self._client
+
+    def _record(self, **call):
+        with self._lock:
+            self._calls.append(call)
+            self._totals["calls"] += 1
+            self._totals["errors"] += call["status"] != "ok"
+            self._totals["retries"] += call["attempts"] - 1
+            self._totals["input_tokens"] += call["input_tokens"]
+            self._totals["output_tokens"] += call["output_tokens"]
+            self._totals["cache_read_tokens"] += call["cache_read_tokens"]
+
+    async def _astream(self, prompt: str, key: str = "default", max_tokens: int = 512, system: Optional[str] = None,
+                       deadline: Optional[float] = None, prefix: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the answer's text as it streams in; runs on the gateway loop. Retries only happen before the first token."""
+        kwargs = {"model": self.model, "max_tokens": max_tokens,
+                  "messages": [{"role": "user", "content": message_content(prompt, prefix)}]}
+        if system:
+            kwargs["system"] = system
+        semaphore = self._per_key.setdefault(key, asyncio.Semaphore(self._per_key_limit))
+        start = time.perf_counter()
+        stats = {"key": key, "status": "ok", "attempts": 0, "input_tokens": 0, "output_tokens": 0,
+                 "cache_read_tokens": 0, "first_token_s": None}
+        try:
+            async with asyncio.timeout(deadline or self.deadline):
+                async with semaphore, self._global:
+                    stats["queued_s"] = time.perf_counter() - start
+                    retrying = AsyncRetrying(stop=stop_after_attempt(self.max_attempts), reraise=True,
+                                             wait=wait_random_exponential(multiplier=0.5, max=self.backoff_max),
+                                             retry=retry_if_exception(lambda e: _retryable(e) and stats["first_token_s"] is None))
+                    async for attempt in retrying:
+                        with attempt:
+                            stats["attempts"] += 1
+                            async with self.client.messages.stream(**kwargs) as stream:
+                                async for text in stream.text_stream:
+                                    if stats["first_token_s"] is None:
+                                        stats["first_token_s"] = time.perf_counter() - start
+                                    yield text
+                                usage = (await stream.get_final_message()).usage
+                                stats["input_tokens"] = usage.input_tokens
+                                stats["output_tokens"] = usage.output_tokens
+                                stats["cache_read_tokens"] = getattr(usage, "cache_read_input_tokens", None) or 0
+        except BaseException as e:
+            stats["status"] = ("timeout" if isinstance(e, TimeoutError) else
+                               "cancelled" if isinstance(e, (GeneratorExit, asyncio.CancelledError)) else type(e).__name__)
+            raise
+        finally:
+            self._record(latency_s=time.perf_counter() - start, **stats)
+
+    async def _collect(self, prompt: str, on_token: Optional[Callable[[str], None]] = None, **kwargs) -> str:
+        parts = []
+        async for text in self._astream(prompt, **kwargs):
+            parts.append(text)
+            if on_token:
+                on_token(text)
+        return "".join(parts)
+
+    async def acomplete(self, prompt: str, on_token: Optional[Callable[[str], None]] = None, **kwargs) -> str:
+        """Await an answer from any event loop; ``on_token`` sees the text as it streams."""
+        future = asyncio.run_coroutine_threadsafe(self._collect(prompt, on_token, **kwargs), _loop())
+        return await asyncio.wrap_future(future)
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        """Blocking call for synchronous callers; runs on the shared gateway loop."""
+        return asyncio.run_coroutine_threadsafe(self._collect(prompt, **kwargs), _loop()).result()
+
+    def stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """Blocking iterator over streamed text (e.g. for st.write_stream)."""
+        chunks: "queue.Queue" = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for text in self._astream(prompt, **kwargs):
+                    chunks.put(text)
+            except BaseException as e:
+                chunks.put(e)
+            finally:
+                chunks.put(done)
+
+        asyncio.run_coroutine_threadsafe(pump(), _loop())
+        while (item := chunks.get()) is not done:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def metrics(self) -> Dict:
+        """Totals plus latency / time-to-first-token percentiles over the last 1000 calls."""
+        with self._lock:
+            calls = list(self._calls)
+            totals = dict(self._totals)
+
+        def pct(values, q):
+            values = sorted(v for v in values if v is not None)
+            return round(values[min(len(values) - 1, int(q * len(values)))], 4) if values else None
+
+        latencies = [c["latency_s"] for c in calls]
+        first = [c["first_token_s"] for c in calls]
+        return {**totals, "model": self.model,
+                "latency_p50_s": pct(latencies, .5), "latency_p95_s": pct(latencies, .95),
+                "first_token_p50_s": pct(first, .5), "first_token_p95_s": pct(first, .95),
+                "queued_p95_s": pct([c.get("queued_s") for c in calls], .95)}
+
+
+def get_gateway(api_key=None, model=DEFAULT_MODEL) -> LLMGateway:
+    """The process-wide gateway for an API key and model."""
+    key = (api_key or os.getenv("ANTHROPIC_API_KEY"), model)
+    with _LOOP_LOCK:
+        if key not in _GATEWAYS:
+            _GATEWAYS[key] = LLMGateway(api_key=key[0], model=model)
+        return _GATEWAYS[key]
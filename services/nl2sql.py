@@ -1,16 +1,314 @@
 """
 NL→SQL wrapper with guardrails for Power BI agent
+
+Common questions (failures by machine, daily/monthly counts, status
+distribution, recent rows, metric averages) are answered by a rule-based
+intent matcher before any LLM call. One precompiled regex finds every
+keyword concept of the question in a single pass, the most specific intent
+whose concepts are all present is picked, and its slots (table, machine,
+date range, metric, row limit) are resolved against the cached schema
+catalog. Matches scoring at least ``CONFIDENCE_THRESHOLD`` get their SQL
+without a model round trip. A question already answered by validated SQL
+(services/query_examples.py) reuses it; everything else goes to the LLM
+backend (services/llm_backends.py) with a schema-pruned, few-shot prompt.
 """
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, Optional
 import re
+from services import llm_backends
+from services.catalog import get_catalog
+from services.failures import failure_predicate, keywords
+from services.lineage import LINEAGE_TABLE, measure_name
+from services.query_examples import get_store
+from services.rollups import SUMMARY_VIEW, date_expr
+from services.sql_repair import extract_sql, gateway_fix, repair
+
+CONFIDENCE_THRESHOLD = 0.75
+DEFAULT_TABLE = "cure_table1"
+TABLE_ALIASES = {
+    "cure_table1": ("cure", "curing"),
+    "gas_mixing_system": ("gas mix", "gas mixing", "mixing"),
+    "o2_gas_data_fclm": ("o2", "oxygen"),
+}
+# question word -> column name fragments, resolved per table
+METRIC_WORDS = {
+    "temperature": ("temp",), "temp": ("temp",), "pressure": ("pressure",), "humidity": ("humidity",),
+    "flow": ("flowrate", "flow"), "purity": ("purity",), "ratio": ("mix_ratio",), "duration": ("duration",),
+}
+NUMERIC_TYPES = ("DOUBLE", "FLOAT", "REAL", "DECIMAL", "BIGINT", "INTEGER", "SMALLINT", "HUGEINT")
+CONCEPTS = {
+    "machine": r"machines?|tools?|stations?",
+    "daily": r"daily|per day|by day|each day",
+    "monthly": r"monthly|per month|by month|each month",
+    "status": r"status(?:es)?|outcomes?",
+    "recent": r"recent|latest|newest|last \d+ (?:rows|records|runs|entries)",
+    "average": r"average|avg|mean",
+    # Cross-table or open-ended questions are left to the LLM
+    "complex": r"join|correlat\w*|compare\w*|comparison|versus|vs|relationship|lots?|lot_id|lineage|why|predict\w*",
+    "write": r"drop|delete|insert|update|alter|truncate|create",
+}
+# intent -> concepts that must all be present; the most specific satisfied intent wins
+INTENTS = {
+    "monthly_failures": {"failure", "monthly"},
+    "failures_by_machine": {"failure", "machine"},
+    "failure_breakdown": {"failure"},
+    "metric_average": {"average"},
+    "daily_counts": {"daily"},
+    "monthly_counts": {"monthly"},
+    "status_distribution": {"status"},
+    "recent_rows": {"recent"},
+}
+VIZ_HINTS = {
+    "monthly_failures": ["line_chart", "table"], "failures_by_machine": ["bar_chart", "table"],
+    "failure_breakdown": ["bar_chart", "table"], "metric_average": ["bar_chart", "table"],
+    "daily_counts": ["line_chart", "table"], "monthly_counts": ["line_chart", "table"],
+    "status_distribution": ["pie_chart", "table"], "recent_rows": ["table"],
+}
+DATE = r"(\d{4}-\d{2}-\d{2})"
+DATE_PATTERNS = (
+    (re.compile(rf"between {DATE} and {DATE}"), lambda m: (f"DATE '{m[1]}'", f"DATE '{m[2]}'")),
+    (re.compile(r"(?:last|past) (\d+) (day|week|month|year)s?"),
+     lambda m: (f"current_date - INTERVAL {int(m[1])} {m[2].upper()}", None)),
+    (re.compile(rf"(?:since|after|from) {DATE}"), lambda m: (f"DATE '{m[1]}'", None)),
+    (re.compile(rf"(?:before|until|through) {DATE}"), lambda m: (None, f"DATE '{m[1]}'")),
+    (re.compile(r"\btoday\b"), lambda m: ("current_date", None)),
+    (re.compile(r"\byesterday\b"), lambda m: ("current_date - 1", "current_date - 1")),
+)
+MACHINE_PATTERN = re.compile(r"\b(g?mc\d{2})\b")
+LIMIT_PATTERN = re.compile(r"\b(?:last|latest|top|recent|first) (\d+)\b")
+
+
+class UnboundSQL(ValueError):
+    """Generated SQL that still fails to bind after repair; the message is the binder's error."""
+
+
+@lru_cache(maxsize=1)
+def _concept_regex():
+    failure = "|".join(re.escape(k) + r"\w*" for k in keywords() + ["defect"])
+    return re.compile("|".join(rf"\b(?P<{name}>{pattern})\b"
+                               for name, pattern in {"failure": failure, **CONCEPTS}.items()))
+
+
+@lru_cache(maxsize=8)
+def _other_tables_regex(tables: tuple):
+    """Names (``lot_lineage`` or ``lot lineage``) of catalog tables the templates do not cover."""
+    names = {n for t in tables if t not in TABLE_ALIASES for n in (t.lower(), t.lower().replace("_", " "))}
+    pattern = "|".join(re.escape(n) for n in sorted(names, key=len, reverse=True))
+    return re.compile(rf"\b(?:{pattern})\b") if names else None
+
+
+@lru_cache(maxsize=8)
+def _table_regex(tables: tuple):
+    names = {t.lower(): t for t in tables}
+    names.update({alias: t for t, aliases in TABLE_ALIASES.items() if t in tables for alias in aliases})
+    pattern = "|".join(re.escape(n) for n in sorted(names, key=len, reverse=True))
+    return re.compile(rf"\b(?:{pattern})\b"), names
+
+
+def _q(column: str) -> str:
+    return f'"{column}"'
+
+
+def _metric(catalog, table: str, question: str) -> Optional[str]:
+    numeric = [c for c in catalog.column_names(table)
+               if (catalog.column_type(table, c) or "").upper().startswith(NUMERIC_TYPES)]
+    for column in numeric:
+        if column.lower() in question:
+            return column
+    for word, fragments in METRIC_WORDS.items():
+        if re.search(rf"\b{word}", question):
+            for fragment in fragments:
+                hit = next((c for c in numeric if fragment in c.lower()), None)
+                if hit:
+                    return hit
+    return None
+
+
+def _date_range(question: str):
+    for pattern, bounds in DATE_PATTERNS:
+        m = pattern.search(question)
+        if m:
+            return bounds(m)
+    return None
+
+
+def match_intent(question: str, catalog=None) -> Optional[Dict]:
+    """
+    Rule-based translation of a common question. Returns {"intent", "sql", "confidence", "slots"}
+    or None when no template applies.
+    """
+    q = question.lower()
+    found = {m.lastgroup for m in _concept_regex().finditer(q)}
+    if "write" in found:
+        return None
+    intent = next((name for name, needs in sorted(INTENTS.items(), key=lambda kv: -len(kv[1]))
+                   if needs <= found), None)
+    if intent is None:
+        return None
+
+    catalog = catalog or get_catalog()
+    # A question about a table the templates do not cover must not be answered from another one
+    other_tables = _other_tables_regex(tuple(catalog.tables()))
+    if other_tables and other_tables.search(q):
+        return None
+    tables = tuple(t for t in catalog.tables() if t in TABLE_ALIASES)
+    table_regex, names = _table_regex(tables)
+    mentioned = {names[m.group(0)] for m in table_regex.finditer(q)}
+    table = next(iter(mentioned)) if len(mentioned) == 1 else (DEFAULT_TABLE if DEFAULT_TABLE in tables else None)
+    if table is None:
+        return None
+
+    columns = catalog.column_names(table)
+    status = catalog.find_column(table, "status", "result", "outcome")
+    machine = catalog.find_column(table, "machine_id", "machine", "tool", "station")
+    date = catalog.find_column(table, "datetime", "date_time", "timestamp", "date", "time")
+    day = date_expr(date, catalog.column_type(table, date)) if date else None
+    failure = failure_predicate(columns)
+    slots = {"table": table, "machine": None, "date_range": None, "metric": None, "limit": None}
+
+    filters = []
+    m = MACHINE_PATTERN.search(q)
+    if m and machine:
+        slots["machine"] = m.group(1).upper()
+        filters.append(f"{_q(machine)} = '{slots['machine']}'")
+    date_range = _date_range(q)
+    if date_range:
+        if not day:
+            return None
+        slots["date_range"] = date_range
+        start, end = date_range
+        filters += ([f"{day} >= {start}"] if start else []) + ([f"{day} <= {end}"] if end else [])
+
+    def where(*extra):
+        clauses = [c for c in (*extra, *filters) if c]
+        return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    if intent in ("monthly_failures", "failures_by_machine", "failure_breakdown") and not failure:
+        return None
+    if intent == "monthly_failures":
+        if not day:
+            return None
+        group = f", {_q(machine)} AS machine" if machine else ""
+        sql = f"""
+            SELECT date_trunc('month', {day}) AS month{group},
+                   COUNT(*) FILTER (WHERE {failure}) AS failures, COUNT(*) AS total
+            FROM {table} {where()}
+            GROUP BY ALL ORDER BY ALL
+        """
+    elif intent == "failures_by_machine":
+        if not machine:
+            return None
+        sql = f"""
+            SELECT {_q(machine)} AS machine, COUNT(*) FILTER (WHERE {failure}) AS failures, COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE {failure}) / COUNT(*) AS failure_rate
+            FROM {table} {where()}
+            GROUP BY 1 ORDER BY failures DESC, machine
+        """
+    elif intent == "failure_breakdown":
+        category = "failure_category" if "failure_category" in columns else _q(status)
+        sql = f"""
+            SELECT {category} AS category, COUNT(*) AS count
+            FROM {table} {where(failure)}
+            GROUP BY 1 ORDER BY count DESC
+        """
+    elif intent == "metric_average":
+        metric = _metric(catalog, table, q)
+        if not metric:
+            return None
+        slots["metric"] = metric
+        by = _q(machine) if machine and "machine" in found else None
+        sql = f"""
+            SELECT {f'{by} AS machine, ' if by else ''}AVG({_q(metric)}) AS avg_{measure_name(metric)},
+                   MIN({_q(metric)}) AS min, MAX({_q(metric)}) AS max, COUNT({_q(metric)}) AS n
+            FROM {table} {where()}
+            {'GROUP BY 1 ORDER BY 1' if by else ''}
+        """
+    elif intent in ("daily_counts", "monthly_counts"):
+        if not day:
+            return None
+        grain = "day" if intent == "daily_counts" else "month"
+        sql = f"""
+            SELECT date_trunc('{grain}', {day}) AS {grain}, COUNT(*) AS count
+            FROM {table} {where(f'{day} IS NOT NULL')}
+            GROUP BY 1 ORDER BY 1
+        """
+    elif intent == "status_distribution":
+        if not status:
+            return None
+        sql = f"""
+            SELECT {_q(status)} AS status, COUNT(*) AS count,
+                   COUNT(*) * 100.0 / SUM(COUNT(*)) OVER () AS percentage
+            FROM {table} {where()}
+            GROUP BY 1 ORDER BY 2 DESC
+        """
+    else:
+        m = LIMIT_PATTERN.search(q)
+        slots["limit"] = min(int(m.group(1)), 1000) if m else 10
+        sql = f"""
+            SELECT * FROM {table} {where()}
+            {f'ORDER BY {day} DESC NULLS LAST' if day else ''} LIMIT {slots['limit']}
+        """
+
+    # Falling back to DEFAULT_TABLE is a guess: it stays below CONFIDENCE_THRESHOLD
+    confidence = 0.6 + (0.3 if mentioned else 0.1)
+    if "complex" in found:
+        confidence -= 0.5
+    if len(mentioned) > 1:
+        confidence -= 0.4
+    return {"intent": intent, "sql": sql, "confidence": round(max(confidence, 0.0), 2), "slots": slots}
+
+
+def llm_sql(question: str) -> Optional[str]:
+    """SQL from the configured LLM backend, or None when none is configured."""
+    if not llm_backends.configured():
+        return None
+    # Imported on first use so the API's cold start does not load the gateway and schema index
+    from services.llm_gateway import get_gateway
+    from services.schema_index import nl2sql_prompt
+    prompt = nl2sql_prompt(question)
+    return extract_sql(get_gateway().complete(prompt["prompt"], key="nl2sql", prefix=prompt["prefix"]))
+
 
 def nl2sql_with_guardrails(question: str) -> Dict:
-    # Dummy implementation: replace with real Claude-powered NL→SQL
+    match = match_intent(question)
+    sql = None
+    if match and match["confidence"] >= CONFIDENCE_THRESHOLD:
+        sql = " ".join(match["sql"].split())
+        rationale = f"Answered by the '{match['intent']}' template (confidence {match['confidence']:.2f})."
+        viz_hints = VIZ_HINTS[match["intent"]]
+        source = "template"
+    elif (example := get_store().lookup(question)) is not None:
+        sql = example["sql"]
+        rationale = f"Reused the validated SQL of an earlier question: '{example['question']}'."
+        viz_hints = ["table", "bar_chart"]
+        source = "example"
+    elif llm_backends.configured():
+        sql = llm_sql(question)
+        rationale = "Generated by the LLM from the relevant schema."
+        # Bind it with EXPLAIN before anyone runs it; fix what the catalog can, then ask the LLM
+        checked = repair(sql, llm_fix=gateway_fix)
+        if not checked["valid"]:
+            raise UnboundSQL(f"Generated SQL does not bind: {checked['error'].strip().splitlines()[0]}")
+        if checked["repairs"]:
+            sql = checked["sql"]
+            rationale += f" Repaired {len(checked['repairs'])}x: " + "; ".join(r["error"] for r in checked["repairs"])
+        viz_hints = ["table", "bar_chart"]
+        source = "llm"
+    elif match:
+        # No LLM to ask: a template guess (e.g. over DEFAULT_TABLE) beats the generic fallback
+        sql = " ".join(match["sql"].split())
+        rationale = (f"Best guess from the '{match['intent']}' template over {match['slots']['table']} "
+                     f"(confidence {match['confidence']:.2f}, below {CONFIDENCE_THRESHOLD}).")
+        viz_hints = VIZ_HINTS[match["intent"]]
+        source = "template"
+    if sql is None:
+        # Dummy implementation: replace with real Claude-powered NL→SQL
+        sql = "SELECT * FROM cure_table1 LIMIT 10" if "failures" in question else "SELECT * FROM cure_table1 LIMIT 5"
+        rationale = "Generated SQL for your business question."
+        viz_hints = ["bar_chart", "table"]
+        source = "default"
     # Guardrails: only SELECT, whitelisted tables/columns
-    allowed_tables = {"cure_table1", "gas_mixing_system", "o2_gas_data_fclm"}
-    sql = "SELECT * FROM cure_table1 LIMIT 10" if "failures" in question else "SELECT * FROM cure_table1 LIMIT 5"
-    rationale = "Generated SQL for your business question."
-    viz_hints = ["bar_chart", "table"]
+    allowed_tables = {"cure_table1", "gas_mixing_system", "o2_gas_data_fclm", LINEAGE_TABLE, SUMMARY_VIEW}
     # Guardrail: block non-SELECT
     if not sql.strip().lower().startswith("select"):
         raise ValueError("Only SELECT statements are allowed.")
@@ -18,4 +316,4 @@ def nl2sql_with_guardrails(question: str) -> Dict:
     tables = set(re.findall(r"from\s+([a-z0-9_]+)", sql, re.I))
     if not tables.issubset(allowed_tables):
         raise ValueError(f"Table(s) not allowed: {tables - allowed_tables}")
-    return {"sql": sql, "rationale": rationale, "viz_hints": viz_hints}
+    return {"sql": sql, "rationale": rationale, "viz_hints": viz_hints, "source": source}
@@ -0,0 +1,196 @@
+"""
+Data-quality profiler covering every row of every table.
+
+Each table is profiled in a single scan that counts nulls, IQR and z-score
+outliers, values that do not conform to the column's expected type and
+duplicate keys. Outlier bounds come from the column stats computed at
+ingestion, so no extra pass is needed. Tables are profiled concurrently, one
+cursor per table. Incremental runs only scan rows appended since the last
+profile (rowid watermark) and add their counts to the stored totals.
+Results are kept in ``_dq_profile`` per data version.
+"""
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from services.stats import STATS_TABLE, is_numeric
+from services.versioning import data_version
+
+PROFILE_TABLE = "_dq_profile"
+Z_THRESHOLD = 3.0
+KEEP_RUNS = 5
+# VARCHAR columns whose name suggests a temporal value are checked for parseability
+TEMPORAL_NAMES = ("datetime", "date", "time", "timestamp")
+COUNTERS = ["null_count", "iqr_outliers", "zscore_outliers", "nonconforming", "duplicate_keys"]
+
+
+def _create_table(con):
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {PROFILE_TABLE} (
+            data_version VARCHAR, profiled_at TIMESTAMP, table_name VARCHAR, column_position INTEGER,
+            column_name VARCHAR, column_type VARCHAR, row_count BIGINT, max_rowid BIGINT,
+            null_count BIGINT, iqr_outliers BIGINT, zscore_outliers BIGINT, nonconforming BIGINT,
+            duplicate_keys BIGINT
+        )
+    """)
+
+
+def _exists(con, table: str) -> bool:
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table]
+    ).fetchone()[0] > 0
+
+
+def key_column(columns: List[tuple]) -> Optional[str]:
+    """The table's record id: the first *_ID column (Cure_ID, GasMix_ID, O2Mix_ID)."""
+    return next((name for name, _ in columns if name.lower().endswith("_id")), None)
+
+
+def _bounds(con, table: str, columns: List[tuple]) -> Dict[str, tuple]:
+    """(q1, q3, mean, std) per numeric column, from the stored stats or a fallback pass."""
+    numeric = [name for name, t in columns if is_numeric(t)]
+    if not numeric:
+        return {}
+    if _exists(con, STATS_TABLE):
+        rows = con.execute(f"""
+            SELECT column_name, quantiles[3], quantiles[5], mean, stddev FROM {STATS_TABLE}
+            WHERE table_name = ?
+            QUALIFY computed_at = MAX(computed_at) OVER ()
+        """, [table]).fetchall()
+        found = {r[0]: r[1:] for r in rows if r[0] in numeric}
+        if len(found) == len(numeric):
+            return found
+    exprs = [f'approx_quantile("{c}"::DOUBLE, [0.25, 0.75]), AVG("{c}"), STDDEV_SAMP("{c}")' for c in numeric]
+    row = con.execute(f"SELECT {', '.join(exprs)} FROM {table}").fetchone()
+    return {c: (row[3 * i][0], row[3 * i][1], row[3 * i + 1], row[3 * i + 2])
+            for i, c in enumerate(numeric) if row[3 * i]}
+
+
+def _previous(con, table: str) -> pd.DataFrame:
+    if not _exists(con, PROFILE_TABLE):
+        return pd.DataFrame()
+    return con.execute(f"""
+        SELECT * FROM {PROFILE_TABLE} WHERE table_name = ?
+        QUALIFY profiled_at = MAX(profiled_at) OVER ()
+        ORDER BY column_position
+    """, [table]).fetchdf()
+
+
+def profile_table(con, table: str, incremental: bool = True) -> pd.DataFrame:
+    """Profile one table in a single scan; with ``incremental`` only rows past the last watermark."""
+    columns = con.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = 'main' AND table_name = ? ORDER BY ordinal_position", [table]
+    ).fetchall()
+    previous = _previous(con, table) if incremental else pd.DataFrame()
+    watermark = -1
+    if not previous.empty and list(previous["column_name"]) == [c for c, _ in columns]:
+        watermark = int(previous["max_rowid"].iloc[0])
+        # A replaced table restarts its rowids; fall back to a full profile
+        if con.execute(f"SELECT COALESCE(MAX(rowid), -1) FROM {table}").fetchone()[0] < watermark:
+            watermark = -1
+    if watermark < 0:
+        previous = pd.DataFrame()
+
+    bounds = _bounds(con, table, columns)
+    key = key_column(columns)
+    exprs = ["COUNT(*)", "MAX(rowid)"]
+    for name, col_type in columns:
+        q = f'"{name}"'
+        exprs.append(f"COUNT(*) - COUNT({q})")
+        if name in bounds and None not in bounds[name] and bounds[name][3] > 0:
+            q1, q3, mean, std = bounds[name]
+            iqr = q3 - q1
+            exprs.append(f"COUNT(*) FILTER (WHERE {q} < {q1 - 1.5 * iqr} OR {q} > {q3 + 1.5 * iqr})")
+            exprs.append(f"COUNT(*) FILTER (WHERE ABS({q} - {mean}) > {Z_THRESHOLD * std})")
+        else:
+            exprs += ["0", "0"]
+        if col_type.upper().startswith("VARCHAR") and any(n in name.lower() for n in TEMPORAL_NAMES):
+            exprs.append(f"COUNT(*) FILTER (WHERE {q} IS NOT NULL AND "
+                         f"COALESCE(TRY_CAST({q} AS TIMESTAMP), TRY_CAST({q} AS DATE)) IS NULL)")
+        else:
+            exprs.append("0")
+        exprs.append(f"COUNT({q}) - COUNT(DISTINCT {q})" if name == key else "0")
+    row = con.execute(f"SELECT {', '.join(exprs)} FROM {table} WHERE rowid > {watermark}").fetchone()
+    new_rows, max_rowid, rest = row[0], row[1], row[2:]
+
+    cross_dups = 0
+    if key and watermark >= 0 and new_rows:
+        # New keys that collide with rows profiled earlier
+        cross_dups = con.execute(f"""
+            SELECT COUNT(*) FROM {table} WHERE rowid > {watermark}
+            AND "{key}" IN (SELECT "{key}" FROM {table} WHERE rowid <= {watermark})
+        """).fetchone()[0]
+
+    version = data_version()
+    profiled_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    records = []
+    for i, (name, col_type) in enumerate(columns):
+        counts = dict(zip(COUNTERS, rest[i * 5:(i + 1) * 5]))
+        if name == key:
+            counts["duplicate_keys"] += cross_dups
+        row_count = new_rows
+        if not previous.empty:
+            prev = previous.iloc[i]
+            counts = {k: counts[k] + int(prev[k]) for k in COUNTERS}
+            row_count += int(prev["row_count"])
+        records.append({
+            "data_version": version, "profiled_at": profiled_at, "table_name": table, "column_position": i,
+            "column_name": name, "column_type": col_type, "row_count": row_count,
+            "max_rowid": max_rowid if max_rowid is not None else watermark, **counts,
+        })
+    return pd.DataFrame(records)
+
+
+def profile_tables(con, tables=None, incremental: bool = True, store: bool = True, workers: int = 4) -> pd.DataFrame:
+    """Profile all tables concurrently (one cursor each) and optionally store the results."""
+    if tables is None:
+        # Views (e.g. KPI summaries) have no rowids to watermark
+        tables = [r[0] for r in con.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = 'main' AND table_type = 'BASE TABLE'"
+        ).fetchall() if not r[0].startswith("_")]
+    if not tables:
+        return pd.DataFrame()
+
+    def run(table):
+        cursor = con.cursor()
+        try:
+            return profile_table(cursor, table, incremental)
+        finally:
+            cursor.close()
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(tables))) as pool:
+        df = pd.concat(list(pool.map(run, tables)), ignore_index=True)
+    if store:
+        _create_table(con)
+        con.execute(f"INSERT INTO {PROFILE_TABLE} BY NAME SELECT * FROM df")
+        con.execute(f"""
+            DELETE FROM {PROFILE_TABLE} WHERE (table_name, profiled_at) NOT IN (
+                SELECT table_name, profiled_at FROM (
+                    SELECT DISTINCT table_name, profiled_at FROM {PROFILE_TABLE}
+                ) QUALIFY ROW_NUMBER() OVER (PARTITION BY table_name ORDER BY profiled_at DESC) <= {KEEP_RUNS}
+            )
+        """)
+    return df
+
+
+def load_profile(con, table: Optional[str] = None) -> pd.DataFrame:
+    """Latest stored profile per table (empty if none was stored yet)."""
+    if not _exists(con, PROFILE_TABLE):
+        return pd.DataFrame()
+    df = con.execute(f"""
+        SELECT * FROM {PROFILE_TABLE}
+        QUALIFY profiled_at = MAX(profiled_at) OVER (PARTITION BY table_name)
+        ORDER BY table_name, column_position
+    """).fetchdf()
+    return df[df["table_name"] == table].reset_index(drop=True) if table else df
+
+
+def summarize(profile: pd.DataFrame) -> pd.DataFrame:
+    """One row per table with total rows and summed issue counts."""
+    if profile.empty:
+        return profile
+    totals = profile.groupby("table_name", sort=False)[COUNTERS].sum()
+    totals.insert(0, "row_count", profile.groupby("table_name", sort=False)["row_count"].first())
+    totals.insert(1, "data_version", profile.groupby("table_name", sort=False)["data_version"].first())
+    return totals.reset_index()
@@ -0,0 +1,155 @@
+"""
+Validated question→SQL examples for few-shot NL→SQL prompts.
+
+Every statement that ran is recorded in a small SQLite store
+(``db/query_examples.sqlite``, safe to share between the API and Streamlit
+processes) with its success, latency and row count; one row per normalized
+question, so re-asking updates the stats instead of adding duplicates. The
+successful examples are held in an in-process TF-IDF index (inverted lists
+over ``schema_index.tokenize`` tokens), rebuilt only when the store file
+changes. ``lookup`` returns the SQL of a previously validated question that
+normalizes to the same words, so it can be reused without an LLM call;
+``similar`` returns the nearest examples to show the LLM as few-shots.
+"""
+import math, os, pathlib, sqlite3, threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from services.schema_index import tokenize
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+STORE_PATH = pathlib.Path(os.getenv("QUERY_EXAMPLES_DB", ROOT / "db" / "query_examples.sqlite"))
+TOP_K = 3
+MIN_SIMILARITY = 0.2
+STOPWORDS = {"a", "an", "the", "of", "in", "on", "for", "to", "me", "show", "list", "give", "what", "which",
+             "is", "are", "was", "were", "please", "can", "you", "i", "do", "does", "with", "and", "by", "per"}
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS examples (
+    id INTEGER PRIMARY KEY,
+    question_key TEXT NOT NULL UNIQUE,
+    question TEXT NOT NULL,
+    sql TEXT NOT NULL,
+    source TEXT,
+    success INTEGER NOT NULL,
+    latency_ms REAL,
+    row_count INTEGER,
+    uses INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT NOT NULL,
+    last_used_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS examples_success ON examples (success, last_used_at);
+"""
+
+_STORES: Dict[str, "ExampleStore"] = {}
+_LOCK = threading.Lock()
+
+
+def question_key(question: str) -> str:
+    """Words that identify a question: case, punctuation, plurals and filler words ignored."""
+    return " ".join(t for t in tokenize(question) if t not in STOPWORDS)
+
+
+class ExampleIndex:
+    def __init__(self, examples: List[Dict]):
+        self.examples = examples
+        self.by_key = {e["question_key"]: e for e in examples}
+        tfs = [Counter(e["question_key"].split()) for e in examples]
+        df = Counter(t for tf in tfs for t in tf)
+        n = len(examples)
+        self.idf = {t: math.log((n + 1) / (f + 0.5)) for t, f in df.items()}
+        self.postings: Dict[str, List] = {}
+        for i, tf in enumerate(tfs):
+            weights = {t: c * self.idf[t] for t, c in tf.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for t, w in weights.items():
+                self.postings.setdefault(t, []).append((i, w / norm))
+
+    def similar(self, question: str, k: int = TOP_K, min_similarity: float = MIN_SIMILARITY) -> List[Dict]:
+        tf = Counter(t for t in question_key(question).split() if t in self.idf)
+        weights = {t: c * self.idf[t] for t, c in tf.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        scores: Dict[int, float] = {}
+        for t, w in weights.items():
+            for i, dw in self.postings[t]:
+                scores[i] = scores.get(i, 0.0) + w / norm * dw
+        ranked = sorted(((s, i) for i, s in scores.items() if s >= min_similarity), key=lambda si: (-si[0], si[1]))
+        return [{**self.examples[i], "similarity": round(s, 3)} for s, i in ranked[:k]]
+
+
+class ExampleStore:
+    def __init__(self, path=STORE_PATH):
+        self.path = pathlib.Path(path)
+        self._index: Optional[ExampleIndex] = None
+        self._index_key = None
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as con:
+            con.executescript(SCHEMA)
+
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=10)
+        con.row_factory = sqlite3.Row
+        return con
+
+    def record(self, question: str, sql: str, success: bool, latency_ms: Optional[float] = None,
+               row_count: Optional[int] = None, source: str = "llm") -> None:
+        """Record an executed statement. Success replaces the question's SQL; failure only retires that same SQL."""
+        key, now = question_key(question), datetime.now(timezone.utc).isoformat()
+        if not key or not sql.strip():
+            return
+        with self._connect() as con:
+            if success:
+                con.execute("""
+                    INSERT INTO examples (question_key, question, sql, source, success, latency_ms, row_count, created_at, last_used_at)
+                    VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)
+                    ON CONFLICT (question_key) DO UPDATE SET
+                        question = excluded.question, sql = excluded.sql, source = excluded.source, success = 1,
+                        latency_ms = excluded.latency_ms, row_count = excluded.row_count,
+                        uses = uses + 1, last_used_at = excluded.last_used_at
+                """, (key, question.strip(), sql.strip(), source, latency_ms, row_count, now, now))
+            else:
+                con.execute("UPDATE examples SET success = 0, last_used_at = ? WHERE question_key = ? AND sql = ?",
+                            (now, key, sql.strip()))
+        con.close()
+
+    def examples(self, success_only: bool = True) -> List[Dict]:
+        with self._connect() as con:
+            where = "WHERE success = 1" if success_only else ""
+            rows = [dict(r) for r in con.execute(f"SELECT * FROM examples {where} ORDER BY id")]
+        con.close()
+        return rows
+
+    def index(self) -> ExampleIndex:
+        """Index of the successful examples, rebuilt when the store file has changed (in any process)."""
+        stat = self.path.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if self._index is None or key != self._index_key:
+                self._index, self._index_key = ExampleIndex(self.examples()), key
+            return self._index
+
+    def lookup(self, question: str) -> Optional[Dict]:
+        """The validated example for the same question, if any."""
+        return self.index().by_key.get(question_key(question))
+
+    def similar(self, question: str, k: int = TOP_K) -> List[Dict]:
+        return self.index().similar(question, k)
+
+
+def get_store(path=None) -> ExampleStore:
+    """The process-wide example store for a file (``STORE_PATH`` by default)."""
+    path = path or STORE_PATH
+    key = str(pathlib.Path(path).resolve())
+    with _LOCK:
+        if key not in _STORES:
+            _STORES[key] = ExampleStore(path)
+        return _STORES[key]
+
+
+def few_shot_text(examples: List[Dict]) -> str:
+    if not examples:
+        return ""
+    lines = ["Validated examples of similar questions:"]
+    for e in examples:
+        lines += [f"Question: {e['question']}", f"SQL: {e['sql']}"]
+    return "\n".join(lines)
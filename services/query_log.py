@@ -0,0 +1,153 @@
+"""
+Append-only query log for history, cache warm-up and usage analytics.
+
+Callers ``log()`` an entry (question, SQL, user, source, latency, row count,
+cache hit, error) and return immediately: entries go on a bounded queue and
+a background thread appends them to a SQLite table
+(``db/query_log.sqlite``) in batched transactions, so request threads never
+wait on the disk and concurrent sessions never overwrite each other. Rows
+are only ever inserted; indexes on time, normalized question and user serve
+``recent`` (history sidebar), ``frequent`` (warm-up) and ``usage``
+(per-day analytics).
+"""
+import atexit, os, pathlib, queue, sqlite3, threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import pandas as pd
+from services.query_examples import question_key
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+LOG_PATH = pathlib.Path(os.getenv("QUERY_LOG_DB", ROOT / "db" / "query_log.sqlite"))
+# Entries from these sources are synthetic traffic, never replayed as frequent questions
+SYNTHETIC_SOURCES = ("test", "benchmark")
+BATCH_SIZE = 200
+FLUSH_INTERVAL_S = 0.5
+MAX_QUEUE = 10_000
+COLUMNS = ("ts", "user", "source", "question", "question_key", "sql", "latency_ms", "row_count", "cache_hit", "error")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_log (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    user TEXT,
+    source TEXT,
+    question TEXT,
+    question_key TEXT,
+    sql TEXT,
+    latency_ms REAL,
+    row_count INTEGER,
+    cache_hit INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS query_log_ts ON query_log (ts);
+CREATE INDEX IF NOT EXISTS query_log_question ON query_log (question_key, ts);
+CREATE INDEX IF NOT EXISTS query_log_user ON query_log (user, ts);
+"""
+
+_LOGS: Dict[str, "QueryLog"] = {}
+_LOCK = threading.Lock()
+
+
+class QueryLog:
+    def __init__(self, path=LOG_PATH, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL_S):
+        self.path = pathlib.Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=MAX_QUEUE)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        con = self._connect()
+        con.executescript(SCHEMA)
+        con.close()
+        threading.Thread(target=self._writer, name="query-log", daemon=True).start()
+
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    def log(self, question: Optional[str] = None, sql: Optional[str] = None, user: Optional[str] = None,
+            source: Optional[str] = None, latency_ms: Optional[float] = None, row_count: Optional[int] = None,
+            cache_hit: bool = False, error: Optional[str] = None) -> None:
+        """Queue an entry; never blocks (entries are dropped and counted if the writer falls far behind)."""
+        entry = (datetime.now(timezone.utc).isoformat(), user, source, question,
+                 question_key(question) if question else None, sql, latency_ms, row_count, int(cache_hit),
+                 str(error) if error else None)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _writer(self):
+        con = self._connect()
+        insert = f"INSERT INTO query_log ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            try:
+                with con:
+                    con.executemany(insert, batch)
+            except sqlite3.Error:
+                self.dropped += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self) -> None:
+        """Wait until every queued entry is written."""
+        self._queue.join()
+
+    def _read(self, sql: str, params=()) -> pd.DataFrame:
+        con = self._connect()
+        try:
+            return pd.read_sql_query(sql, con, params=params)
+        finally:
+            con.close()
+
+    def recent(self, limit: int = 20, user: Optional[str] = None) -> List[Dict]:
+        """Latest successful questions, newest first, one entry per question."""
+        where = "AND user = ?" if user else ""
+        df = self._read(f"""
+            SELECT question, sql, MAX(ts) AS ts FROM query_log
+            WHERE question IS NOT NULL AND error IS NULL {where}
+            GROUP BY question_key ORDER BY ts DESC LIMIT ?
+        """, (user, limit) if user else (limit,))
+        return df.to_dict("records")
+
+    def frequent(self, limit: int = 10, days: Optional[int] = None, exclude_sources=()) -> List[Dict]:
+        """Most asked successful questions with their latest SQL, e.g. for cache warm-up."""
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat() if days else ""
+        exclude = list(exclude_sources)
+        skip = f"AND COALESCE(source, '') NOT IN ({', '.join('?' * len(exclude))})" if exclude else ""
+        df = self._read(f"""
+            SELECT question, sql, n, ts FROM (
+                SELECT question, sql, ts, COUNT(*) OVER (PARTITION BY question_key) AS n,
+                       ROW_NUMBER() OVER (PARTITION BY question_key ORDER BY ts DESC) AS rn
+                FROM query_log WHERE question IS NOT NULL AND error IS NULL AND ts >= ? {skip}
+            ) WHERE rn = 1 ORDER BY n DESC, ts DESC LIMIT ?
+        """, (since, *exclude, limit))
+        return df.to_dict("records")
+
+    def usage(self, days: int = 30) -> pd.DataFrame:
+        """Per day and source: queries, errors, cache hits, users and latency."""
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        return self._read("""
+            SELECT substr(ts, 1, 10) AS day, source, COUNT(*) AS queries, COUNT(error) AS errors,
+                   SUM(cache_hit) AS cache_hits, COUNT(DISTINCT user) AS users,
+                   ROUND(AVG(latency_ms), 1) AS avg_latency_ms, ROUND(MAX(latency_ms), 1) AS max_latency_ms
+            FROM query_log WHERE ts >= ? GROUP BY 1, 2 ORDER BY 1, 2
+        """, (since,))
+
+
+def get_log(path=None) -> QueryLog:
+    """The process-wide query log for a file (``LOG_PATH`` by default)."""
+    path = path or LOG_PATH
+    key = str(pathlib.Path(path).resolve())
+    with _LOCK:
+        if key not in _LOGS:
+            _LOGS[key] = QueryLog(path)
+            atexit.register(_LOGS[key].flush)
+        return _LOGS[key]
@@ -0,0 +1,210 @@
+"""
+Materialized KPI rollups at day/month × machine × status × table grain.
+
+``_kpi_daily`` and ``_kpi_monthly`` hold row counts per (table, period,
+machine, status, is_failure), the failure flag coming from the ingestion-time
+classification (services/failures.py). Streaming micro-batches merge only the rows past
+each table's rowid watermark into them; a full reload replaces the tables and
+rebuilds their rollups. Failures by machine, daily/monthly throughput and
+status distributions are answered from these summaries, whose size follows
+the number of machines and days rather than the raw row count. The
+``monthly_failures_summary`` view exposes them to SQL callers.
+"""
+import duckdb, pathlib
+import pandas as pd
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from services.failures import failure_predicate
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+DB_PATH = ROOT / "db" / "fclm.duckdb"
+
+DAILY_TABLE = "_kpi_daily"
+MONTHLY_TABLE = "_kpi_monthly"
+WATERMARK_TABLE = "_kpi_watermarks"
+SUMMARY_VIEW = "monthly_failures_summary"
+STATUS_CANDIDATES = ("status", "defect_type", "result", "outcome")
+MACHINE_CANDIDATES = ("machine_id", "machine", "tool", "station")
+DATE_CANDIDATES = ("datetime", "date_time", "timestamp", "date", "time")
+# Formats seen in the raw CSVs when the column was not auto-detected as a timestamp
+DATE_FORMATS = ("%m/%d/%y %H:%M:%S", "%m/%d/%Y %H:%M:%S", "%m/%d/%y %H:%M", "%m/%d/%Y %H:%M", "%m/%d/%y", "%m/%d/%Y")
+
+KPIS = {
+    "failures_by_machine": ("daily", """
+        SELECT machine_id AS machine, COALESCE(SUM(n) FILTER (WHERE is_failure), 0)::BIGINT AS failures,
+               SUM(n)::BIGINT AS total, COALESCE(SUM(n) FILTER (WHERE is_failure), 0) / SUM(n) AS failure_rate
+        FROM {table} {where} GROUP BY 1 ORDER BY failures DESC NULLS LAST, machine
+    """),
+    "daily_throughput": ("daily", """
+        SELECT period AS day, SUM(n)::BIGINT AS count FROM {table} {where} GROUP BY 1 ORDER BY 1
+    """),
+    "monthly_throughput": ("monthly", """
+        SELECT period AS month, SUM(n)::BIGINT AS count FROM {table} {where} GROUP BY 1 ORDER BY 1
+    """),
+    "monthly_failures": ("monthly", """
+        SELECT period AS month, machine_id AS machine, COALESCE(SUM(n) FILTER (WHERE is_failure), 0)::BIGINT AS failures,
+               SUM(n)::BIGINT AS total
+        FROM {table} {where} GROUP BY 1, 2 ORDER BY 1, 2
+    """),
+    "status_distribution": ("daily", """
+        SELECT status, SUM(n)::BIGINT AS count, SUM(n) * 100.0 / SUM(SUM(n)) OVER () AS percentage
+        FROM {table} {where} GROUP BY 1 ORDER BY 2 DESC
+    """),
+}
+
+
+def _create_tables(con):
+    for table in (DAILY_TABLE, MONTHLY_TABLE):
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                table_name VARCHAR, period DATE, machine_id VARCHAR, status VARCHAR, is_failure BOOLEAN, n BIGINT
+            )
+        """)
+    con.execute(f"CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (table_name VARCHAR PRIMARY KEY, max_rowid BIGINT, updated_at TIMESTAMP)")
+    con.execute(f"""
+        CREATE OR REPLACE VIEW {SUMMARY_VIEW} AS
+        SELECT table_name, period AS month, machine_id, SUM(n)::BIGINT AS total,
+               COALESCE(SUM(n) FILTER (WHERE is_failure), 0)::BIGINT AS failures,
+               COALESCE(SUM(n) FILTER (WHERE is_failure), 0) / SUM(n) AS failure_rate
+        FROM {MONTHLY_TABLE} GROUP BY ALL
+    """)
+
+
+def _exists(con, table: str) -> bool:
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table]
+    ).fetchone()[0] > 0
+
+
+def _find(columns: Dict[str, str], candidates) -> Optional[str]:
+    lower = {c.lower(): c for c in columns}
+    for cand in candidates:
+        if cand in lower:
+            return lower[cand]
+    for cand in candidates:
+        match = next((c for l, c in lower.items() if cand in l), None)
+        if match:
+            return match
+    return None
+
+
+def _ref(column: str, alias: Optional[str]) -> str:
+    return f'{alias}."{column}"' if alias else f'"{column}"'
+
+
+def timestamp_expr(column: str, col_type: str, alias: Optional[str] = None) -> str:
+    """SQL expression turning a date/datetime column (typed or text) into a TIMESTAMP."""
+    ref = _ref(column, alias)
+    if col_type.upper().startswith(("TIMESTAMP", "DATE")):
+        return f"{ref}::TIMESTAMP"
+    # The US month/day formats go first: a plain cast reads "9/1/25" as year 9
+    parsed = [f"try_strptime({ref}::VARCHAR, '{f}')" for f in DATE_FORMATS] + [f"TRY_CAST({ref} AS TIMESTAMP)"]
+    return f"COALESCE({', '.join(parsed)})"
+
+
+def date_expr(column: str, col_type: str, alias: Optional[str] = None) -> str:
+    """SQL expression turning a date/datetime column (typed or text) into a DATE."""
+    if col_type.upper().startswith(("TIMESTAMP", "DATE")):
+        return f"{_ref(column, alias)}::DATE"
+    return f"{timestamp_expr(column, col_type, alias)}::DATE"
+
+
+def _delta_sql(con, table: str, watermark: int) -> Optional[str]:
+    columns = dict(con.execute(
+        "SELECT column_name, data_type FROM information_schema.columns WHERE table_schema = 'main' AND table_name = ?",
+        [table]).fetchall())
+    status = _find(columns, STATUS_CANDIDATES)
+    if not status:
+        return None
+    machine = _find(columns, MACHINE_CANDIDATES)
+    date = _find(columns, DATE_CANDIDATES)
+    return f"""
+        SELECT '{table}' AS table_name, {date_expr(date, columns[date]) if date else 'NULL::DATE'} AS period,
+               {f'"{machine}"::VARCHAR' if machine else 'NULL::VARCHAR'} AS machine_id,
+               "{status}"::VARCHAR AS status, {failure_predicate(columns) or 'false'} AS is_failure, COUNT(*) AS n
+        FROM {table} WHERE rowid > {watermark} GROUP BY ALL
+    """
+
+
+def _merge(con, target: str, delta: str):
+    con.execute(f"""
+        MERGE INTO {target} AS r USING ({delta}) AS d
+        ON r.table_name = d.table_name AND r.period IS NOT DISTINCT FROM d.period
+           AND r.machine_id IS NOT DISTINCT FROM d.machine_id AND r.status IS NOT DISTINCT FROM d.status
+        WHEN MATCHED THEN UPDATE SET n = r.n + d.n
+        WHEN NOT MATCHED THEN INSERT BY NAME
+    """)
+
+
+def update_rollups(con, tables=None, rebuild: bool = False) -> Dict[str, int]:
+    """Merge rows past each table's watermark into the rollups; returns rows folded in per table."""
+    _create_tables(con)
+    if tables is None:
+        tables = [r[0] for r in con.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = 'main' AND table_type = 'BASE TABLE'"
+        ).fetchall() if not r[0].startswith("_")]
+    merged = {}
+    for table in tables:
+        row = con.execute(f"SELECT max_rowid FROM {WATERMARK_TABLE} WHERE table_name = ?", [table]).fetchone()
+        watermark = -1 if rebuild or row is None else row[0]
+        max_rowid = con.execute(f"SELECT COALESCE(MAX(rowid), -1) FROM {table}").fetchone()[0]
+        if max_rowid < watermark:
+            # Table was replaced since the last merge: start it over
+            watermark = -1
+        # Tables are append-only, so rowids past the watermark are the new rows
+        count = max_rowid - watermark
+        delta = _delta_sql(con, table, watermark)
+        if delta is None:
+            continue
+        if watermark < 0:
+            for target in (DAILY_TABLE, MONTHLY_TABLE):
+                con.execute(f"DELETE FROM {target} WHERE table_name = ?", [table])
+        if count:
+            _merge(con, DAILY_TABLE, delta)
+            monthly = (f"SELECT table_name, date_trunc('month', period)::DATE AS period, machine_id, status, "
+                       f"is_failure, SUM(n) AS n FROM ({delta}) GROUP BY ALL")
+            _merge(con, MONTHLY_TABLE, monthly)
+        con.execute(f"INSERT OR REPLACE INTO {WATERMARK_TABLE} VALUES (?, ?, ?)",
+                    [table, max(max_rowid, watermark), datetime.now(timezone.utc).replace(tzinfo=None)])
+        merged[table] = count
+    return merged
+
+
+def available(con) -> bool:
+    return _exists(con, DAILY_TABLE)
+
+
+def kpi(name: str, table: Optional[str] = None, start=None, end=None, con=None, db_path=DB_PATH) -> pd.DataFrame:
+    """Answer a named KPI (see ``KPIS``) from the rollups, optionally for one table and a period range."""
+    if name not in KPIS:
+        raise ValueError(f"Unknown KPI '{name}'. Available: {', '.join(KPIS)}")
+    grain, sql = KPIS[name]
+    owned = con is None
+    con = con or duckdb.connect(str(db_path), read_only=True)
+    try:
+        if not available(con):
+            raise LookupError("KPI rollups have not been built yet; run ingestion first")
+        filters, params = [], []
+        for clause, value in (("table_name = ?", table), ("period >= ?", start), ("period <= ?", end)):
+            if value is not None:
+                filters.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+        source = DAILY_TABLE if grain == "daily" else MONTHLY_TABLE
+        return con.execute(sql.format(table=source, where=where), params).fetchdf()
+    finally:
+        if owned:
+            con.close()
+
+
+def table_totals(con=None, db_path=DB_PATH) -> Dict[str, int]:
+    """Row count per tracked table, read from the daily rollup."""
+    owned = con is None
+    con = con or duckdb.connect(str(db_path), read_only=True)
+    try:
+        if not available(con):
+            return {}
+        return dict(con.execute(f"SELECT table_name, SUM(n)::BIGINT FROM {DAILY_TABLE} GROUP BY 1").fetchall())
+    finally:
+        if owned:
+            con.close()
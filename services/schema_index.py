@@ -0,0 +1,192 @@
+"""
+Relevance-pruned schema context for NL→SQL prompts.
+
+Every column of the catalog becomes a small document: table and column name
+tokens, a short description, the type and (from ``_column_stats``) its common
+values. An in-process BM25 index over these documents is built once per data
+version. For a question, the best-scoring tables are kept with their matched
+columns plus a few anchor columns (date, machine, status, failure flag), and
+``build_prompt`` lays them out deterministically: fixed instructions first,
+then the schema of the selected tables in name order, then the question, so
+repeated selections share a byte-identical prefix, which the LLM gateway
+sends as a separately cached content block (provider-side prompt caching).
+"""
+import json, math, pathlib, re, threading
+from collections import Counter
+from typing import Dict, List, Optional
+from services import lineage
+from services.catalog import get_catalog
+from services.stats import describe_column, load_column_stats
+from services.versioning import data_version
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+DB_PATH = ROOT / "db" / "fclm.duckdb"
+
+K1, B = 1.5, 0.75
+MAX_TABLES = 2
+MAX_COLUMNS = 8
+# A table is kept when it scores at least this share of the best table
+TABLE_CUTOFF = 0.5
+ANCHOR_COLUMNS = ("DateTime", "Machine_ID", "Status", "is_failure")
+# identifier fragment -> description words
+DESCRIPTIONS = {
+    "temp": "temperature heat", "rtd": "temperature sensor", "pid": "heater controller setpoint",
+    "psi": "pressure", "sccm": "flow rate", "flowrate": "flow rate", "o2": "oxygen", "purity": "oxygen purity",
+    "humidity": "humidity moisture", "mix": "mixing ratio gas", "lot": "lot batch", "datetime": "date time day month when",
+    "machine": "machine tool station equipment", "status": "status result outcome pass fail",
+    "failure": "failure failed fail reject error defect", "issue": "issue leak error remark problem",
+    "remarks": "remarks comment note issue", "defect": "defect issue failure", "operator": "operator technician person",
+    "valve": "valve open closed", "cure": "cure curing", "precure": "precure curing duration",
+    "duration": "duration minutes time", "cavity": "cavity mold", "lens": "lens", "protocol": "protocol recipe",
+    "gas": "gas", "rate": "rate ratio percentage",
+}
+PROMPT_PREFIX = (
+    "You translate business questions into a single DuckDB SELECT statement.\n"
+    "Use only the tables and columns listed below; quote identifiers that contain special characters.\n"
+    "Return only the SQL, without explanations or code fences."
+)
+
+_INDEXES: Dict[tuple, "SchemaIndex"] = {}
+_LOCK = threading.Lock()
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; identifiers are split on underscores, digits and camel case."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(text))
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        tokens.append(word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word)
+    return tokens
+
+
+class BM25:
+    def __init__(self, texts: List[str]):
+        self._tf = [Counter(tokenize(t)) for t in texts]
+        self._len = [sum(tf.values()) for tf in self._tf]
+        self._avg = sum(self._len) / max(len(self._len), 1)
+        df = Counter(t for tf in self._tf for t in tf)
+        n = len(texts)
+        self._idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def scores(self, question: str) -> List[float]:
+        terms = [t for t in tokenize(question) if t in self._idf]
+        result = []
+        for tf, length in zip(self._tf, self._len):
+            s = 0.0
+            for t in terms:
+                f = tf.get(t, 0)
+                if f:
+                    s += self._idf[t] * f * (K1 + 1) / (f + K1 * (1 - B + B * length / self._avg))
+            result.append(s)
+        return result
+
+
+class SchemaIndex:
+    def __init__(self, documents: List[Dict], tables: Dict[str, str]):
+        """documents: {"table", "column", "text", "line"} per column in catalog order; tables: table -> text."""
+        self.documents = documents
+        self.tables = list(tables)
+        self._columns = BM25([d["text"] for d in documents])
+        # Table-level documents keep wide tables from winning on many weak column matches
+        self._tables = BM25(list(tables.values()))
+
+    def select(self, question: str, max_tables: int = MAX_TABLES, max_columns: int = MAX_COLUMNS) -> Dict[str, List[str]]:
+        """Minimal {table: [columns in table order]} relevant to the question."""
+        by_table: Dict[str, List] = {}
+        for s, d in zip(self._columns.scores(question), self.documents):
+            if s > 0:
+                by_table.setdefault(d["table"], []).append((s, d["column"]))
+        if not by_table:
+            return {}
+        table_scores = dict(zip(self.tables, self._tables.scores(question)))
+        rank = {t: table_scores.get(t, 0.0) + max(s for s, _ in cols) for t, cols in by_table.items()}
+        best = max(rank.values())
+        tables = sorted((t for t in rank if rank[t] >= TABLE_CUTOFF * best), key=lambda t: (-rank[t], t))[:max_tables]
+        selection = {}
+        for table in sorted(tables):
+            order = [d["column"] for d in self.documents if d["table"] == table]
+            matched = [c for _, c in sorted(by_table[table], key=lambda sc: (-sc[0], sc[1]))][:max_columns]
+            keep = set(matched) | {c for c in ANCHOR_COLUMNS if c in order}
+            selection[table] = [c for c in order if c in keep]
+        return selection
+
+    def schema_text(self, selection: Dict[str, List[str]]) -> str:
+        lines = []
+        for table in sorted(selection):
+            lines.append(f"Table {table}:")
+            lines += [f"  {d['line']}" for d in self.documents
+                      if d["table"] == table and d["column"] in selection[table]]
+        return "\n".join(lines)
+
+
+def _describe(name: str) -> str:
+    words = [DESCRIPTIONS[t] for t in tokenize(name) if t in DESCRIPTIONS]
+    return " ".join(words)
+
+
+def build_index(con=None, db_path=DB_PATH) -> SchemaIndex:
+    catalog = get_catalog(con, db_path)
+    stats = load_column_stats(con, db_path)
+    by_column = {(s["table_name"], s["column_name"]): s for s in stats.to_dict("records")} if not stats.empty else {}
+    documents, tables = [], {}
+    for table in catalog.tables():
+        tables[table] = f"{table} {_describe(table)}"
+        for col in catalog.columns(table):
+            name, col_type = col["column_name"], col["column_type"]
+            s = by_column.get((table, name))
+            values = " ".join(json.loads(s["top_values"] or "[]")) if s else ""
+            documents.append({
+                "table": table, "column": name,
+                "text": f"{name} {_describe(name)} {values}",
+                "line": describe_column(s) if s else f"{name} {col_type}",
+            })
+    return SchemaIndex(documents, tables)
+
+
+def get_index(con=None, db_path=DB_PATH) -> SchemaIndex:
+    """Index for the current data version; built once per version."""
+    key = (str(pathlib.Path(db_path).resolve()), data_version())
+    index = _INDEXES.get(key)
+    if index is None:
+        with _LOCK:
+            if key not in _INDEXES:
+                for stale in [k for k in _INDEXES if k[0] == key[0]]:
+                    del _INDEXES[stale]
+                _INDEXES[key] = build_index(con, db_path)
+            index = _INDEXES[key]
+    return index
+
+
+def build_prompt(question: str, con=None, db_path=DB_PATH, extra: Optional[str] = None,
+                 selection: Optional[Dict[str, List[str]]] = None, examples: Optional[str] = None) -> Dict:
+    """
+    Prompt with only the relevant schema. Returns {"prompt", "prefix", "selection"}; ``prefix`` is
+    everything before the few-shot examples and the question, and only changes with the selected schema.
+    """
+    index = get_index(con, db_path)
+    selection = index.select(question) if selection is None else selection
+    if not selection:
+        # Nothing matched: fall back to the table names alone rather than the whole schema
+        selection = {t: [] for t in sorted(index.tables)}
+    parts = [PROMPT_PREFIX, index.schema_text(selection)]
+    if extra:
+        parts.append(extra)
+    prefix = "\n\n".join(p for p in parts if p)
+    shots = f"{examples}\n\n" if examples else ""
+    return {"prompt": f"{prefix}\n\n{shots}Question: {question.strip()}\nSQL:", "prefix": prefix, "selection": selection}
+
+
+def nl2sql_prompt(question: str, con=None, db_path=DB_PATH, few_shot: bool = True) -> Dict:
+    """
+    build_prompt plus the lot lineage guidance when lot_lineage is among the selected tables and,
+    with ``few_shot``, the nearest validated examples (services/query_examples.py).
+    """
+    # query_examples builds on this module's tokenizer, so it is imported here
+    from services.query_examples import few_shot_text, get_store
+    examples = get_store().similar(question) if few_shot else []
+    prompt = build_prompt(question, con=con, db_path=db_path, examples=few_shot_text(examples))
+    if lineage.LINEAGE_TABLE in prompt["selection"]:
+        prompt = build_prompt(question, con=con, db_path=db_path, selection=prompt["selection"],
+                              extra=lineage.prompt_context(con=con, db_path=db_path, with_columns=False),
+                              examples=few_shot_text(examples))
+    return {**prompt, "examples": examples}
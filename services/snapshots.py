@@ -0,0 +1,131 @@
+"""
+Immutable Parquet snapshots of the FCLM tables with time-travel lookup.
+
+Every ingestion writes each table to ``db/snapshots/<version>/<table>.parquet``
+and records it in ``manifest.json``. The manifest keeps two pointers:
+``live`` is the version currently loaded in the DuckDB file and ``current``
+is the version queries are served from. Restoring a snapshot only moves
+``current``; no CSVs are reloaded.
+"""
+import duckdb, json, os, pathlib, shutil
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+SNAPSHOT_DIR = pathlib.Path(os.getenv("SNAPSHOT_DIR", ROOT / "db" / "snapshots"))
+RETENTION = int(os.getenv("SNAPSHOT_RETENTION", 10))
+MANIFEST = "manifest.json"
+
+
+class UnknownSnapshot(ValueError):
+    """``as_of`` names no snapshot (a ValueError, so existing handlers keep working)."""
+
+
+def _empty_manifest() -> Dict:
+    return {"current": None, "live": None, "versions": []}
+
+
+def load_manifest(snapshot_dir=SNAPSHOT_DIR) -> Dict:
+    path = pathlib.Path(snapshot_dir) / MANIFEST
+    if not path.exists():
+        return _empty_manifest()
+    return json.loads(path.read_text())
+
+
+def _write_manifest(manifest: Dict, snapshot_dir=SNAPSHOT_DIR):
+    # Write-then-rename so readers never see a half-written manifest
+    path = pathlib.Path(snapshot_dir) / MANIFEST
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, path)
+
+
+def list_snapshots(snapshot_dir=SNAPSHOT_DIR) -> List[Dict]:
+    """Return snapshot entries, oldest first."""
+    return load_manifest(snapshot_dir)["versions"]
+
+
+def current_version(snapshot_dir=SNAPSHOT_DIR) -> Optional[str]:
+    """Version that queries are served from (None before the first snapshot)."""
+    return load_manifest(snapshot_dir)["current"]
+
+
+def create_snapshot(con, tables=None, snapshot_dir=SNAPSHOT_DIR, retention=RETENTION) -> str:
+    """Write every table to a new immutable Parquet snapshot and make it current."""
+    snapshot_dir = pathlib.Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    if tables is None:
+        tables = [r[0] for r in con.execute("SHOW TABLES").fetchall() if not r[0].startswith("_")]
+    created = datetime.now(timezone.utc)
+    version = created.strftime("%Y%m%dT%H%M%S%fZ")
+    staging = snapshot_dir / f".{version}"
+    staging.mkdir()
+    for t in tables:
+        con.execute(f"COPY {t} TO '{(staging / f'{t}.parquet').as_posix()}' (FORMAT PARQUET)")
+    os.rename(staging, snapshot_dir / version)
+
+    manifest = load_manifest(snapshot_dir)
+    manifest["versions"].append({"version": version, "created_at": created.isoformat(), "tables": list(tables)})
+    manifest["current"] = manifest["live"] = version
+    _prune(manifest, snapshot_dir, retention)
+    _write_manifest(manifest, snapshot_dir)
+    return version
+
+
+def _prune(manifest: Dict, snapshot_dir: pathlib.Path, retention: int):
+    """Drop the oldest snapshots beyond ``retention``, never the live or current one."""
+    keep = {manifest["current"], manifest["live"]}
+    versions = manifest["versions"]
+    excess = len(versions) - retention
+    for entry in list(versions):
+        if excess <= 0:
+            break
+        if entry["version"] in keep:
+            continue
+        shutil.rmtree(snapshot_dir / entry["version"], ignore_errors=True)
+        versions.remove(entry)
+        excess -= 1
+
+
+def resolve_version(as_of: str, snapshot_dir=SNAPSHOT_DIR) -> str:
+    """Map ``as_of`` (a version id or an ISO timestamp) to a snapshot version."""
+    versions = list_snapshots(snapshot_dir)
+    if any(v["version"] == as_of for v in versions):
+        return as_of
+    try:
+        ts = datetime.fromisoformat(as_of)
+    except ValueError:
+        raise UnknownSnapshot(f"Unknown snapshot or timestamp: {as_of}")
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    eligible = [v for v in versions if datetime.fromisoformat(v["created_at"]) <= ts]
+    if not eligible:
+        raise UnknownSnapshot(f"No snapshot at or before {as_of}")
+    return eligible[-1]["version"]
+
+
+def restore_snapshot(version: str, snapshot_dir=SNAPSHOT_DIR) -> str:
+    """Serve queries from ``version`` by moving the current pointer."""
+    manifest = load_manifest(snapshot_dir)
+    if not any(v["version"] == version for v in manifest["versions"]):
+        raise UnknownSnapshot(f"Unknown snapshot: {version}")
+    manifest["current"] = version
+    _write_manifest(manifest, snapshot_dir)
+    return version
+
+
+def needs_snapshot_connection(version: Optional[str], snapshot_dir=SNAPSHOT_DIR) -> bool:
+    """True when ``version`` differs from the data loaded in the DuckDB file."""
+    return version is not None and version != load_manifest(snapshot_dir)["live"]
+
+
+def snapshot_connection(version: str, snapshot_dir=SNAPSHOT_DIR):
+    """In-memory DuckDB connection exposing a snapshot's tables as Parquet views."""
+    entry = next((v for v in list_snapshots(snapshot_dir) if v["version"] == version), None)
+    if entry is None:
+        raise UnknownSnapshot(f"Unknown snapshot: {version}")
+    con = duckdb.connect()
+    for t in entry["tables"]:
+        path = (pathlib.Path(snapshot_dir) / version / f"{t}.parquet").as_posix()
+        con.execute(f"CREATE VIEW {t} AS SELECT * FROM read_parquet('{path}')")
+    return con
@@ -0,0 +1,172 @@
+"""
+Speculative execution for /powerbi/query.
+
+When a question is going to the LLM (the intent matcher is not confident
+enough to answer it alone), the matcher's best-guess SQL is started on a
+DuckDB connection while the LLM call is in flight. If the LLM's SQL
+normalizes to the same statement, the speculative result is returned and the
+question costs roughly the LLM latency alone; otherwise the speculation is
+interrupted and the LLM's SQL runs as usual. Wasted work is bounded: at most
+``MAX_INFLIGHT`` speculations run at once (questions beyond that are not
+speculated) and each is interrupted after ``BUDGET_S`` seconds. Hits, misses
+and wasted query time are counted for ``metrics()``. Executed answers are
+recorded as few-shot examples (services/query_examples.py).
+"""
+import os, re, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+import pandas as pd
+from services import db, llm_backends
+from services.nl2sql import CONFIDENCE_THRESHOLD, match_intent, nl2sql_with_guardrails
+from services.query_examples import get_store
+from services.query_log import get_log
+from services.versioning import data_version
+
+ENABLED = os.getenv("SPECULATIVE_QUERIES", "1") != "0"
+MAX_INFLIGHT = int(os.getenv("SPECULATION_MAX_INFLIGHT", "2"))
+BUDGET_S = float(os.getenv("SPECULATION_BUDGET_S", "3"))
+
+_POOL = ThreadPoolExecutor(max_workers=MAX_INFLIGHT, thread_name_prefix="speculate")
+_SLOTS = threading.BoundedSemaphore(MAX_INFLIGHT)
+_LOCK = threading.Lock()
+_STATS = {"speculated": 0, "skipped": 0, "hits": 0, "misses": 0, "expired": 0, "saved_s": 0.0, "wasted_s": 0.0}
+
+
+def normalize_sql(sql: str) -> str:
+    """Comparable form of a statement: case, whitespace, identifier quotes and a trailing ';' ignored outside literals."""
+    parts = re.split(r"('(?:[^']|'')*')", sql.strip().rstrip(";"))
+    out = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            out.append(part)
+            continue
+        part = re.sub(r'"([A-Za-z_][A-Za-z0-9_]*)"', r"\1", part).lower()
+        part = re.sub(r"\s+", " ", part)
+        out.append(re.sub(r"\s*([(),=<>*+/-])\s*", r"\1", part))
+    return "".join(out).strip()
+
+
+def _count(**deltas):
+    with _LOCK:
+        for name, value in deltas.items():
+            _STATS[name] += value
+
+
+class Speculation:
+    """One predicted statement running in the background on its own connection."""
+    def __init__(self, sql: str, as_of: Optional[str] = None, budget_s: float = BUDGET_S):
+        self.sql = sql
+        self.version = data_version()
+        self.elapsed = 0.0
+        self.hit = False
+        self._closed = False
+        self._lock = threading.Lock()
+        self.con = db.connect(as_of)
+        self._timer = threading.Timer(budget_s, self.cancel)
+        self._timer.daemon = True
+        self.future = _POOL.submit(self._run)
+
+    def _run(self) -> pd.DataFrame:
+        self._timer.start()
+        start = time.perf_counter()
+        try:
+            return self.con.execute(self.sql).fetchdf()
+        finally:
+            self.elapsed = time.perf_counter() - start
+            self._timer.cancel()
+            with self._lock:
+                self._closed = True
+                self.con.close()
+
+    def cancel(self):
+        with self._lock:
+            if not self._closed:
+                self.con.interrupt()
+
+    def result_for(self, sql: str) -> Optional[pd.DataFrame]:
+        """The speculative result if ``sql`` is the predicted statement on unchanged data, else None."""
+        if normalize_sql(sql) != normalize_sql(self.sql):
+            self.cancel()
+            self.future.add_done_callback(lambda _: _count(misses=1, wasted_s=self.elapsed))
+            return None
+        try:
+            df = self.future.result()
+        except Exception:
+            # Interrupted by the budget (or failed): the caller runs the statement itself
+            _count(expired=1, wasted_s=self.elapsed)
+            return None
+        if data_version() != self.version:
+            _count(misses=1, wasted_s=self.elapsed)
+            return None
+        self.hit = True
+        _count(hits=1, saved_s=self.elapsed)
+        return df
+
+
+def speculate(question: str, as_of: Optional[str] = None) -> Optional[Speculation]:
+    """Start the matcher's guess for a question that will go to the LLM; None when there is nothing to overlap."""
+    if not ENABLED or not llm_backends.configured():
+        return None
+    match = match_intent(question)
+    # Confident matches are answered without the LLM, so there is nothing to overlap
+    if match is None or match["confidence"] >= CONFIDENCE_THRESHOLD:
+        return None
+    sql = " ".join(match["sql"].split())
+    try:
+        db.check_select(sql)
+    except ValueError:
+        return None
+    if not _SLOTS.acquire(blocking=False):
+        _count(skipped=1)
+        return None
+    try:
+        spec = Speculation(sql, as_of)
+    except Exception:
+        _SLOTS.release()
+        raise
+    spec.future.add_done_callback(lambda _: _SLOTS.release())
+    _count(speculated=1)
+    return spec
+
+
+def query(question: str, as_of: Optional[str] = None,
+          translate: Callable[[str], Dict] = nl2sql_with_guardrails, user: Optional[str] = None,
+          source: str = "powerbi") -> Dict:
+    """NL→SQL→rows with the likely statement executing while the question is translated."""
+    spec = speculate(question, as_of)
+    try:
+        result = translate(question)
+    except BaseException:
+        if spec:
+            spec.cancel()
+        raise
+    start = time.perf_counter()
+    # The fixed fallback SQL is not a real answer, so it is never kept as an example
+    keep = result.get("source") not in (None, "default")
+    try:
+        df = spec.result_for(result["sql"]) if spec else None
+        if df is None:
+            df = db.safe_execute_select(result["sql"], as_of=as_of)
+    except Exception as e:
+        if keep:
+            get_store().record(question, result["sql"], success=False, source=result["source"])
+        get_log().log(question, result["sql"], user=user, source=source, error=e,
+                      latency_ms=(time.perf_counter() - start) * 1e3)
+        raise
+    latency_ms = (time.perf_counter() - start) * 1e3
+    if keep:
+        get_store().record(question, result["sql"], success=True, latency_ms=latency_ms,
+                           row_count=len(df), source=result["source"])
+    cache_hit = result.get("source") == "example" or (spec is not None and spec.hit)
+    get_log().log(question, result["sql"], user=user, source=source, latency_ms=latency_ms,
+                  row_count=len(df), cache_hit=cache_hit)
+    return {**result, "rows": df.to_dict(orient="records"), "columns": list(df.columns)}
+
+
+def metrics() -> Dict:
+    with _LOCK:
+        stats = dict(_STATS)
+    decided = stats["hits"] + stats["misses"] + stats["expired"]
+    return {**stats, "saved_s": round(stats["saved_s"], 3), "wasted_s": round(stats["wasted_s"], 3),
+            "hit_rate": round(stats["hits"] / decided, 3) if decided else None,
+            "max_inflight": MAX_INFLIGHT, "budget_s": BUDGET_S}
@@ -0,0 +1,184 @@
+"""
+Dry-run validation and bounded repair of generated SQL.
+
+``validate`` binds a statement with EXPLAIN, which plans it without reading
+any rows, so a bad column or table costs milliseconds instead of a failed
+scan. ``repair`` loops at most ``MAX_REPAIRS`` times: each binder, catalog or
+parser error is first fixed locally from the schema catalog, but only when
+the fix is unambiguous: a column or table name that differs only in case,
+spacing or punctuation, or an unquoted name with special characters.
+Anything else (a misspelling, a guessed name) is sent back to the LLM with
+the closest existing names, so a wrong column is never substituted silently.
+Outcomes and the time spent are counted for ``metrics()``.
+"""
+import difflib, os, re, threading, time
+from typing import Callable, Dict, List, Optional
+from services.catalog import get_catalog
+
+MAX_REPAIRS = int(os.getenv("SQL_MAX_REPAIRS", "2"))
+PLAIN_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+MISSING_COLUMN = re.compile(r'Referenced column "([^"]+)" not found|does not have a column named "([^"]+)"')
+MISSING_TABLE = re.compile(r'Table with name "?([^"\s!]+)"? does not exist')
+TABLE_REFERENCE = re.compile(r'\b(?:from|join)\s+"?([A-Za-z0-9_]+)"?', re.I)
+LITERAL = re.compile(r"('(?:[^']|'')*')")
+
+_LOCK = threading.Lock()
+_STATS = {"checked": 0, "valid_first_try": 0, "repaired_local": 0, "repaired_llm": 0, "failed": 0,
+          "repair_attempts": 0, "validate_ms": 0.0, "repair_ms": 0.0}
+
+
+def extract_sql(text: str) -> str:
+    """The SQL statement in an LLM answer (code fences and surrounding prose removed)."""
+    fenced = re.search(r"```(?:sql)?\s*(.*?)```", text, re.S | re.I)
+    text = fenced.group(1) if fenced else text
+    start = re.search(r"\b(select|with)\b", text, re.I)
+    return (text[start.start():] if start else text).strip().rstrip(";").strip()
+
+
+def validate(sql: str, con=None) -> Optional[str]:
+    """The bind/plan error of ``sql`` (via EXPLAIN, nothing is executed), or None if it is valid."""
+    owned = con is None
+    if owned:
+        from services.db import connect
+        con = connect()
+    try:
+        con.execute(f"EXPLAIN {sql}")
+        return None
+    except Exception as e:
+        return str(e)
+    finally:
+        if owned:
+            con.close()
+
+
+def _squash(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _outside_literals(sql: str, fn: Callable[[str], str]) -> str:
+    parts = LITERAL.split(sql)
+    return "".join(part if i % 2 else fn(part) for i, part in enumerate(parts))
+
+
+def referenced_tables(sql: str, catalog) -> List[str]:
+    found = [t for t in dict.fromkeys(TABLE_REFERENCE.findall(sql)) if catalog.has_table(t)]
+    return found or catalog.tables()
+
+
+def same_names(name: str, names: List[str]) -> List[str]:
+    """Names equal to ``name`` up to case, spacing and punctuation."""
+    return [c for c in names if _squash(c) == _squash(name)]
+
+
+def closest_names(name: str, names: List[str], n: int = 3) -> List[str]:
+    """Names equal to ``name`` up to case and punctuation first, then fuzzy matches (repair prompt hints)."""
+    same = same_names(name, names)
+    fuzzy = difflib.get_close_matches(name.lower(), {c.lower(): c for c in names}, n=n, cutoff=0.6)
+    lower = {c.lower(): c for c in names}
+    return list(dict.fromkeys(same + [lower[f] for f in fuzzy]))[:n]
+
+
+def _columns(sql: str, catalog) -> List[str]:
+    return list(dict.fromkeys(c for t in referenced_tables(sql, catalog) for c in catalog.column_names(t)))
+
+
+def local_fix(sql: str, error: str, catalog) -> Optional[str]:
+    """A deterministic fix for ``error`` from the catalog (same name up to case and punctuation), or None."""
+    m = MISSING_COLUMN.search(error)
+    if m:
+        wrong = m.group(1) or m.group(2)
+        candidates = same_names(wrong, _columns(sql, catalog))
+        if len(candidates) != 1:
+            return None
+        pattern = re.compile(rf'"{re.escape(wrong)}"|(?<![\w"]){re.escape(wrong)}(?![\w"])')
+        fixed = _outside_literals(sql, lambda part: pattern.sub(lambda _: _quote(candidates[0]), part))
+        return fixed if fixed != sql else None
+    m = MISSING_TABLE.search(error)
+    if m:
+        candidates = same_names(m.group(1), catalog.tables())
+        if len(candidates) != 1:
+            return None
+        pattern = re.compile(rf'"{re.escape(m.group(1))}"|(?<![\w"]){re.escape(m.group(1))}(?![\w"])')
+        fixed = _outside_literals(sql, lambda part: pattern.sub(candidates[0], part))
+        return fixed if fixed != sql else None
+    if "Parser Error" in error:
+        # Column names such as O2_Purity_% only parse when quoted
+        special = sorted((c for c in _columns(sql, catalog) if not PLAIN_IDENTIFIER.match(c)), key=len, reverse=True)
+
+        def quote_special(part):
+            for name in special:
+                part = re.sub(rf'(?<![\w"]){re.escape(name)}(?!")', lambda _: _quote(name), part)
+            return part
+
+        fixed = _outside_literals(sql, quote_special)
+        return fixed if fixed != sql else None
+    return None
+
+
+def repair_prompt(sql: str, error: str, catalog) -> str:
+    first_line = error.strip().splitlines()[0]
+    lines = ["This DuckDB query failed validation.", f"Error: {first_line}"]
+    m = MISSING_COLUMN.search(error)
+    if m:
+        wrong = m.group(1) or m.group(2)
+        lines.append(f'Closest existing columns for "{wrong}": {", ".join(closest_names(wrong, _columns(sql, catalog))) or "none"}')
+    m = MISSING_TABLE.search(error)
+    if m:
+        lines.append(f'Closest existing tables for "{m.group(1)}": {", ".join(closest_names(m.group(1), catalog.tables())) or "none"}')
+    for table in referenced_tables(sql, catalog):
+        lines.append(f"Table {table}: {', '.join(catalog.column_names(table))}")
+    lines += ["Return only the corrected SQL.", f"SQL: {sql}"]
+    return "\n".join(lines)
+
+
+def gateway_fix(prompt: str) -> str:
+    """LLM repair through the shared gateway."""
+    # The gateway (and the anthropic SDK behind it) is only loaded when a repair needs it
+    from services.llm_gateway import get_gateway
+    return get_gateway().complete(prompt, key="sql-repair", max_tokens=512)
+
+
+def _count(**deltas):
+    with _LOCK:
+        for name, value in deltas.items():
+            _STATS[name] += value
+
+
+def repair(sql: str, con=None, catalog=None, llm_fix: Optional[Callable[[str], str]] = None,
+           max_repairs: int = MAX_REPAIRS) -> Dict:
+    """
+    Validate ``sql`` and repair it at most ``max_repairs`` times. Returns {"sql", "valid", "error",
+    "repairs": [{"kind": "local" | "llm", "error", "sql"}], "ms"}.
+    """
+    catalog = catalog or get_catalog(con)
+    start = time.perf_counter()
+    repairs: List[Dict] = []
+    error = validate(sql, con)
+    _count(checked=1, valid_first_try=error is None, validate_ms=(time.perf_counter() - start) * 1e3)
+    while error is not None and len(repairs) < max_repairs:
+        fixed, kind = local_fix(sql, error, catalog), "local"
+        if fixed is None and llm_fix is not None:
+            fixed, kind = extract_sql(llm_fix(repair_prompt(sql, error, catalog))), "llm"
+        if not fixed or fixed == sql:
+            break
+        repairs.append({"kind": kind, "error": error.strip().splitlines()[0], "sql": fixed})
+        sql = fixed
+        error = validate(sql, con)
+    ms = (time.perf_counter() - start) * 1e3
+    if repairs:
+        _count(repair_attempts=len(repairs), repair_ms=ms)
+        if error is None:
+            _count(**{f"repaired_{repairs[-1]['kind']}": 1})
+    if error is not None:
+        _count(failed=1)
+    return {"sql": sql, "valid": error is None, "error": error, "repairs": repairs, "ms": round(ms, 2)}
+
+
+def metrics() -> Dict:
+    with _LOCK:
+        stats = dict(_STATS)
+    return {**stats, "validate_ms": round(stats["validate_ms"], 1), "repair_ms": round(stats["repair_ms"], 1)}
@@ -0,0 +1,276 @@
+"""
+Per-column statistics computed once per ingestion over the full tables.
+
+compute_column_stats scans each table twice: once for min/max, null counts,
+HyperLogLog distinct counts, approximate top-k values and t-digest quantiles,
+and once more for the numeric columns' histograms and IQR outlier counts.
+The results land in ``_column_stats`` keyed by data version, and readers only
+see the stats of the current ``data_version()``: after a snapshot restore or
+a streaming append that was not re-profiled they get none (and fall back to
+the data itself) rather than stats of other data. Streaming recomputes the
+stats of the tables a micro-batch touched and carries the others forward.
+The UI pages, the NL→SQL prompt and chart picking read them instead of
+rescanning samples.
+Low-cardinality text columns also get their full value list (with counts)
+in ``_column_values``, which the dashboard uses for its filter options.
+"""
+import duckdb, json, pathlib, threading
+import pandas as pd
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from services.versioning import data_version
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+DB_PATH = ROOT / "db" / "fclm.duckdb"
+
+STATS_TABLE = "_column_stats"
+VALUES_TABLE = "_column_values"
+MAX_VALUES = 200
+QUANTILES = [0.0, 0.01, 0.25, 0.5, 0.75, 0.99, 1.0]
+TOP_K = 5
+HISTOGRAM_BINS = 10
+KEEP_VERSIONS = 5
+NUMERIC_TYPES = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "FLOAT", "DOUBLE", "DECIMAL",
+                 "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT")
+TEMPORAL_TYPES = ("DATE", "TIMESTAMP", "TIME")
+
+_CACHE: Dict[tuple, pd.DataFrame] = {}
+_LOCK = threading.Lock()
+
+
+def is_numeric(col_type: str) -> bool:
+    return col_type.upper().startswith(NUMERIC_TYPES)
+
+def is_temporal(col_type: str) -> bool:
+    return col_type.upper().startswith(TEMPORAL_TYPES)
+
+
+def _create_table(con):
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            data_version VARCHAR, computed_at TIMESTAMP, table_name VARCHAR, column_position INTEGER,
+            column_name VARCHAR, column_type VARCHAR, row_count BIGINT, null_count BIGINT, distinct_count BIGINT,
+            min_value VARCHAR, max_value VARCHAR, mean DOUBLE, stddev DOUBLE,
+            quantiles DOUBLE[], top_values VARCHAR, histogram VARCHAR, outlier_count BIGINT
+        )
+    """)
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VALUES_TABLE} (
+            data_version VARCHAR, table_name VARCHAR, column_name VARCHAR, value VARCHAR, n BIGINT
+        )
+    """)
+
+
+def _table_columns(con, table: str) -> List[tuple]:
+    return con.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = 'main' AND table_name = ? ORDER BY ordinal_position", [table]
+    ).fetchall()
+
+
+def _scan_table(con, table: str, version: str, computed_at) -> List[Dict]:
+    cols = _table_columns(con, table)
+    exprs = ["COUNT(*)"]
+    for name, col_type in cols:
+        q = f'"{name}"'
+        exprs += [f"COUNT(*) - COUNT({q})", f"approx_count_distinct({q})",
+                  f"MIN({q})::VARCHAR", f"MAX({q})::VARCHAR", f"approx_top_k({q}, {TOP_K})::VARCHAR[]"]
+        if is_numeric(col_type):
+            exprs += [f"AVG({q})", f"STDDEV_SAMP({q})", f"approx_quantile({q}::DOUBLE, {QUANTILES})"]
+        else:
+            exprs += ["NULL", "NULL", "NULL"]
+    row = con.execute(f"SELECT {', '.join(exprs)} FROM {table}").fetchone()
+    row_count, rest = row[0], row[1:]
+    stats = []
+    for i, (name, col_type) in enumerate(cols):
+        nulls, distinct, lo, hi, top, mean, std, quantiles = rest[i * 8:(i + 1) * 8]
+        stats.append({
+            "data_version": version, "computed_at": computed_at, "table_name": table, "column_position": i,
+            "column_name": name, "column_type": col_type, "row_count": row_count, "null_count": nulls,
+            # HyperLogLog can overshoot on small tables; never report more values than rows
+            "distinct_count": min(distinct, row_count - nulls),
+            "min_value": lo, "max_value": hi, "mean": mean, "stddev": std, "quantiles": quantiles,
+            "top_values": json.dumps([v for v in (top or []) if v is not None]), "histogram": None,
+            "outlier_count": None,
+        })
+    _numeric_pass(con, table, [s for s in stats if is_numeric(s["column_type"]) and s["quantiles"]])
+    return stats
+
+
+def _numeric_pass(con, table: str, numeric: List[Dict]):
+    """Histograms and IQR outlier counts, using bounds from the first pass."""
+    if not numeric:
+        return
+    exprs = []
+    for s in numeric:
+        q = f'"{s["column_name"]}"'
+        lo, hi = s["quantiles"][0], s["quantiles"][-1]
+        q1, q3 = s["quantiles"][2], s["quantiles"][4]
+        iqr = q3 - q1
+        if hi > lo:
+            exprs.append(f"histogram({q}::DOUBLE, equi_width_bins({lo}, {hi}, {HISTOGRAM_BINS}, true))")
+        else:
+            exprs.append(f"histogram({q}::DOUBLE)")
+        exprs.append(f"COUNT(*) FILTER (WHERE {q} < {q1 - 1.5 * iqr} OR {q} > {q3 + 1.5 * iqr})")
+    row = con.execute(f"SELECT {', '.join(exprs)} FROM {table}").fetchone()
+    for i, s in enumerate(numeric):
+        s["histogram"] = json.dumps({str(k): v for k, v in (row[2 * i] or {}).items()})
+        s["outlier_count"] = row[2 * i + 1]
+
+
+def distinct_values(con, table: str, columns: List[str]) -> pd.DataFrame:
+    """Every value of ``columns`` with its row count, as (column_name, value, n), most frequent first."""
+    if not columns:
+        return pd.DataFrame(columns=["column_name", "value", "n"])
+    parts = [f"SELECT ? AS column_name, \"{c}\"::VARCHAR AS value, COUNT(*) AS n FROM \"{table}\" "
+             f"WHERE \"{c}\" IS NOT NULL GROUP BY 2" for c in columns]
+    return con.execute(" UNION ALL ".join(parts) + " ORDER BY 1, 3 DESC, 2", columns).fetchdf()
+
+
+def _value_columns(stats: List[Dict]) -> List[str]:
+    return [s["column_name"] for s in stats if not is_numeric(s["column_type"])
+            and not is_temporal(s["column_type"]) and 0 < s["distinct_count"] <= MAX_VALUES]
+
+
+def compute_column_stats(con, tables=None, version: Optional[str] = None) -> str:
+    """
+    Compute stats for every column of ``tables`` and store them under ``version``; the latest stats of
+    the other tables are carried forward to ``version`` unchanged.
+    """
+    version = version or data_version()
+    if tables is None:
+        tables = [r[0] for r in con.execute("SHOW TABLES").fetchall() if not r[0].startswith("_")]
+    computed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    rows, values = [], []
+    for t in tables:
+        table_rows = _scan_table(con, t, version, computed_at)
+        rows.extend(table_rows)
+        values.append(distinct_values(con, t, _value_columns(table_rows)).assign(table_name=t))
+    _create_table(con)
+    df = pd.DataFrame(rows)
+    con.execute(f"DELETE FROM {STATS_TABLE} WHERE data_version = ?", [version])
+    con.execute(f"DELETE FROM {VALUES_TABLE} WHERE data_version = ?", [version])
+    # Tables left out did not change: their latest stats hold for the new version as well
+    con.execute(f"""
+        INSERT INTO {STATS_TABLE} BY NAME
+        SELECT * REPLACE (? AS data_version) FROM {STATS_TABLE}
+        WHERE NOT list_contains(?, table_name)
+        QUALIFY computed_at = MAX(computed_at) OVER (PARTITION BY table_name)
+    """, [version, list(tables)])
+    con.execute(f"""
+        INSERT INTO {VALUES_TABLE} BY NAME
+        SELECT v.* REPLACE (? AS data_version) FROM {VALUES_TABLE} v
+        JOIN (SELECT DISTINCT table_name, data_version FROM {STATS_TABLE}
+              WHERE data_version <> ? AND NOT list_contains(?, table_name)
+              QUALIFY computed_at = MAX(computed_at) OVER (PARTITION BY table_name)) latest
+          USING (table_name, data_version)
+    """, [version, version, list(tables)])
+    if not df.empty:
+        con.execute(f"INSERT INTO {STATS_TABLE} BY NAME SELECT * FROM df")
+    values_df = pd.concat(values, ignore_index=True) if values else pd.DataFrame()
+    if not values_df.empty:
+        values_df["data_version"] = version
+        con.execute(f"INSERT INTO {VALUES_TABLE} BY NAME SELECT * FROM values_df")
+    # Only the most recent versions are worth keeping around
+    con.execute(f"""
+        DELETE FROM {STATS_TABLE} WHERE data_version NOT IN (
+            SELECT data_version FROM {STATS_TABLE}
+            GROUP BY data_version ORDER BY MAX(computed_at) DESC LIMIT {KEEP_VERSIONS}
+        )
+    """)
+    con.execute(f"DELETE FROM {VALUES_TABLE} WHERE data_version NOT IN (SELECT DISTINCT data_version FROM {STATS_TABLE})")
+    with _LOCK:
+        for stale in [k for k in _CACHE if k[1] == version]:
+            del _CACHE[stale]
+    return version
+
+
+def load_column_stats(con=None, db_path=DB_PATH) -> pd.DataFrame:
+    """Stats of the current data version for every table (empty when there are none), cached per version."""
+    key = (str(pathlib.Path(db_path).resolve()), data_version())
+    cached = _CACHE.get(key)
+    if cached is not None:
+        return cached
+    with _LOCK:
+        owned = con is None
+        con = con or duckdb.connect(str(db_path), read_only=True)
+        try:
+            exists = con.execute(
+                "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [STATS_TABLE]
+            ).fetchone()[0]
+            df = con.execute(f"""
+                SELECT * FROM {STATS_TABLE} WHERE data_version = ?
+                ORDER BY table_name, column_position
+            """, [key[1]]).fetchdf() if exists else pd.DataFrame()
+        finally:
+            if owned:
+                con.close()
+        for stale in [k for k in _CACHE if k[0] == key[0]]:
+            del _CACHE[stale]
+        _CACHE[key] = df
+        return df
+
+
+def table_stats(table: str, con=None, db_path=DB_PATH) -> pd.DataFrame:
+    df = load_column_stats(con, db_path)
+    if df.empty:
+        return df
+    return df[df["table_name"] == table].reset_index(drop=True)
+
+
+def column_values(table: str, con) -> Dict[str, List[str]]:
+    """Precomputed values per low-cardinality column of ``table``, most frequent first (current data version)."""
+    exists = con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [VALUES_TABLE]
+    ).fetchone()[0]
+    if not exists:
+        return {}
+    rows = con.execute(f"""
+        SELECT column_name, value FROM {VALUES_TABLE}
+        WHERE table_name = ? AND data_version = ?
+        ORDER BY column_name, n DESC, value
+    """, [table, data_version()]).fetchall()
+    values: Dict[str, List[str]] = {}
+    for column, value in rows:
+        values.setdefault(column, []).append(value)
+    return values
+
+
+def column_stats(column: str, table: Optional[str] = None, con=None, db_path=DB_PATH) -> Optional[Dict]:
+    """Stats for a column by name, optionally restricted to one table."""
+    df = load_column_stats(con, db_path)
+    if df.empty:
+        return None
+    match = df[df["column_name"] == column]
+    if table:
+        match = match[match["table_name"] == table]
+    return match.iloc[0].to_dict() if len(match) else None
+
+
+def describe_column(s: Dict) -> str:
+    """Compact one-line summary used in NL→SQL prompts."""
+    text = f"{s['column_name']} {s['column_type']}"
+    top = json.loads(s["top_values"] or "[]")
+    if is_numeric(s["column_type"]) or is_temporal(s["column_type"]):
+        text += f" [{s['min_value']} .. {s['max_value']}]"
+    elif s["distinct_count"] and s["distinct_count"] <= TOP_K and top:
+        text += f" values: {', '.join(top)}"
+    elif top:
+        text += f" ~{s['distinct_count']} distinct, e.g. {', '.join(top[:3])}"
+    if s["null_count"]:
+        text += f" ({s['null_count']} nulls)"
+    return text
+
+
+def prompt_context(tables=None, con=None, db_path=DB_PATH) -> str:
+    """Schema plus value ranges per table, for grounding LLM-generated SQL."""
+    df = load_column_stats(con, db_path)
+    if df.empty:
+        return ""
+    lines = []
+    for table, group in df.groupby("table_name", sort=False):
+        if tables and table not in tables:
+            continue
+        lines.append(f"Table {table} ({group['row_count'].iloc[0]} rows):")
+        lines += [f"  {describe_column(s)}" for s in group.to_dict("records")]
+    return "\n".join(lines)
@@ -0,0 +1,228 @@
+"""
+Micro-batch ingestion from a watched landing directory.
+
+MicroBatchIngestor polls ``data/landing`` for new or growing CSV files, buffers
+complete lines per table and commits them to DuckDB once a batch reaches
+``batch_size`` rows or its oldest row has waited ``max_latency`` seconds.
+File offsets are stored in ``_ingest_offsets`` inside the same transaction as
+the rows, so a restart resumes exactly where the last commit ended.
+
+Committing needs DuckDB's write lock, which no other process can take while
+any process holds the file open, read-only or not. Readers in other
+processes (the Streamlit pages' shared handle, FCLMAgent, API connections)
+must therefore release the file between uses; lib/resources.py closes its
+handle when idle. While the lock is taken the daemon keeps the buffered
+lines and retries with exponential backoff up to ``MAX_LOCK_BACKOFF_S``.
+"""
+import duckdb, json, os, pathlib, tempfile, time
+from typing import Dict
+from services.anomaly import update_anomalies
+from services.failures import classify
+from services.ingest import ROOT, DB_PATH, table_name
+from services.lineage import update_lineage
+from services.quality import profile_tables
+from services.rollups import update_rollups
+from services.stats import compute_column_stats
+from services.versioning import VERSION_FILE, bump_data_version
+
+LANDING_DIR = ROOT / "data" / "landing"
+METRICS_PATH = ROOT / "db" / "ingest_metrics.json"
+OFFSETS_TABLE = "_ingest_offsets"
+MAX_LOCK_BACKOFF_S = 30.0
+
+
+def is_lock_error(e: Exception) -> bool:
+    """True for DuckDB's "Could not set lock on file" (another process holds the database)."""
+    return isinstance(e, duckdb.IOException) and "lock" in str(e).lower()
+
+
+class MicroBatchIngestor:
+    def __init__(self, landing_dir=LANDING_DIR, db_path=DB_PATH, batch_size=500,
+                 max_latency=2.0, poll_interval=0.5, metrics_path=METRICS_PATH,
+                 version_file=VERSION_FILE):
+        self.landing_dir = pathlib.Path(landing_dir)
+        self.db_path = str(db_path)
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.poll_interval = min(poll_interval, max_latency / 2)
+        self.metrics_path = pathlib.Path(metrics_path) if metrics_path else None
+        self.version_file = version_file
+        # file -> {"table", "header", "offset" (committed), "read_to", "lines", "first_seen"}
+        self.files: Dict[str, Dict] = {}
+        self.started = time.time()
+        self.metrics = {"rows_total": 0, "batches_total": 0, "last_batch_rows": 0,
+                        "last_commit_seconds": 0.0, "last_lag_seconds": 0.0,
+                        "max_lag_seconds": 0.0, "throughput_rows_per_s": 0.0, "lock_waits": 0, "tables": {}}
+        self.offsets_loaded = False
+        self._backoff = self.poll_interval
+        try:
+            self._load_offsets()
+        except duckdb.IOException as e:
+            # Another process holds the file; step() loads the offsets once it is released
+            if not is_lock_error(e):
+                raise
+
+    def _connect(self):
+        con = duckdb.connect(self.db_path)
+        con.execute(f"CREATE TABLE IF NOT EXISTS {OFFSETS_TABLE} (file VARCHAR PRIMARY KEY, byte_offset BIGINT)")
+        return con
+
+    def _load_offsets(self):
+        con = self._connect()
+        try:
+            for file, offset in con.execute(f"SELECT file, byte_offset FROM {OFFSETS_TABLE}").fetchall():
+                self.files[file] = self._state(file, offset)
+        finally:
+            con.close()
+        self.offsets_loaded = True
+
+    def _state(self, file: str, offset: int) -> Dict:
+        return {"table": table_name(file), "header": None, "offset": offset,
+                "read_to": offset, "lines": [], "first_seen": None}
+
+    def poll(self) -> int:
+        """Read complete new lines from every landing file; returns lines buffered."""
+        buffered = 0
+        for path in sorted(self.landing_dir.glob("*.csv")):
+            key = path.as_posix()
+            state = self.files.setdefault(key, self._state(key, 0))
+            size = path.stat().st_size
+            if size < state["read_to"]:
+                # File was truncated or replaced: start it over
+                self.files[key] = state = self._state(key, 0)
+            if size == state["read_to"] and state["header"] is not None:
+                continue
+            with open(path, "rb") as f:
+                if state["header"] is None:
+                    state["header"] = f.readline().decode()
+                    if not state["header"].endswith("\n"):
+                        state["header"] = None
+                        continue
+                    state["read_to"] = max(state["read_to"], f.tell())
+                    state["offset"] = max(state["offset"], f.tell())
+                f.seek(state["read_to"])
+                chunk = f.read(size - state["read_to"])
+            # Only consume up to the last newline; a partial line waits for the writer
+            end = chunk.rfind(b"\n") + 1
+            if end == 0:
+                continue
+            lines = chunk[:end].decode().splitlines(keepends=True)
+            state["lines"].extend(l for l in lines if l.strip())
+            state["read_to"] += end
+            if state["first_seen"] is None:
+                state["first_seen"] = time.time()
+            buffered += len(lines)
+        return buffered
+
+    def _due(self, state: Dict) -> bool:
+        if not state["lines"]:
+            return False
+        waited = time.time() - state["first_seen"]
+        return len(state["lines"]) >= self.batch_size or waited >= self.max_latency
+
+    def flush(self, force=False) -> int:
+        """Commit due batches (all buffered rows when force=True); returns rows committed."""
+        due = [(k, s) for k, s in self.files.items() if s["lines"] and (force or self._due(s))]
+        if not due:
+            return 0
+        t0 = time.time()
+        per_table: Dict[str, int] = {}
+        con = self._connect()
+        try:
+            con.execute("BEGIN TRANSACTION")
+            for key, state in due:
+                n = self._insert(con, key, state)
+                per_table[state["table"]] = per_table.get(state["table"], 0) + n
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            con.close()
+            raise
+        committed = time.time()
+        lag = max(committed - state["first_seen"] for _, state in due)
+        for _, state in due:
+            state["offset"] = state["read_to"]
+            state["lines"] = []
+            state["first_seen"] = None
+        version = bump_data_version(self.version_file)
+        try:
+            # Column stats of the touched tables under the new version (the others carry forward)
+            compute_column_stats(con, list(per_table), version=version)
+            # DQ counts, anomaly scores, KPI rollups and lot lineage for the new rows only
+            profile_tables(con, list(per_table), incremental=True)
+            update_anomalies(con, list(per_table))
+            update_rollups(con, list(per_table))
+            update_lineage(con, list(per_table))
+        finally:
+            con.close()
+        rows = sum(per_table.values())
+        self._record(rows, committed - t0, lag, per_table)
+        return rows
+
+    def _insert(self, con, key: str, state: Dict) -> int:
+        table = state["table"]
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as tmp:
+            tmp.write(state["header"])
+            tmp.writelines(state["lines"])
+        try:
+            source = f"read_csv_auto('{pathlib.Path(tmp.name).as_posix()}', header=True)"
+            exists = con.execute(
+                "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table]
+            ).fetchone()[0]
+            since = -1
+            if exists:
+                since = con.execute(f"SELECT COALESCE(MAX(rowid), -1) FROM {table}").fetchone()[0]
+                con.execute(f"INSERT INTO {table} BY NAME SELECT * FROM {source}")
+            else:
+                con.execute(f"CREATE TABLE {table} AS SELECT * FROM {source}")
+            # Failure flags for the new rows, looked up in the value dictionary
+            classify(con, table, since)
+        finally:
+            os.unlink(tmp.name)
+        con.execute(f"INSERT OR REPLACE INTO {OFFSETS_TABLE} VALUES (?, ?)", [key, state["read_to"]])
+        return len(state["lines"])
+
+    def _record(self, rows: int, commit_seconds: float, lag: float, per_table: Dict[str, int]):
+        m = self.metrics
+        m["rows_total"] += rows
+        m["batches_total"] += 1
+        m["last_batch_rows"] = rows
+        m["last_commit_seconds"] = round(commit_seconds, 4)
+        m["last_lag_seconds"] = round(lag, 4)
+        m["max_lag_seconds"] = round(max(m["max_lag_seconds"], lag), 4)
+        m["throughput_rows_per_s"] = round(m["rows_total"] / max(time.time() - self.started, 1e-9), 2)
+        for table, n in per_table.items():
+            m["tables"][table] = m["tables"].get(table, 0) + n
+        if self.metrics_path:
+            self.metrics_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.metrics_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(m, indent=2))
+            os.replace(tmp, self.metrics_path)
+
+    def step(self) -> float:
+        """One poll + flush; returns the seconds to wait before the next (longer while the file is locked)."""
+        try:
+            if not self.offsets_loaded:
+                self._load_offsets()
+            self.poll()
+            self.flush()
+        except duckdb.IOException as e:
+            if not is_lock_error(e):
+                raise
+            # Buffered lines stay in memory and are committed once the lock is free
+            self.metrics["lock_waits"] += 1
+            self._backoff = min(self._backoff * 2, MAX_LOCK_BACKOFF_S)
+            return self._backoff
+        self._backoff = self.poll_interval
+        return self.poll_interval
+
+    def run_forever(self):
+        self.landing_dir.mkdir(parents=True, exist_ok=True)
+        while True:
+            time.sleep(self.step())
+
+
+def read_metrics(metrics_path=METRICS_PATH) -> Dict:
+    """Latest metrics written by the ingestion daemon ({} if it has not run)."""
+    path = pathlib.Path(metrics_path)
+    return json.loads(path.read_text()) if path.exists() else {}
@@ -0,0 +1,154 @@
+"""
+Time-bucketed, downsampled time series for the charts and the API.
+
+``series`` picks the bucket width from the requested range and the chart's
+width in pixels (the smallest round width that keeps the buckets within the
+pixel budget), aggregates in DuckDB with ``time_bucket`` and keeps the shape
+of the signal:
+
+- ``minmax`` (default): every bucket contributes its minimum and maximum
+  reading at the time they occurred, so spikes survive any amount of rows;
+- ``avg``: one averaged point per bucket;
+- ``lttb``: averages at four times the target resolution, reduced to the
+  target with Largest-Triangle-Three-Buckets.
+
+Without a value column each bucket holds its row count. However many rows
+match, at most ``width_px`` points come back. ``downsample`` runs the same
+query over a DataFrame that is already in memory (ask_data results).
+"""
+import duckdb, math
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Sequence
+from services.explorer import Filter, column_types, where_clause
+from services.rollups import timestamp_expr
+
+WIDTH_PX = 800
+MIN_WIDTH_PX, MAX_WIDTH_PX = 10, 4000
+MODES = ("minmax", "avg", "lttb")
+LTTB_OVERSAMPLING = 4
+# Candidate bucket widths in seconds, from one second to one week
+BUCKETS_S = (1, 5, 15, 30, 60, 300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 86400, 7 * 86400)
+UNITS = (("week", 7 * 86400), ("day", 86400), ("hour", 3600), ("minute", 60), ("second", 1))
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def bucket_seconds(span_s: float, buckets: int) -> int:
+    """
+    The smallest round bucket width giving at most ``buckets`` buckets over ``span_s`` seconds. Buckets
+    are aligned to round times, not to the range's start, so a range can touch one more bucket than
+    ``span_s / width``.
+    """
+    span_s = max(span_s, 1)
+    return next((b for b in BUCKETS_S if math.ceil(span_s / b) + 1 <= buckets),
+                math.ceil(span_s / max(buckets - 1, 1) / 86400) * 86400)
+
+
+def bucket_label(seconds: int) -> str:
+    unit, size = next((u, s) for u, s in UNITS if seconds % s == 0)
+    n = seconds // size
+    return f"{n} {unit}" + ("s" if n > 1 else "")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the ``n`` points Largest-Triangle-Three-Buckets keeps (x ascending, as floats)."""
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+    keep = [0]
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # The next bucket's average stands in for the point that will be picked there
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else size
+        avg_x, avg_y = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        a = keep[-1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        keep.append(lo + int(area.argmax()))
+    keep.append(size - 1)
+    return np.array(keep)
+
+
+def bucketed(con, source: str, ts: str, value: Optional[str] = None, where: str = "", params: Sequence = (),
+             start=None, end=None, width_px: int = WIDTH_PX, mode: str = "minmax") -> Dict:
+    """
+    Downsampled (time, value) points of ``source`` (a table or registered frame). ``ts`` and ``value``
+    are SQL expressions; ``where``/``params`` a parameterized WHERE clause over ``source``.
+    Returns {"points", "bucket", "bucket_s", "rows", "mode", "start", "end"}.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}'. Available: {', '.join(MODES)}")
+    width_px = min(max(int(width_px), MIN_WIDTH_PX), MAX_WIDTH_PX)
+    base = f"SELECT {ts} AS t{f', ({value})::DOUBLE AS v' if value else ''} FROM {source} {where}"
+    conds, range_params = ["t IS NOT NULL"], []
+    for name, op, bound in (("start", ">=", start), ("end", "<=", end)):
+        if bound is not None:
+            try:
+                bound = con.execute("SELECT ?::TIMESTAMP", [str(bound)]).fetchone()[0]
+            except duckdb.ConversionException:
+                raise ValueError(f"Invalid {name} '{bound}': expected YYYY-MM-DD[ HH:MM:SS]")
+            conds.append(f"t {op} ?")
+            range_params.append(bound)
+    rows_sql = f"WITH base AS ({base}) SELECT * FROM base WHERE {' AND '.join(conds)}"
+    params = list(params) + range_params
+    lo, hi, rows = con.execute(f"SELECT MIN(t), MAX(t), COUNT(*) FROM ({rows_sql})", params).fetchone()
+    result = {"points": pd.DataFrame({"time": pd.Series(dtype="datetime64[us]"), "value": pd.Series(dtype=float)}),
+              "bucket": None, "bucket_s": None, "rows": rows, "mode": mode, "start": lo, "end": hi}
+    if not rows:
+        return result
+    if not value:
+        buckets, agg = width_px, "COUNT(*)"
+    elif mode == "minmax":
+        buckets, agg = width_px // 2, None
+    else:
+        buckets, agg = width_px * (LTTB_OVERSAMPLING if mode == "lttb" else 1), "AVG(v)"
+    step = bucket_seconds((hi - lo).total_seconds(), buckets)
+    bucket = f"time_bucket(INTERVAL {step} SECOND, t)"
+    if agg:
+        sql = f"SELECT {bucket} AS time, {agg}::DOUBLE AS value FROM ({rows_sql}) GROUP BY 1 ORDER BY 1"
+    else:
+        sql = f"""
+            WITH extremes AS (
+                SELECT arg_min(t, v) AS t_min, MIN(v) AS v_min, arg_max(t, v) AS t_max, MAX(v) AS v_max
+                FROM ({rows_sql}) WHERE v IS NOT NULL GROUP BY {bucket}
+            )
+            SELECT t_min AS time, v_min AS value FROM extremes
+            UNION SELECT t_max, v_max FROM extremes
+            ORDER BY 1
+        """
+    points = con.execute(sql, params).fetchdf()
+    if mode == "lttb" and value and len(points) > width_px:
+        x = points["time"].astype("int64").to_numpy(dtype=float)
+        points = points.iloc[lttb(x, points["value"].to_numpy(dtype=float), width_px)].reset_index(drop=True)
+    result.update(points=points, bucket=bucket_label(step), bucket_s=step)
+    return result
+
+
+def series(con, table: str, time_column: str, value_column: Optional[str] = None, start=None, end=None,
+           width_px: int = WIDTH_PX, mode: str = "minmax", filters: Sequence[Filter] = ()) -> Dict:
+    """Downsampled series of a table column (row counts when ``value_column`` is None), see ``bucketed``."""
+    types = column_types(con, table)
+    if not types:
+        raise ValueError(f"Unknown table '{table}'")
+    for column in (time_column, value_column):
+        if column is not None and column not in types:
+            raise ValueError(f"Unknown column '{column}' in table '{table}'")
+    where, params = where_clause(filters, types, table)
+    return bucketed(con, _quote(table), timestamp_expr(time_column, types[time_column]),
+                    _quote(value_column) if value_column else None, where, params, start, end, width_px, mode)
+
+
+def downsample(df: pd.DataFrame, time_column: str, value_column: Optional[str] = None,
+               width_px: int = WIDTH_PX, mode: str = "minmax") -> Dict:
+    """``bucketed`` over an in-memory DataFrame."""
+    con = duckdb.connect()
+    try:
+        con.register("frame", df)
+        col_type = "TIMESTAMP" if pd.api.types.is_datetime64_any_dtype(df[time_column]) else "VARCHAR"
+        return bucketed(con, "frame", timestamp_expr(time_column, col_type),
+                        _quote(value_column) if value_column else None, width_px=width_px, mode=mode)
+    finally:
+        con.close()
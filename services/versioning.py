@@ -0,0 +1,34 @@
+"""
+Data version token used to key caches over the FCLM tables.
+
+The token combines the snapshot being served with a generation counter that
+streaming ingestion bumps after every committed micro-batch, so any change to
+the queryable data yields a new version.
+"""
+import json, os, pathlib
+from services import snapshots
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+VERSION_FILE = pathlib.Path(os.getenv("DATA_VERSION_FILE", ROOT / "db" / "data_version.json"))
+
+
+def _generation(version_file=VERSION_FILE) -> int:
+    path = pathlib.Path(version_file)
+    if not path.exists():
+        return 0
+    return json.loads(path.read_text())["generation"]
+
+
+def data_version(version_file=VERSION_FILE) -> str:
+    """Current data version, e.g. ``20250801T080000000000Z.12``."""
+    return f"{snapshots.current_version() or 'live'}.{_generation(version_file)}"
+
+
+def bump_data_version(version_file=VERSION_FILE) -> str:
+    """Advance the generation counter after new rows are committed."""
+    path = pathlib.Path(version_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"generation": _generation(path) + 1}))
+    os.replace(tmp, path)
+    return data_version(path)
@@ -0,0 +1,214 @@
+"""
+Dependency-aware executor for multi-step agent workflows.
+
+A step is ``{"id", "action", "args", "depends_on"}``. Any argument given as
+``"$<step id>"`` refers to that step's output and adds the dependency
+implicitly. Tabular outputs are kept in memory as Arrow tables and registered
+under their step id on the cursor of every downstream step, so
+``{"action": "run_query", "args": {"sql": "SELECT ... FROM $totals"}}``
+queries an upstream result directly. Steps whose dependencies are met run
+concurrently on a thread pool, each on its own DuckDB cursor. Results of
+read-only actions are cached by a hash of action, arguments, upstream inputs
+and data version.
+"""
+import copy, hashlib, json, re, threading, time
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List
+from services.versioning import data_version
+
+REF = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)")
+# Actions without side effects whose results may be reused
+CACHEABLE = {"run_query", "data_quality_check", "monitor_anomalies", "guide_workflow"}
+# Actions that swap the agent's connection; they run alone on the agent itself
+EXCLUSIVE = {"refresh_data", "restore_snapshot"}
+CACHE_SIZE = 64
+
+_CACHE: "OrderedDict[str, Any]" = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def normalize(steps: List[Dict]) -> Dict[str, Dict]:
+    """Assign ids, collect explicit and $-reference dependencies, and reject unknown ids or cycles."""
+    nodes = OrderedDict()
+    for i, step in enumerate(steps):
+        step_id = step.get("id") or f"step{i + 1}"
+        if step_id in nodes:
+            raise ValueError(f"Duplicate step id: {step_id}")
+        args = step.get("args", {})
+        deps = list(step.get("depends_on", []))
+        deps += [r for r in REF.findall(json.dumps(args, default=str)) if r not in deps]
+        nodes[step_id] = {"id": step_id, "action": step.get("action"), "args": args, "deps": deps,
+                          "cache": step.get("cache", True)}
+    for node in nodes.values():
+        unknown = [d for d in node["deps"] if d not in nodes]
+        if unknown:
+            raise ValueError(f"Step {node['id']} depends on unknown step(s): {', '.join(unknown)}")
+    # Kahn's algorithm, only to detect cycles up front
+    indegree = {k: len(n["deps"]) for k, n in nodes.items()}
+    ready = [k for k, d in indegree.items() if d == 0]
+    seen = 0
+    while ready:
+        k = ready.pop()
+        seen += 1
+        for other in nodes.values():
+            if k in other["deps"]:
+                indegree[other["id"]] -= 1
+                if indegree[other["id"]] == 0:
+                    ready.append(other["id"])
+    if seen != len(nodes):
+        raise ValueError("Workflow steps contain a dependency cycle")
+    return nodes
+
+
+def _to_arrow(result):
+    if isinstance(result, pd.DataFrame):
+        import pyarrow as pa
+        return pa.Table.from_pandas(result, preserve_index=False)
+    return result
+
+
+def _is_arrow(value) -> bool:
+    return type(value).__module__.startswith("pyarrow")
+
+
+def _resolve(value, outputs: Dict[str, Any]):
+    """Swap $refs for upstream values; tabular outputs are referenced by their registered name."""
+    if isinstance(value, str):
+        whole = REF.fullmatch(value)
+        if whole and not _is_arrow(outputs[whole.group(1)]):
+            return outputs[whole.group(1)]
+        return REF.sub(lambda m: m.group(1), value)
+    if isinstance(value, list):
+        return [_resolve(v, outputs) for v in value]
+    if isinstance(value, dict):
+        return {k: _resolve(v, outputs) for k, v in value.items()}
+    return value
+
+
+def _fingerprint(value) -> str:
+    if _is_arrow(value):
+        # Arrow tables are immutable; schema plus row count plus a content digest is stable
+        digest = hashlib.sha256()
+        for batch in value.to_batches():
+            for column in batch.columns:
+                for buf in column.buffers():
+                    if buf is not None:
+                        digest.update(memoryview(buf))
+        return f"{value.schema}|{value.num_rows}|{digest.hexdigest()}"
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def cache_key(node: Dict, upstream: Dict[str, Any], db_path: str) -> str:
+    payload = json.dumps({
+        "action": node["action"], "args": node["args"], "db": db_path, "version": data_version(),
+        "inputs": {d: _fingerprint(upstream[d]) for d in node["deps"]},
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cache_get(key):
+    with _LOCK:
+        if key in _CACHE:
+            _CACHE.move_to_end(key)
+            return True, _CACHE[key]
+    return False, None
+
+
+def _cache_put(key, value):
+    with _LOCK:
+        _CACHE[key] = value
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > CACHE_SIZE:
+            _CACHE.popitem(last=False)
+
+
+def clear_cache():
+    with _LOCK:
+        _CACHE.clear()
+
+
+def _run_step(agent, node: Dict, outputs: Dict[str, Any]):
+    method = getattr(type(agent), node["action"], None) if node["action"] else None
+    if method is None or node["action"].startswith("_"):
+        return f"Unknown action: {node['action']}"
+    args = _resolve(node["args"], outputs)
+    if node["action"] in EXCLUSIVE:
+        return getattr(agent, node["action"])(**args)
+    # Workers share the agent's state but each gets its own cursor with the upstream tables registered
+    worker = copy.copy(agent)
+    worker.con = agent.con.cursor()
+    try:
+        for dep in node["deps"]:
+            if _is_arrow(outputs[dep]):
+                worker.con.register(dep, outputs[dep])
+        return getattr(worker, node["action"])(**args)
+    finally:
+        worker.con.close()
+
+
+def run_workflow(agent, steps: List[Dict], max_workers: int = 4, use_cache: bool = True) -> Dict:
+    """
+    Execute ``steps`` on ``agent``. Returns {"results", "timings", "status", "cached", "order",
+    "elapsed"}, the first three keyed by step id; results of tabular steps are Arrow tables.
+    """
+    nodes = normalize(steps)
+    outputs: Dict[str, Any] = {}
+    timings: Dict[str, float] = {}
+    status: Dict[str, str] = {}
+    cached: List[str] = []
+    pending = dict(nodes)
+    running = {}
+    db_path = str(getattr(agent, "db_path", ""))
+    started = time.perf_counter()
+
+    def execute(node, key):
+        t0 = time.perf_counter()
+        try:
+            result = _to_arrow(_run_step(agent, node, outputs))
+            ok = not (isinstance(result, str) and result.startswith(("Error:", "Unknown action:")))
+        except Exception as e:
+            result, ok = f"Error: {e}", False
+        if ok and key:
+            _cache_put(key, result)
+        return result, ok, time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            exclusive_running = any(nodes[k]["action"] in EXCLUSIVE for k in running.values())
+            for step_id, node in list(pending.items()):
+                if exclusive_running:
+                    break
+                if any(status.get(d) in ("failed", "skipped") for d in node["deps"]):
+                    del pending[step_id]
+                    status[step_id], timings[step_id] = "skipped", 0.0
+                    outputs[step_id] = "Skipped: an upstream step failed"
+                    continue
+                if not all(d in outputs and status.get(d) == "ok" for d in node["deps"]):
+                    continue
+                if node["action"] in EXCLUSIVE and running:
+                    continue
+                key = None
+                if use_cache and node["cache"] and node["action"] in CACHEABLE:
+                    key = cache_key(node, outputs, db_path)
+                    hit, value = _cache_get(key)
+                    if hit:
+                        del pending[step_id]
+                        outputs[step_id], status[step_id], timings[step_id] = value, "ok", 0.0
+                        cached.append(step_id)
+                        continue
+                del pending[step_id]
+                running[pool.submit(execute, node, key)] = step_id
+                if node["action"] in EXCLUSIVE:
+                    exclusive_running = True
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step_id = running.pop(future)
+                outputs[step_id], ok, timings[step_id] = future.result()
+                status[step_id] = "ok" if ok else "failed"
+
+    return {"results": {k: outputs[k] for k in nodes}, "timings": timings, "status": status,
+            "cached": cached, "order": list(nodes), "elapsed": time.perf_counter() - started}
@@ -0,0 +1,10 @@
+"""
+Shared fixtures: keep test runs out of the repo's db/ stores
+"""
+import pytest
+from services import query_examples, query_log
+
+@pytest.fixture(autouse=True)
+def isolated_stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_log, "LOG_PATH", tmp_path / "query_log.sqlite")
+    monkeypatch.setattr(query_examples, "STORE_PATH", tmp_path / "query_examples.sqlite")
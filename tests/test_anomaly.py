@@ -0,0 +1,56 @@
+"""
+Unit tests for the per-machine streaming anomaly detector
+"""
+import duckdb
+import numpy as np
+from services import anomaly
+
+def _make_table(con, rows):
+    con.execute(f"CREATE TABLE cure_table1 AS SELECT range AS Cure_No, "
+                f"CASE WHEN range % 2 = 0 THEN 'MC01' ELSE 'MC02' END AS Machine_ID, "
+                f"CASE WHEN range % 2 = 0 THEN 120.0 + (range % 7) * 0.1 ELSE 80.0 + (range % 5) * 0.1 END AS RTD1_Temp_C "
+                f"FROM range({rows})")
+
+def test_batched_scores_match_welford():
+    values = np.random.default_rng(0).normal(50, 5, 200)
+    state = anomaly._empty_state()
+    scores, state = anomaly.score_values(values[:120], state)
+    _, state = anomaly.score_values(values[120:], state)
+    assert state["n"] == 200
+    assert np.isclose(state["mean"], values.mean())
+    assert np.isclose(state["m2"] / 199, values.var(ddof=1))
+    # Value 40 is compared with the 40 values before it
+    assert np.isclose(scores["expected"][40], values[:40].mean())
+
+def test_incremental_update_flags_spike_per_machine(tmp_path):
+    con = duckdb.connect(str(tmp_path / "fclm.duckdb"))
+    _make_table(con, 200)
+    assert anomaly.update_anomalies(con, backfill=True).empty
+
+    # 200 °C is far off MC02's ~80 °C baseline but would sit near MC01's
+    con.execute("INSERT INTO cure_table1 VALUES (200, 'MC02', 200.0), (201, 'MC01', 120.3)")
+    found = anomaly.update_anomalies(con)
+    assert list(found["machine_id"]) == ["MC02"]
+    assert found["row_id"].iloc[0] == 200
+
+    state = anomaly.machine_state(con, "cure_table1")
+    assert dict(zip(state["machine_id"], state["n"])) == {"MC01": 101, "MC02": 101}
+    assert len(anomaly.current_anomalies(con, "cure_table1", machine="MC02")) == 1
+    con.close()
+
+def test_agent_scores_only_untracked_columns_on_the_fly(tmp_path, monkeypatch):
+    from agent import FCLMAgent
+    con = duckdb.connect(str(tmp_path / "fclm.duckdb"))
+    _make_table(con, 200)
+    agent = FCLMAgent(str(tmp_path / "fclm.duckdb"), con=con)
+    rescans = []
+    real_update = anomaly.update_anomalies
+    monkeypatch.setattr("agent.update_anomalies", lambda *a, **k: rescans.append(a) or real_update(*a, **k))
+
+    assert not anomaly.is_tracked(con, "cure_table1")
+    assert agent.monitor_anomalies("cure_table1", "RTD1_Temp_C").empty and len(rescans) == 1
+    anomaly.update_anomalies(con, backfill=True)
+    assert anomaly.is_tracked(con, "cure_table1", "RTD1_Temp_C")
+    # Tracked and quiet: no full-history rescan
+    assert agent.monitor_anomalies("cure_table1", "RTD1_Temp_C").empty and len(rescans) == 1
+    con.close()
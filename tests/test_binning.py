@@ -0,0 +1,61 @@
+"""
+Unit tests for the bounded chart data of large results
+"""
+import io, numpy as np, pandas as pd, pathlib
+from services import binning
+from services.charts import render
+
+def _kinds(df):
+    return {c: "numeric" if pd.api.types.is_numeric_dtype(df[c]) else "categorical" for c in df.columns}
+
+def test_strategy_follows_size_and_column_kinds():
+    rng = np.random.default_rng(0)
+    pairs = pd.DataFrame({"Pressure_psi": rng.normal(40, 2, 200_000), "Humidity": rng.normal(55, 5, 200_000)})
+    job = binning.chart_job(pairs, _kinds(pairs))
+    assert job["strategy"] == "bins2d" and job["data"]["count"].sum() == 200_000
+    assert len(job["data"]) <= binning.BINS[0] * binning.BINS[1]
+    assert binning.chart_job(pairs.head(1000), _kinds(pairs))["kind"] == "scatter"
+
+    bars = pd.DataFrame({"Lot_ID": [f"L{i}" for i in range(500)], "failures": np.arange(500)})
+    job = binning.chart_job(bars, _kinds(bars))
+    # The bars may be averages or rates: no summed "Other" bar, the omitted categories are counted in the note
+    assert job["strategy"] == "topn" and len(job["data"]) == binning.TOP_N
+    assert job["data"]["Lot_ID"].iloc[0] == "L499" and "Other" not in set(job["data"]["Lot_ID"])
+    assert job["data"]["failures"].tolist() == list(range(499, 479, -1)) and "480 not shown" in job["note"]
+
+    status = pd.DataFrame({"Status": ["Fail"] * 10 + ["Success"] * 90_000})
+    job = binning.chart_job(status, _kinds(status))
+    assert list(job["data"]["count"]) == [90_000, 10]
+
+def test_stratified_sample_keeps_small_groups_within_the_bound():
+    rng = np.random.default_rng(1)
+    n = 100_000
+    df = pd.DataFrame({"x": rng.random(n), "y": rng.random(n),
+                       "Machine_ID": np.where(np.arange(n) < 50, "MC99", rng.choice(["MC01", "MC02"], n))})
+    job = binning.chart_job(df, _kinds(df))
+    sample = job["data"]
+    assert job["strategy"] == "sample" and len(sample) <= binning.SAMPLE_ROWS + 3
+    assert (sample["Machine_ID"] == "MC99").sum() >= 1
+    bound = binning.error_bound(len(sample), n)
+    assert 0.01 < bound < 0.02 and f"±{bound:.1%}" in job["note"]
+    assert abs((sample["x"] < 0.3).mean() - (df["x"] < 0.3).mean()) < bound
+    assert binning.error_bound(n, n) == 0.0
+
+def test_jobs_render_to_png():
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({"a": rng.random(20_000), "b": rng.random(20_000)})
+    buf = io.BytesIO()
+    render(binning.chart_job(df, _kinds(df)), buf)
+    assert buf.getvalue()[:8] == b"\x89PNG\r\n\x1a\n"
+
+def test_result_dtypes_win_over_base_column_stats(monkeypatch):
+    root = pathlib.Path(__file__).resolve().parents[1]
+    monkeypatch.syspath_prepend(str(root / "ask_data" / "src"))
+    import chart_picker
+    # Stats know Humidity as numeric and DateTime as a text timestamp; the result decides for itself
+    monkeypatch.setattr(chart_picker.db, "get_column_kind",
+                        {"Humidity": "numeric", "DateTime": "temporal", "Status": "numeric"}.get)
+    df = pd.DataFrame({"Humidity": ["high", "low"], "DateTime": ["8/1/25 10:00", "8/2/25 10:00"],
+                       "Status": ["Fail", "Pass"], "n": [1, 2]})
+    assert chart_picker.column_kinds(df) == {"Humidity": "categorical", "DateTime": "temporal",
+                                             "Status": "categorical", "n": "numeric"}
@@ -0,0 +1,32 @@
+"""
+Unit tests for the shared schema catalog
+"""
+import duckdb
+from services import catalog
+
+def make_db(path):
+    con = duckdb.connect(str(path))
+    con.execute("CREATE TABLE o2_gas_data_fclm (Lot_ID VARCHAR, Valve_Status VARCHAR, Status VARCHAR, Pressure_psi DOUBLE)")
+    con.execute("CREATE TABLE _audit_log (timestamp DOUBLE, sql TEXT)")
+    return con
+
+def test_catalog_loads_once_per_version(tmp_path):
+    path = tmp_path / "fclm.duckdb"
+    con = make_db(path)
+    first = catalog.get_catalog(con, path)
+    con.execute("CREATE TABLE cure_table1 (Machine_ID VARCHAR)")
+    assert catalog.get_catalog(con, path) is first
+    assert first.tables() == ["o2_gas_data_fclm"]
+    catalog.invalidate()
+    assert "cure_table1" in catalog.get_catalog(con, path).tables()
+
+def test_column_lookups(tmp_path):
+    path = tmp_path / "fclm.duckdb"
+    cat = catalog.get_catalog(make_db(path), path)
+    # exact match beats an earlier column that only contains the pattern
+    assert cat.find_column("o2_gas_data_fclm", "status", "result") == "Status"
+    assert cat.find_column("O2_GAS_DATA_FCLM", "lot") == "Lot_ID"
+    assert cat.find_column("o2_gas_data_fclm", "machine") is None
+    assert cat.closest_columns("presure_psi") == ["Pressure_psi"]
+    assert cat.column_type("o2_gas_data_fclm", "Pressure_psi") == "DOUBLE"
+    assert cat.schema_info()["o2_gas_data_fclm"][0] == {"column_name": "Lot_ID", "column_type": "VARCHAR"}
@@ -0,0 +1,33 @@
+"""
+Unit tests for the cache-aware batch chart rendering
+"""
+import duckdb, json
+from services import charts, rollups
+
+def test_charts_skip_unchanged_data(tmp_path):
+    con = duckdb.connect(str(tmp_path / "fclm.duckdb"))
+    con.execute("CREATE TABLE o2_gas_data_fclm AS SELECT "
+                "strftime(TIMESTAMP '2025-08-30 00:00:00' + range * INTERVAL 1 HOUR, '%-m/%-d/%y %-H:%M') AS DateTime, "
+                "CASE WHEN range % 4 = 0 THEN 'Fail' ELSE 'Success' END AS Status, "
+                "'GMC0' || (range % 2 + 1) AS Machine_ID FROM range(96)")
+    rollups.update_rollups(con)
+    out = tmp_path / "outputs"
+
+    jobs = charts.chart_jobs(con, ["o2_gas_data_fclm"])
+    assert sorted(j["name"] for j in jobs) == ["o2_gas_data_fclm_failures_by_machine.png",
+                                               "o2_gas_data_fclm_monthly_counts.png",
+                                               "o2_gas_data_fclm_status_counts.png"]
+    first = charts.render_charts(jobs, out, workers=2)
+    assert len(first["rendered"]) == 3 and not first["skipped"]
+    assert all((out / name).stat().st_size > 0 for name in first["rendered"])
+    assert set(json.loads((out / charts.MANIFEST_FILE).read_text())) == set(first["rendered"])
+
+    # Same data: nothing is re-rendered; a new row changes all three inputs
+    assert charts.render_charts(charts.chart_jobs(con, ["o2_gas_data_fclm"]), out)["rendered"] == []
+    con.execute("INSERT INTO o2_gas_data_fclm VALUES ('9/2/25 10:00', 'Fail', 'GMC01')")
+    rollups.update_rollups(con)
+    second = charts.render_charts(charts.chart_jobs(con, ["o2_gas_data_fclm"]), out, workers=1)
+    assert sorted(second["rendered"]) == ["o2_gas_data_fclm_failures_by_machine.png",
+                                          "o2_gas_data_fclm_monthly_counts.png",
+                                          "o2_gas_data_fclm_status_counts.png"]
+    con.close()
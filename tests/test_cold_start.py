@@ -0,0 +1,24 @@
+"""
+Cold-start regression test: entry-point import time, as a multiple of the framework's own import time
+on the same machine, must stay within the recorded budget, and entry points must not import heavy
+optional libraries (chart, Excel and LLM SDKs) beyond what their framework imports by itself.
+Re-record with `python scripts/profile_startup.py --record` after an intentional change.
+"""
+import json
+import pytest
+from scripts.profile_startup import BUDGET_FILE, ENTRY_POINTS, FRAMEWORKS, heavy_imports, relative_import_time
+
+BUDGET = json.loads(BUDGET_FILE.read_text())
+
+@pytest.mark.parametrize("entry", sorted(ENTRY_POINTS))
+def test_cold_start_within_budget(entry):
+    ratio = relative_import_time(entry)
+    assert ratio <= BUDGET[entry], f"{entry} imports took {ratio:.2f}x {FRAMEWORKS[entry]!r} (budget {BUDGET[entry]}x)"
+
+@pytest.mark.parametrize("entry", sorted(ENTRY_POINTS))
+def test_entry_point_defers_heavy_imports(entry):
+    loaded = heavy_imports(ENTRY_POINTS[entry]) - heavy_imports(FRAMEWORKS[entry])
+    assert not loaded, f"{entry} imports {', '.join(sorted(loaded))} at start-up"
+
+def test_dashboard_charts_defer_matplotlib():
+    assert "matplotlib" not in heavy_imports("import lib.viz")
@@ -0,0 +1,48 @@
+"""
+Unit tests for the server-side dashboard explorer
+"""
+import duckdb, pytest
+from services import explorer, stats
+
+def _table(con):
+    con.execute("CREATE TABLE cure_table1 AS SELECT range AS Cure_No, "
+                "'MC0' || (range % 12)::VARCHAR AS Machine_ID, "
+                "CASE WHEN range % 4 = 0 THEN 'Fail' ELSE 'Success' END AS Status, "
+                "40.0 + range % 10 AS Pressure_psi, "
+                "strftime(DATE '2025-01-01' + INTERVAL (range % 30) DAY, '%m/%d/%y %H:%M') AS DateTime "
+                "FROM range(3000)")
+
+def test_filter_options_come_from_precomputed_values(tmp_path):
+    path = tmp_path / "fclm.duckdb"
+    con = duckdb.connect(str(path))
+    _table(con)
+    stats.compute_column_stats(con)
+    options = explorer.filter_options(con, "cure_table1", path)
+    assert options["Status"] == {"kind": "values", "values": ["Success", "Fail"]}
+    assert len(options["Machine_ID"]["values"]) == 12
+    assert options["Pressure_psi"] == {"kind": "range", "min": 40.0, "max": 49.0}
+    assert "Cure_No" in options and options["Cure_No"]["kind"] == "range"
+
+def test_aggregates_cover_the_full_filtered_table():
+    con = duckdb.connect()
+    _table(con)
+    fails = (("Status", "in", ("Fail",)),)
+    bar = explorer.aggregate(con, "cure_table1", "bar", "Machine_ID", fails)
+    # Failing rows are every 4th one, so only machines 0, 4 and 8 have any
+    assert list(bar["value"]) == ["MC00", "MC04", "MC08"] and bar["count"].sum() == 750
+    pie = explorer.aggregate(con, "cure_table1", "pie", "Machine_ID")
+    assert len(pie) == explorer.PIE_SLICES + 1 and pie["value"].iloc[-1] == "Other" and pie["count"].sum() == 3000
+    ts = explorer.aggregate(con, "cure_table1", "timeseries", "DateTime",
+                            (("Pressure_psi", "between", (40.0, 44.0)),))
+    assert len(ts) == 15 and ts["value"].sum() == 1500
+    rows = explorer.filtered_rows(con, "cure_table1", fails, limit=10)
+    assert rows["total"] == 750 and len(rows["rows"]) == 10
+
+def test_filters_only_accept_known_columns_and_bind_values():
+    con = duckdb.connect()
+    _table(con)
+    where, params = explorer.where_clause((("Status", "in", ("x' OR 1=1 --",)),), explorer.column_types(con, "cure_table1"), "cure_table1")
+    assert "OR 1=1" not in where and params == ["x' OR 1=1 --"]
+    assert explorer.filtered_rows(con, "cure_table1", (("Status", "in", ("x' OR 1=1 --",)),))["total"] == 0
+    with pytest.raises(ValueError):
+        explorer.aggregate(con, "cure_table1", "bar", 'Status" FROM cure_table1; --')
@@ -0,0 +1,32 @@
+"""
+Unit tests for the failure classification materialized at ingestion
+"""
+import duckdb
+from services import failures
+
+def test_classify_fills_flags_and_dictionary(tmp_path):
+    con = duckdb.connect(str(tmp_path / "fclm.duckdb"))
+    con.execute("CREATE TABLE cure_table1 AS SELECT * FROM (VALUES "
+                "('Fail', 'Stable cycle'), ('Success', 'Leak detected'), ('Success', NULL), (NULL, 'Stable cycle')) "
+                "AS t(Status, Remarks)")
+    assert failures.classify_tables(con, ["cure_table1"], rebuild=True) == {
+        "cure_table1": {"failure": "Status", "issue": "Remarks"}}
+    rows = con.execute("SELECT is_failure, failure_category, has_issue, issue_category FROM cure_table1 ORDER BY rowid").fetchall()
+    assert rows == [(True, "fail", False, None), (False, None, True, "leak"),
+                    (False, None, False, None), (False, None, False, None)]
+
+    # Appended rows are classified past the watermark; only unseen values reach the dictionary
+    since = con.execute("SELECT MAX(rowid) FROM cure_table1").fetchone()[0]
+    con.execute("INSERT INTO cure_table1 (Status, Remarks) VALUES ('Rework', 'Stable cycle'), ('Fail', NULL)")
+    failures.classify(con, "cure_table1", since)
+    assert con.execute("SELECT failure_category FROM cure_table1 WHERE rowid > ?", [since]).fetchall() == [("rework",), ("fail",)]
+    entries = failures.dictionary(con, "cure_table1")
+    assert sorted(entries[entries["column_name"] == "Status"]["value"]) == ["Fail", "Rework", "Success"]
+
+    predicate = failures.failure_predicate(["Status", "is_failure"], "t")
+    assert predicate == 'COALESCE(t."is_failure", false)'
+    assert con.execute(f"SELECT COUNT(*) FROM cure_table1 t WHERE {predicate}").fetchone()[0] == 3
+    # Unclassified tables fall back to the keyword rules
+    assert "LIKE '%fail%'" in failures.failure_predicate(["Status"])
+    assert failures.failure_predicate(["Machine_ID"]) is None
+    con.close()
@@ -0,0 +1,32 @@
+"""
+Unit tests for the Lot_ID lineage fact table
+"""
+import duckdb
+from services import lineage
+
+def test_lineage_built_and_updated_incrementally(tmp_path):
+    con = duckdb.connect(str(tmp_path / "fclm.duckdb"))
+    con.execute("CREATE TABLE cure_table1 AS SELECT 'LOT' || (range % 2) AS Lot_ID, "
+                "CASE WHEN range < 2 THEN 'Fail' ELSE 'Success' END AS Status, 'Stable cycle' AS Remarks, "
+                "120.0 + range AS RTD1_Temp_C FROM range(4)")
+    con.execute("CREATE TABLE o2_gas_data_fclm AS SELECT 'LOT0' AS Lot_ID, 'Success' AS Status, "
+                "'Flow error' AS Remarks, 125.0 AS FlowRate_sccm FROM range(3)")
+    assert lineage.update_lineage(con) == 2
+
+    lot0 = lineage.lot_summary("LOT0", con=con).iloc[0]
+    assert (lot0["cure_runs"], lot0["cure_failures"], lot0["o2_runs"], lot0["o2_issues"]) == (2, 1, 3, 3)
+    assert lot0["cure_avg_rtd1_temp_c"] == 121.0
+    assert lot0["gas_runs"] == 0 and lot0["stages_seen"] == 2 and lot0["any_failure"]
+
+    # Only LOT1 gets new rows; LOT2 is new
+    con.execute("INSERT INTO cure_table1 VALUES ('LOT1', 'Rework', 'Rework needed', 130.0), "
+                "('LOT2', 'Success', 'Stable cycle', 119.0)")
+    assert lineage.update_lineage(con, ["cure_table1"]) == 2
+    lot1 = lineage.lot_summary("LOT1", con=con).iloc[0]
+    assert (lot1["cure_runs"], lot1["cure_failures"], lot1["cure_issues"]) == (3, 2, 1)
+    assert len(lineage.lot_summary(con=con)) == 3
+
+    rows = lineage.lot_rows("LOT1", con=con)
+    assert list(rows) == ["cure"]
+    assert rows["cure"]["RTD1_Temp_C"].tolist() == [121.0, 123.0, 130.0]
+    con.close()
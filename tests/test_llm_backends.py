@@ -0,0 +1,46 @@
+"""
+Unit tests for the offline LLM backends (replay client and mock Messages API server)
+"""
+import anthropic, socket, threading, time, uvicorn
+from services.llm_backends import Recordings, ReplayClient, ReplayProfile, NO_RECORDING_SQL
+from services.llm_gateway import LLMGateway
+from services.nl2sql import extract_sql
+from scripts.mock_llm_server import create_app
+
+RECORDINGS = Recordings([
+    {"question": "Which operator has the highest failure rate in curing?", "sql": "SELECT Operator_ID FROM cure_table1"},
+    {"question": "Compare average pressure of open and closed valves", "sql": "SELECT Valve_Status FROM o2_gas_data_fclm"},
+])
+PROMPT = "Schema...\n\nQuestion: Compare the average pressure of open and closed valves\nSQL:"
+
+def test_recordings_match_questions_inside_prompts():
+    assert RECORDINGS.answer(PROMPT) == "SELECT Valve_Status FROM o2_gas_data_fclm"
+    assert RECORDINGS.answer("Which OPERATOR has the highest failure rate in curing?") == "SELECT Operator_ID FROM cure_table1"
+    assert RECORDINGS.answer("What is the weather?") == NO_RECORDING_SQL
+    assert extract_sql("Here you go:\n```sql\nSELECT 1;\n```") == "SELECT 1"
+
+def test_replay_client_injects_retryable_errors():
+    profile = ReplayProfile(median_ms=1, p95_ms=5, rate_limit_rate=0.5, tokens_per_s=0, seed=7)
+    gateway = LLMGateway(client=ReplayClient(RECORDINGS, profile), backoff_max=0.01, max_attempts=10)
+    answers = [gateway.complete(PROMPT) for _ in range(10)]
+    assert set(answers) == {"SELECT Valve_Status FROM o2_gas_data_fclm"}
+    m = gateway.metrics()
+    assert m["errors"] == 0 and m["retries"] > 0 and m["output_tokens"] > 0
+
+def test_mock_server_speaks_the_messages_api():
+    app = create_app(RECORDINGS, ReplayProfile(median_ms=0, tokens_per_s=0))
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        client = anthropic.AsyncAnthropic(api_key="mock", base_url=f"http://127.0.0.1:{port}", max_retries=0)
+        gateway = LLMGateway(client=client)
+        assert gateway.complete(PROMPT) == "SELECT Valve_Status FROM o2_gas_data_fclm"
+        assert gateway.metrics()["input_tokens"] == len(PROMPT) // 4
+        assert app.state.requests == 1
+    finally:
+        server.should_exit = True
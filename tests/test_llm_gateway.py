@@ -0,0 +1,72 @@
+"""
+Unit tests for the pooled LLM gateway (fake client, no network)
+"""
+import asyncio, pytest
+from types import SimpleNamespace
+from services.llm_gateway import LLMGateway
+
+class RateLimitError(Exception):
+    pass
+
+class FakeStream:
+    def __init__(self, client, tokens):
+        self.client, self.tokens = client, tokens
+
+    async def __aenter__(self):
+        self.client.active += 1
+        self.client.peak = max(self.client.peak, self.client.active)
+        if self.client.failures:
+            self.client.failures -= 1
+            self.client.active -= 1
+            raise RateLimitError("429")
+        return self
+
+    async def __aexit__(self, *exc):
+        self.client.active -= 1
+
+    @property
+    async def text_stream(self):
+        for token in self.tokens:
+            await asyncio.sleep(self.client.delay)
+            yield token
+
+    async def get_final_message(self):
+        return SimpleNamespace(usage=SimpleNamespace(input_tokens=3, output_tokens=len(self.tokens)))
+
+class FakeClient:
+    def __init__(self, failures=0, delay=0.0):
+        self.failures, self.delay, self.active, self.peak = failures, delay, 0, 0
+        self.messages = SimpleNamespace(stream=lambda **kw: FakeStream(self, ["SELECT ", "1"]))
+
+def test_retries_rate_limits_and_records_metrics():
+    gateway = LLMGateway(client=FakeClient(failures=2), backoff_max=0.01)
+    assert gateway.complete("q") == "SELECT 1"
+    assert list(gateway.stream("q")) == ["SELECT ", "1"]
+    m = gateway.metrics()
+    assert (m["calls"], m["errors"], m["retries"], m["input_tokens"], m["output_tokens"]) == (2, 0, 2, 6, 4)
+    assert m["first_token_p50_s"] is not None
+
+def test_concurrency_is_capped_and_deadline_enforced():
+    client = FakeClient(delay=0.02)
+    gateway = LLMGateway(client=client, max_concurrency=3, per_key_concurrency=2)
+
+    async def burst():
+        return await asyncio.gather(*[gateway.acomplete("q", key=f"k{i % 2}") for i in range(12)])
+    assert asyncio.run(burst()) == ["SELECT 1"] * 12
+    assert client.peak == 3
+
+    slow = LLMGateway(client=FakeClient(delay=1.0), deadline=0.05)
+    with pytest.raises(TimeoutError):
+        slow.complete("q")
+    assert slow.metrics()["errors"] == 1
+
+def test_prompt_prefix_is_sent_as_a_cached_block():
+    client = FakeClient()
+    sent = []
+    client.messages = SimpleNamespace(stream=lambda **kw: sent.append(kw["messages"][0]["content"]) or FakeStream(client, ["1"]))
+    gateway = LLMGateway(client=client)
+    gateway.complete("SCHEMA\n\nQuestion: q\nSQL:", prefix="SCHEMA")
+    gateway.complete("no prefix")
+    assert sent[0] == [{"type": "text", "text": "SCHEMA", "cache_control": {"type": "ephemeral"}},
+                       {"type": "text", "text": "\n\nQuestion: q\nSQL:"}]
+    assert sent[1] == "no prefix"
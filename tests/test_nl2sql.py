@@ -0,0 +1,58 @@
+"""
+Unit tests for the rule-based NL→SQL intent matcher
+"""
+import duckdb
+from services import catalog
+from services.nl2sql import CONFIDENCE_THRESHOLD, match_intent
+
+def make_catalog(tmp_path):
+    path = tmp_path / "fclm.duckdb"
+    con = duckdb.connect(str(path))
+    con.execute("CREATE TABLE cure_table1 AS SELECT TIMESTAMP '2025-08-01' + range * INTERVAL 1 DAY AS DateTime, "
+                "'MC0' || (range % 2 + 1) AS Machine_ID, CASE WHEN range % 3 = 0 THEN 'Fail' ELSE 'Success' END AS Status, "
+                "range % 3 = 0 AS is_failure, 100.0 + range AS RTD1_Temp_C FROM range(30)")
+    con.execute("CREATE TABLE o2_gas_data_fclm (DateTime VARCHAR, Machine_ID VARCHAR, Status VARCHAR, \"O2_Purity_%\" DOUBLE)")
+    catalog.invalidate()
+    return con, catalog.get_catalog(con, path)
+
+def test_intents_and_slots(tmp_path):
+    con, cat = make_catalog(tmp_path)
+    m = match_intent("Count failures by machine in curing", cat)
+    assert m["intent"] == "failures_by_machine" and m["confidence"] >= CONFIDENCE_THRESHOLD
+    assert con.execute(m["sql"]).fetchall() == [("MC01", 5, 15, 5 / 15), ("MC02", 5, 15, 5 / 15)]
+
+    m = match_intent("average temperature for machine MC02 since 2025-08-21", cat)
+    assert m["intent"] == "metric_average"
+    assert m["slots"]["metric"] == "RTD1_Temp_C" and m["slots"]["machine"] == "MC02"
+    assert con.execute(m["sql"]).fetchone()[:2] == ("MC02", 125.0)
+
+    m = match_intent("show the last 3 records", cat)
+    assert m["slots"]["limit"] == 3 and m["slots"]["table"] == "cure_table1"
+    assert len(con.execute(m["sql"]).fetchall()) == 3
+    assert match_intent("average o2 purity", cat)["slots"] == {
+        "table": "o2_gas_data_fclm", "machine": None, "date_range": None, "metric": "O2_Purity_%", "limit": None}
+    con.close()
+
+def test_unmatched_questions_go_to_the_llm(tmp_path):
+    con, cat = make_catalog(tmp_path)
+    assert match_intent("Drop table cure_table1", cat) is None
+    assert match_intent("Why is the weather nice?", cat) is None
+    # Cross-table questions match a template but not confidently
+    m = match_intent("compare failures in curing versus o2 per lot", cat)
+    assert m["confidence"] < CONFIDENCE_THRESHOLD
+    con.close()
+
+def test_default_table_and_uncovered_tables_are_not_confident(tmp_path):
+    con, _ = make_catalog(tmp_path)
+    con.execute("CREATE TABLE lot_lineage (Lot_ID VARCHAR, Cure_ID VARCHAR)")
+    con.execute("CREATE TABLE monthly_failures_summary (month DATE, failures BIGINT)")
+    catalog.invalidate()
+    cat = catalog.get_catalog(con, tmp_path / "fclm.duckdb")
+    # No table named: the DEFAULT_TABLE guess is left to the LLM when one is configured
+    for question in ("status distribution of the gas system", "daily counts for the gas line"):
+        m = match_intent(question, cat)
+        assert m["slots"]["table"] == "cure_table1" and m["confidence"] < CONFIDENCE_THRESHOLD
+    # A table the templates do not cover is never answered from another one
+    assert match_intent("show latest 5 records from lot_lineage", cat) is None
+    assert match_intent("monthly failures summary by machine", cat) is None
+    con.close()
@@ -0,0 +1,34 @@
+"""
+Unit tests for the single-pass data-quality profiler
+"""
+import duckdb
+from services import quality
+
+def _counts(profile, column):
+    return profile[profile["column_name"] == column].iloc[0]
+
+def test_full_then_incremental_profile(tmp_path):
+    con = duckdb.connect(str(tmp_path / "fclm.duckdb"))
+    con.execute("CREATE TABLE cure_table1 AS SELECT 'C' || range AS Cure_ID, "
+                "CASE WHEN range = 5 THEN 'not a date' ELSE '2025-01-01' END AS DateTime, "
+                "CASE WHEN range = 99 THEN 1000.0 WHEN range % 10 = 0 THEN NULL ELSE 40.0 + range % 5 END AS Pressure_psi "
+                "FROM range(100)")
+    quality.profile_tables(con)
+    full = quality.load_profile(con, "cure_table1")
+    assert _counts(full, "Pressure_psi")["null_count"] == 10
+    assert _counts(full, "Pressure_psi")["iqr_outliers"] == 1
+    assert _counts(full, "DateTime")["nonconforming"] == 1
+    assert _counts(full, "Cure_ID")["duplicate_keys"] == 0
+
+    # Two new rows: one repeats an existing key, one has a null pressure
+    con.execute("INSERT INTO cure_table1 VALUES ('C1', '2025-01-02', 41.0), ('C200', '2025-01-02', NULL)")
+    quality.profile_tables(con, ["cure_table1"], incremental=True)
+    inc = quality.load_profile(con, "cure_table1")
+    assert inc["row_count"].iloc[0] == 102
+    assert inc["max_rowid"].iloc[0] == 101
+    assert _counts(inc, "Pressure_psi")["null_count"] == 11
+    assert _counts(inc, "Cure_ID")["duplicate_keys"] == 1
+
+    summary = quality.summarize(inc)
+    assert summary.iloc[0]["nonconforming"] == 1
+    con.close()
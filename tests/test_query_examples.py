@@ -0,0 +1,34 @@
+"""
+Unit tests for the validated question→SQL example store and few-shot retrieval
+"""
+from services.llm_backends import question_of
+from services.query_examples import ExampleStore, few_shot_text, question_key
+
+def test_record_lookup_and_similar(tmp_path):
+    store = ExampleStore(tmp_path / "examples.sqlite")
+    store.record("Average humidity per machine in curing", "SELECT Machine_ID, AVG(Humidity) FROM cure_table1 GROUP BY 1",
+                 success=True, latency_ms=12.5, row_count=4)
+    store.record("Oxygen purity trend for MC02", "SELECT DateTime, \"O2_Purity_%\" FROM o2_gas_data_fclm", success=True)
+    store.record("Which lots leaked?", "SELECT lot_id FROM lot_lineage WHERE leaks > 0", success=True)
+
+    # Same words, different case, punctuation and plurals
+    hit = store.lookup("average HUMIDITY by machines in curing?")
+    assert hit["sql"].startswith("SELECT Machine_ID") and hit["row_count"] == 4
+    assert store.lookup("Average humidity per machine in gas mixing") is None
+
+    similar = store.similar("average humidity per operator in curing")
+    assert similar[0]["question"] == "Average humidity per machine in curing"
+    assert all(e["question"] != "Which lots leaked?" for e in similar)
+
+    # A failure retires only the SQL that failed; a later success restores the question
+    store.record("Which lots leaked", "SELECT lot_id FROM lot_lineage WHERE leaks > 0", success=False)
+    assert store.lookup("Which lots leaked?") is None
+    store.record("which lots leaked", "SELECT lot_id FROM lot_lineage WHERE leak_count > 0", success=True)
+    assert store.lookup("Which lots leaked?")["sql"].endswith("leak_count > 0")
+    assert len(store.examples(success_only=False)) == 3
+
+def test_few_shot_prompt_keeps_the_asked_question_last():
+    shots = few_shot_text([{"question": "Failures by machine", "sql": "SELECT 1"}])
+    prompt = f"Schema\n\n{shots}\n\nQuestion: Failures by lot\nSQL:"
+    assert question_of(prompt) == "Failures by lot"
+    assert question_key("Show me the failures by machine!") == "failure machine"
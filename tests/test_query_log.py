@@ -0,0 +1,39 @@
+"""
+Unit tests for the append-only query log
+"""
+import sqlite3, threading
+from services.query_log import SYNTHETIC_SOURCES, QueryLog
+
+def test_concurrent_appends_and_reads(tmp_path):
+    log = QueryLog(tmp_path / "log.sqlite", flush_interval=0.05)
+
+    def session(user):
+        for i in range(50):
+            log.log("Failures by machine" if i % 2 else f"Rows of lot {user}-{i}", "SELECT 1", user=user,
+                    source="test", latency_ms=i, row_count=1, cache_hit=i % 4 == 1)
+
+    threads = [threading.Thread(target=session, args=(f"u{n}",)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    log.log("Drop everything", "DROP TABLE x", user="u0", source="test", error=ValueError("Only SELECT"))
+    log.flush()
+
+    assert sqlite3.connect(log.path).execute("SELECT COUNT(*) FROM query_log").fetchone()[0] == 201
+    assert log.dropped == 0
+    assert log.frequent(1)[0]["question"] == "Failures by machine" and log.frequent(1)[0]["n"] == 100
+    recent = log.recent(5, user="u1")
+    assert len(recent) == 5 and len({r["question"] for r in recent}) == 5
+    assert all(r["question"] != "Drop everything" for r in log.recent(300))
+    usage = log.usage().iloc[0]
+    assert usage["queries"] == 201 and usage["errors"] == 1 and usage["cache_hits"] == 52 and usage["users"] == 4
+
+def test_frequent_skips_synthetic_sources(tmp_path):
+    log = QueryLog(tmp_path / "log.sqlite", flush_interval=0.05)
+    for _ in range(3):
+        log.log("Failures by machine", "SELECT 1", source="benchmark")
+    log.log("Status distribution", "SELECT 2", source="powerbi")
+    log.flush()
+    assert log.frequent(5)[0]["question"] == "Failures by machine"
+    assert [e["question"] for e in log.frequent(5, exclude_sources=SYNTHETIC_SOURCES)] == ["Status distribution"]
@@ -0,0 +1,44 @@
+"""
+Unit tests for the shared Streamlit database handle
+"""
+import duckdb, subprocess, sys, time
+from lib.resources import MAX_LEASE_S, SharedDatabase
+
+def test_cursors_are_shared_per_owner_and_released_when_idle(tmp_path):
+    path = str(tmp_path / "fclm.duckdb")
+    duckdb.connect(path).execute("CREATE TABLE t AS SELECT 1 AS a").close()
+    db = SharedDatabase(path, idle_s=0.2)
+    alice, bob = {}, {}
+    cur = db.cursor(alice)
+    assert db.cursor(alice) is cur and db.cursor(bob) is not cur
+    assert cur.execute("SELECT a FROM t").fetchall() == [(1,)]
+
+    # Once idle, another process can take the write lock; the next use reopens with new cursors
+    time.sleep(0.5)
+    write = "import duckdb, sys; duckdb.connect(sys.argv[1]).execute('INSERT INTO t VALUES (2)')"
+    subprocess.run([sys.executable, "-c", write, path], check=True)
+    renewed = db.cursor(alice)
+    assert renewed is not cur and db.generation == 2
+    assert renewed.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2
+    db.close()
+
+def test_leased_handles_are_not_reaped(tmp_path):
+    path = str(tmp_path / "fclm.duckdb")
+    duckdb.connect(path).execute("CREATE TABLE t AS SELECT range AS a FROM range(10)").close()
+    now = [0.0]
+    db = SharedDatabase(path, idle_s=60, clock=lambda: now[0])
+    cur = db.cursor({})
+    # A result that is not fetched yet holds the lease however long it takes
+    cur.execute("SELECT SUM(a) FROM t")
+    now[0] += 120
+    assert db.in_use() and not db._reap(db.generation) and db._con is not None
+    assert cur.fetchone()[0] == 45 and not db.in_use()
+    now[0] += 59
+    assert not db._reap(db.generation)
+    now[0] += 1
+    assert db._reap(db.generation) and db._con is None
+
+    # A result left unfetched for more than MAX_LEASE_S no longer pins the file
+    db.cursor({}).execute("SELECT a FROM t")
+    now[0] += MAX_LEASE_S
+    assert not db.in_use() and db._reap(db.generation) and db._con is None
@@ -0,0 +1,36 @@
+"""
+Unit tests for the incrementally maintained KPI rollups
+"""
+import duckdb, pytest
+from services import rollups
+
+def test_rollups_merge_appended_rows(tmp_path):
+    con = duckdb.connect(str(tmp_path / "fclm.duckdb"))
+    con.execute("CREATE TABLE o2_gas_data_fclm AS SELECT "
+                "strftime(TIMESTAMP '2025-08-30 00:00:00' + range * INTERVAL 1 HOUR, '%-m/%-d/%y %-H:%M') AS DateTime, "
+                "CASE WHEN range % 4 = 0 THEN 'Fail' ELSE 'Success' END AS Status, "
+                "'GMC0' || (range % 2 + 1) AS Machine_ID FROM range(96)")
+    assert rollups.update_rollups(con) == {"o2_gas_data_fclm": 96}
+
+    con.execute("INSERT INTO o2_gas_data_fclm VALUES ('9/2/25 10:00', 'Fail', 'GMC01'), ('9/3/25 9:00', 'Success', 'GMC03')")
+    assert rollups.update_rollups(con) == {"o2_gas_data_fclm": 2}
+
+    by_machine = rollups.kpi("failures_by_machine", "o2_gas_data_fclm", con=con)
+    assert by_machine.set_index("machine")["failures"].to_dict() == {"GMC01": 25, "GMC02": 0, "GMC03": 0}
+    monthly = rollups.kpi("monthly_throughput", con=con)
+    assert monthly["month"].dt.strftime("%Y-%m-%d").tolist() == ["2025-08-01", "2025-09-01"]
+    assert monthly["count"].tolist() == [48, 50]
+    days = rollups.kpi("daily_throughput", start="2025-09-02", con=con)
+    assert days["count"].tolist() == [25, 1]
+    summary = con.execute(f"SELECT SUM(failures), SUM(total) FROM {rollups.SUMMARY_VIEW}").fetchone()
+    assert summary == (25, 98)
+    assert rollups.table_totals(con) == {"o2_gas_data_fclm": 98}
+
+    # A rebuild after the table is reloaded starts from scratch
+    con.execute("CREATE OR REPLACE TABLE o2_gas_data_fclm AS SELECT * FROM o2_gas_data_fclm LIMIT 10")
+    rollups.update_rollups(con, rebuild=True)
+    assert rollups.table_totals(con) == {"o2_gas_data_fclm": 10}
+
+    with pytest.raises(ValueError):
+        rollups.kpi("no_such_kpi", con=con)
+    con.close()
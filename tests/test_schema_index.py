@@ -0,0 +1,30 @@
+"""
+Unit tests for the BM25 schema retrieval behind NL→SQL prompts
+"""
+import duckdb
+from services import catalog, schema_index, stats
+
+def test_prompt_keeps_only_relevant_schema(tmp_path):
+    path = tmp_path / "fclm.duckdb"
+    con = duckdb.connect(str(path))
+    con.execute("CREATE TABLE cure_table1 AS SELECT range AS Cure_ID, 'MC01' AS Machine_ID, 'Success' AS Status, "
+                "40.0 + range AS Humidity, 120.0 AS RTD1_Temp_C, 'OP1' AS Operator_ID FROM range(10)")
+    con.execute("CREATE TABLE o2_gas_data_fclm AS SELECT 'GMC01' AS Machine_ID, 'Open' AS Valve_Status, "
+                "99.0 AS \"O2_Purity_%\", 120 AS FlowRate_sccm FROM range(10)")
+    stats.compute_column_stats(con)
+    catalog.invalidate()
+
+    index = schema_index.build_index(con, path)
+    assert index.select("average oxygen purity per machine", max_tables=1) == {
+        "o2_gas_data_fclm": ["Machine_ID", "O2_Purity_%"]}
+    assert list(index.select("humidity trend in curing")) == ["cure_table1"]
+
+    prompt = schema_index.build_prompt("humidity trend in curing", con=con, db_path=path)
+    assert "Humidity DECIMAL(21,1) [40.0 .. 49.0]" in prompt["prompt"]
+    assert "FlowRate_sccm" not in prompt["prompt"] and "Operator_ID" not in prompt["prompt"]
+    # Same selection, same prefix: only the question changes
+    other = schema_index.build_prompt("show curing humidity", con=con, db_path=path)
+    assert other["selection"] == prompt["selection"] and other["prefix"] == prompt["prefix"]
+    assert prompt["prompt"].startswith(schema_index.PROMPT_PREFIX)
+    assert prompt["prompt"].endswith("Question: humidity trend in curing\nSQL:")
+    con.close()
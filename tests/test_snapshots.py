@@ -0,0 +1,67 @@
+"""
+Unit tests for Parquet snapshots and time-travel lookup
+"""
+import duckdb
+import pytest
+from services import snapshots
+
+def make_db(rows):
+    con = duckdb.connect()
+    con.execute("CREATE TABLE cure_table1 (Machine_ID VARCHAR, Status VARCHAR)")
+    con.executemany("INSERT INTO cure_table1 VALUES (?, ?)", rows)
+    return con
+
+def test_snapshot_restore_moves_pointer(tmp_path):
+    con = make_db([("MC01", "Fail")])
+    v1 = snapshots.create_snapshot(con, snapshot_dir=tmp_path)
+    con.execute("INSERT INTO cure_table1 VALUES ('MC02', 'Success')")
+    v2 = snapshots.create_snapshot(con, snapshot_dir=tmp_path)
+    assert snapshots.current_version(tmp_path) == v2
+    assert not snapshots.needs_snapshot_connection(v2, tmp_path)
+
+    snapshots.restore_snapshot(v1, snapshot_dir=tmp_path)
+    assert snapshots.current_version(tmp_path) == v1
+    assert snapshots.needs_snapshot_connection(v1, tmp_path)
+    old = snapshots.snapshot_connection(v1, snapshot_dir=tmp_path)
+    assert old.execute("SELECT COUNT(*) FROM cure_table1").fetchone()[0] == 1
+
+def test_resolve_version_by_timestamp(tmp_path):
+    con = make_db([("MC01", "Fail")])
+    v1 = snapshots.create_snapshot(con, snapshot_dir=tmp_path)
+    created = snapshots.list_snapshots(tmp_path)[0]["created_at"]
+    assert snapshots.resolve_version(v1, tmp_path) == v1
+    assert snapshots.resolve_version(created, tmp_path) == v1
+    with pytest.raises(ValueError):
+        snapshots.resolve_version("2000-01-01T00:00:00", tmp_path)
+
+def test_retention_keeps_newest(tmp_path):
+    con = make_db([("MC01", "Fail")])
+    versions = [snapshots.create_snapshot(con, snapshot_dir=tmp_path, retention=2) for _ in range(4)]
+    kept = [v["version"] for v in snapshots.list_snapshots(tmp_path)]
+    assert kept == versions[-2:]
+    assert not (tmp_path / versions[0]).exists()
+
+def test_agent_queries_follow_the_restored_snapshot(tmp_path, monkeypatch):
+    import functools
+    import agent as agent_module
+    path = tmp_path / "fclm.duckdb"
+    con = duckdb.connect(str(path))
+    con.execute("CREATE TABLE cure_table1 (Machine_ID VARCHAR, Status VARCHAR)")
+    con.execute("INSERT INTO cure_table1 VALUES ('MC01', 'Fail')")
+    v1 = snapshots.create_snapshot(con, snapshot_dir=tmp_path)
+    con.execute("INSERT INTO cure_table1 VALUES ('MC02', 'Success')")
+    snapshots.create_snapshot(con, snapshot_dir=tmp_path)
+    for name in ("current_version", "needs_snapshot_connection", "snapshot_connection", "resolve_version"):
+        monkeypatch.setattr(agent_module, name, functools.partial(getattr(snapshots, name), snapshot_dir=tmp_path))
+    agent = agent_module.FCLMAgent(str(path), con=con)
+    count = "SELECT COUNT(*) AS n FROM cure_table1"
+    assert agent.run_query(count, validate=False)["n"][0] == 2
+    snapshots.restore_snapshot(v1, snapshot_dir=tmp_path)
+    assert agent.run_query(count, validate=False)["n"][0] == 1
+
+def test_unknown_as_of_is_a_404():
+    from fastapi.testclient import TestClient
+    from api.main import app
+    client = TestClient(app)
+    r = client.post("/query", json={"sql": "SELECT 1", "as_of": "not-a-snapshot"}, headers={"X-API-Key": "demo-key"})
+    assert r.status_code == 404 and "not-a-snapshot" in r.json()["detail"]
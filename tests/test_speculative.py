@@ -0,0 +1,54 @@
+"""
+Unit tests for speculative execution of /powerbi/query
+"""
+import duckdb, time
+from services import db, speculative
+from services.speculative import Speculation, normalize_sql
+
+def use_db(tmp_path, monkeypatch):
+    path = tmp_path / "fclm.duckdb"
+    con = duckdb.connect(str(path))
+    con.execute("CREATE TABLE cure_table1 AS SELECT 'MC0' || (range % 2 + 1) AS Machine_ID, range % 3 = 0 AS is_failure FROM range(30)")
+    con.close()
+    monkeypatch.setattr(db, "connect", lambda as_of=None: duckdb.connect(str(path), read_only=True))
+
+SQL = "SELECT Machine_ID, SUM(CAST(is_failure AS INTEGER)) AS failures FROM cure_table1 GROUP BY Machine_ID ORDER BY Machine_ID"
+
+def test_normalize_sql():
+    assert normalize_sql('select "Machine_ID" ,  count(*)\nFROM cure_table1;') == normalize_sql("SELECT Machine_ID, COUNT(*) FROM cure_table1")
+    assert normalize_sql("SELECT 1 WHERE Status = 'Fail'") != normalize_sql("SELECT 1 WHERE Status = 'FAIL'")
+
+def test_hit_and_miss(tmp_path, monkeypatch):
+    use_db(tmp_path, monkeypatch)
+    before = speculative.metrics()
+    spec = Speculation(SQL)
+    df = spec.result_for(SQL.lower().replace(" from ", "\nFROM "))
+    assert df.values.tolist() == [["MC01", 5], ["MC02", 5]]
+
+    spec = Speculation(SQL)
+    assert spec.result_for("SELECT COUNT(*) FROM cure_table1") is None
+    spec.future.exception()
+    after = speculative.metrics()
+    assert after["hits"] - before["hits"] == 1 and after["misses"] - before["misses"] == 1
+
+def test_budget_interrupts_runaway_speculation(tmp_path, monkeypatch):
+    use_db(tmp_path, monkeypatch)
+    start = time.perf_counter()
+    spec = Speculation("SELECT SUM(a.range * b.range) FROM range(100000) a, range(100000) b", budget_s=0.2)
+    assert spec.result_for(spec.sql) is None
+    assert time.perf_counter() - start < 5
+
+def test_query_uses_speculative_result(tmp_path, monkeypatch):
+    use_db(tmp_path, monkeypatch)
+    monkeypatch.setattr(speculative.llm_backends, "configured", lambda: True)
+    monkeypatch.setattr(speculative, "match_intent", lambda q: {"sql": SQL, "confidence": 0.4})
+    executed = []
+    monkeypatch.setattr(db, "safe_execute_select", lambda sql, as_of=None: executed.append(sql))
+
+    def translate(question):
+        time.sleep(0.1)
+        return {"sql": SQL + ";", "rationale": "llm", "viz_hints": ["table"]}
+
+    result = speculative.query("which machines fail most compared to last week", translate=translate)
+    assert result["columns"] == ["Machine_ID", "failures"] and len(result["rows"]) == 2
+    assert executed == []
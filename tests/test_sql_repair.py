@@ -0,0 +1,77 @@
+"""
+Unit tests for EXPLAIN validation and the bounded SQL repair loop
+"""
+import duckdb
+from services import catalog
+from services.sql_repair import repair, validate
+
+def make_db(tmp_path):
+    path = tmp_path / "fclm.duckdb"
+    con = duckdb.connect(str(path))
+    con.execute("CREATE TABLE cure_table1 AS SELECT 'MC0' || (range % 2 + 1) AS Machine_ID, 'Fail' AS Status, 50.0 AS Humidity FROM range(10)")
+    con.execute("CREATE TABLE o2_gas_data_fclm AS SELECT 'MC01' AS Machine_ID, 99.5 AS \"O2_Purity_%\", 30.0 AS Pressure_psi")
+    catalog.invalidate()
+    return con, catalog.get_catalog(con, path)
+
+def test_validate_does_not_execute(tmp_path):
+    con, _ = make_db(tmp_path)
+    assert validate("SELECT Machine_ID FROM cure_table1", con) is None
+    assert "Presure_psi" in validate("SELECT Presure_psi FROM o2_gas_data_fclm", con)
+    # EXPLAIN plans without running: an error that only appears at run time is not raised
+    assert validate("SELECT CAST(Status AS INTEGER) FROM cure_table1", con) is None
+
+def test_local_repairs(tmp_path):
+    con, cat = make_db(tmp_path)
+    cases = {
+        'SELECT "machine id", AVG("pressure-psi") FROM o2_gas_data_fclm GROUP BY 1': 2,
+        "SELECT AVG(O2_Purity_%) FROM o2_gas_data_fclm": 1,
+        "SELECT c.machine_id FROM Cure_Table_1 c WHERE Status = 'machine_id'": 1,
+    }
+    for sql, fixes in cases.items():
+        r = repair(sql, con=con, catalog=cat, max_repairs=3)
+        assert r["valid"] and len(r["repairs"]) == fixes and {f["kind"] for f in r["repairs"]} == {"local"}, r
+        con.execute(r["sql"]).fetchall()
+    assert "'machine_id'" in repair("SELECT c.machine_id FROM Cure_Table_1 c WHERE Status = 'machine_id'", con=con, catalog=cat)["sql"]
+
+def test_misspellings_go_to_the_llm_not_a_silent_rewrite(tmp_path):
+    con, cat = make_db(tmp_path)
+    # Presure_psi is close to Pressure_psi, but guessing could as well pick the wrong column
+    r = repair("SELECT AVG(Presure_psi) FROM o2_gas_data_fclm", con=con, catalog=cat)
+    assert not r["valid"] and r["repairs"] == []
+    prompts = []
+    def llm_fix(prompt):
+        prompts.append(prompt)
+        return "SELECT AVG(Pressure_psi) FROM o2_gas_data_fclm"
+    r = repair("SELECT AVG(Presure_psi) FROM o2_gas_data_fclm", con=con, catalog=cat, llm_fix=llm_fix)
+    assert r["valid"] and r["repairs"][0]["kind"] == "llm"
+    assert 'Closest existing columns for "Presure_psi": Pressure_psi' in prompts[0]
+    repair("SELECT * FROM cure_tabel1", con=con, catalog=cat, llm_fix=lambda p: prompts.append(p) or "SELECT 1")
+    assert 'Closest existing tables for "cure_tabel1": cure_table1' in prompts[1]
+
+def test_llm_repair_is_bounded(tmp_path):
+    con, cat = make_db(tmp_path)
+    prompts = []
+    def llm_fix(prompt):
+        prompts.append(prompt)
+        return "```sql\nSELECT Machine_ID, COUNT(*) FROM cure_table1 GROUP BY 1\n```"
+    r = repair("SELECT Machine_ID, COUNT(*) FROM cure_table1 GROUP BY wrong_thing", con=con, catalog=cat, llm_fix=llm_fix)
+    assert r["valid"] and r["repairs"][0]["kind"] == "llm"
+    assert "Table cure_table1: Machine_ID, Status, Humidity" in prompts[0]
+
+    # An LLM that keeps producing bad SQL gets exactly max_repairs tries
+    guesses = iter(["SELECT nonsense2 FROM cure_table1", "SELECT nonsense3 FROM cure_table1", "SELECT Status FROM cure_table1"])
+    r = repair("SELECT nonsense FROM cure_table1", con=con, catalog=cat, llm_fix=lambda p: next(guesses), max_repairs=2)
+    assert not r["valid"] and len(r["repairs"]) == 2 and r["sql"].endswith("nonsense3 FROM cure_table1")
+
+def test_unbindable_generated_sql_is_a_422(monkeypatch):
+    from fastapi.testclient import TestClient
+    from api.main import app
+    from services import nl2sql
+    monkeypatch.setattr(nl2sql.llm_backends, "configured", lambda: True)
+    monkeypatch.setattr(nl2sql, "llm_sql", lambda question: "SELECT no_such_column FROM cure_table1")
+    monkeypatch.setattr(nl2sql, "gateway_fix", lambda prompt: "SELECT still_no_such_column FROM cure_table1")
+    client = TestClient(app)
+    for path in ("/nl2sql", "/export"):
+        r = client.post(path, json={"question": "how green were the widgets", "format": "csv"},
+                        headers={"X-API-Key": "demo-key"})
+        assert r.status_code == 422 and "does not bind" in r.json()["detail"], r.text
@@ -0,0 +1,43 @@
+"""
+Unit tests for the precomputed column statistics store
+"""
+import duckdb
+from services import stats
+
+def test_compute_and_load_column_stats(tmp_path):
+    path = tmp_path / "fclm.duckdb"
+    con = duckdb.connect(str(path))
+    con.execute("CREATE TABLE cure_table1 AS SELECT range AS Cure_No, "
+                "CASE WHEN range % 3 = 0 THEN 'Fail' ELSE 'Success' END AS Status, "
+                "CASE WHEN range = 99 THEN 1000.0 WHEN range % 10 = 0 THEN NULL ELSE 40.0 + range % 5 END AS Pressure_psi "
+                "FROM range(100)")
+    stats.compute_column_stats(con)
+
+    df = stats.table_stats("cure_table1", con, path)
+    assert list(df["column_name"]) == ["Cure_No", "Status", "Pressure_psi"]
+    pressure = stats.column_stats("Pressure_psi", "cure_table1", con, path)
+    assert pressure["row_count"] == 100
+    assert pressure["null_count"] == 10
+    assert pressure["max_value"] == "1000.0"
+    assert pressure["outlier_count"] == 1
+    assert pressure["histogram"] is not None
+    status = stats.column_stats("Status", con=con, db_path=path)
+    assert status["distinct_count"] == 2
+    assert "values: " in stats.describe_column(status)
+    assert "Table cure_table1 (100 rows):" in stats.prompt_context(con=con, db_path=path)
+
+def test_only_stats_of_the_current_data_version_are_read(tmp_path):
+    path = tmp_path / "fclm.duckdb"
+    con = duckdb.connect(str(path))
+    con.execute("CREATE TABLE a AS SELECT range AS x, 'k' || (range % 3) AS k FROM range(10)")
+    con.execute("CREATE TABLE b AS SELECT range AS y FROM range(5)")
+    stats.compute_column_stats(con, version="old")
+    # Stats of other data (e.g. before a streaming append or snapshot restore) are not served
+    assert stats.load_column_stats(con, path).empty and stats.column_values("a", con) == {}
+
+    con.execute("INSERT INTO a SELECT range, 'k9' FROM range(10, 20)")
+    stats.compute_column_stats(con, ["a"], version=stats.data_version())
+    df = stats.load_column_stats(con, path)
+    # Recomputed for the changed table, carried forward for the other one
+    assert df.groupby("table_name")["row_count"].first().to_dict() == {"a": 20, "b": 5}
+    assert stats.column_values("a", con)["k"][0] == "k9"
@@ -0,0 +1,66 @@
+"""
+Unit tests for micro-batch ingestion from a landing directory
+"""
+import duckdb, subprocess, sys
+from services.streaming import MicroBatchIngestor
+from services.versioning import data_version
+
+HEADER = "Cure_ID,Machine_ID,Status\n"
+
+def make_ingestor(tmp_path, **kwargs):
+    landing = tmp_path / "landing"
+    landing.mkdir()
+    ingestor = MicroBatchIngestor(landing, db_path=tmp_path / "fclm.duckdb", metrics_path=tmp_path / "metrics.json",
+                                  version_file=tmp_path / "data_version.json", **kwargs)
+    return landing, ingestor
+
+def count(tmp_path, table="cure_table1"):
+    con = duckdb.connect(str(tmp_path / "fclm.duckdb"), read_only=True)
+    try:
+        return con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        con.close()
+
+def test_growing_file_is_ingested_in_batches(tmp_path):
+    landing, ingestor = make_ingestor(tmp_path, batch_size=2, max_latency=60)
+    csv = landing / "cure_table1.csv"
+    csv.write_text(HEADER + "C1,MC01,Fail\nC2,MC02,Success\nC3,MC0")  # last line still being written
+    before = data_version(tmp_path / "data_version.json")
+    ingestor.poll()
+    assert ingestor.flush() == 2
+    assert count(tmp_path) == 2
+    assert data_version(tmp_path / "data_version.json") != before
+
+    with open(csv, "a") as f:
+        f.write("3,Rework\n")
+    ingestor.poll()
+    assert ingestor.flush() == 0  # below batch size and latency target
+    assert ingestor.flush(force=True) == 1
+    assert count(tmp_path) == 3
+    assert ingestor.metrics["rows_total"] == 3
+    assert ingestor.metrics["tables"] == {"cure_table1": 3}
+
+def test_restart_resumes_from_committed_offset(tmp_path):
+    landing, ingestor = make_ingestor(tmp_path, batch_size=1)
+    (landing / "cure_table1.csv").write_text(HEADER + "C1,MC01,Fail\n")
+    ingestor.poll()
+    ingestor.flush()
+    restarted = MicroBatchIngestor(landing, db_path=tmp_path / "fclm.duckdb", metrics_path=None,
+                                   version_file=tmp_path / "data_version.json")
+    restarted.poll()
+    assert restarted.flush(force=True) == 0
+    assert count(tmp_path) == 1
+
+def test_locked_database_keeps_lines_and_retries(tmp_path):
+    landing, ingestor = make_ingestor(tmp_path, batch_size=1, max_latency=60)
+    (landing / "cure_table1.csv").write_text(HEADER + "C1,MC01,Fail\n")
+    # Another process (e.g. a Streamlit page) holding the file blocks the write lock
+    hold = "import duckdb, sys, time; con = duckdb.connect(sys.argv[1], read_only=True); print('ok', flush=True); time.sleep(1.5)"
+    reader = subprocess.Popen([sys.executable, "-c", hold, str(tmp_path / "fclm.duckdb")], stdout=subprocess.PIPE)
+    reader.stdout.readline()
+    waits = [ingestor.step(), ingestor.step()]
+    assert waits[1] > waits[0] > ingestor.poll_interval and ingestor.metrics["lock_waits"] == 2
+    assert len(ingestor.files[(landing / "cure_table1.csv").as_posix()]["lines"]) == 1
+    reader.wait()
+    assert ingestor.step() == ingestor.poll_interval
+    assert count(tmp_path) == 1
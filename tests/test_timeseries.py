@@ -0,0 +1,57 @@
+"""
+Unit tests for the time-bucketed, downsampled time-series service
+"""
+import duckdb, numpy as np, pandas as pd, pytest
+from services import timeseries
+
+def _readings(con, n=200_000):
+    # One reading per second with a single spike that downsampling must keep
+    con.execute(f"CREATE TABLE o2_gas_data_fclm AS SELECT "
+                f"strftime(TIMESTAMP '2025-08-30 00:00:00' + range * INTERVAL 1 SECOND, '%-m/%-d/%y %-H:%M:%S') AS DateTime, "
+                f"CASE WHEN range = 123457 THEN 120.0 ELSE 95.0 + sin(range / 5000.0) END AS \"O2_Purity_%\", "
+                f"'GMC0' || (range % 2 + 1) AS Machine_ID FROM range({n})")
+
+def test_bucket_width_follows_range_and_pixels():
+    assert timeseries.bucket_seconds(3600, 800) == 5
+    assert timeseries.bucket_seconds(86400 * 30, 400) == 3 * 3600
+    assert timeseries.bucket_seconds(86400 * 3650, 100) == 37 * 86400
+    assert timeseries.bucket_label(300) == "5 minutes" and timeseries.bucket_label(86400) == "1 day"
+
+def test_misaligned_range_stays_within_the_pixel_budget():
+    # 999 s from 00:00:03: 199.8 five-second widths, but they touch 201 round five-second buckets
+    con = duckdb.connect()
+    con.execute("CREATE TABLE r AS SELECT TIMESTAMP '2025-08-30 00:00:03' + (range // 10) * INTERVAL 1 SECOND AS t, "
+                "random() AS v FROM range(10_000)")
+    assert len(timeseries.series(con, "r", "t", width_px=200)["points"]) <= 200
+    assert len(timeseries.series(con, "r", "t", "v", width_px=400)["points"]) <= 400
+    assert len(timeseries.series(con, "r", "t", "v", width_px=200, mode="avg")["points"]) <= 200
+
+def test_bad_table_and_bounds_are_value_errors():
+    con = duckdb.connect()
+    _readings(con, n=10)
+    with pytest.raises(ValueError, match="Unknown table 'nope'"):
+        timeseries.series(con, "nope", "DateTime")
+    with pytest.raises(ValueError, match="Invalid start 'yesterday'"):
+        timeseries.series(con, "o2_gas_data_fclm", "DateTime", start="yesterday")
+
+def test_series_is_bounded_and_keeps_spikes():
+    con = duckdb.connect()
+    _readings(con)
+    for mode in timeseries.MODES:
+        result = timeseries.series(con, "o2_gas_data_fclm", "DateTime", "O2_Purity_%", width_px=400, mode=mode)
+        assert result["rows"] == 200_000 and 0 < len(result["points"]) <= 400
+        assert result["points"]["time"].is_monotonic_increasing
+    minmax = timeseries.series(con, "o2_gas_data_fclm", "DateTime", "O2_Purity_%", width_px=400)
+    assert minmax["points"]["value"].max() == 120.0
+    counts = timeseries.series(con, "o2_gas_data_fclm", "DateTime", start="2025-08-30 01:00", end="2025-08-30 01:59:59",
+                               filters=(("Machine_ID", "in", ("GMC01",)),))
+    assert counts["rows"] == 1800 and counts["bucket"] == "5 seconds" and counts["points"]["value"].sum() == 1800
+
+def test_downsample_frame_and_lttb():
+    df = pd.DataFrame({"ts": pd.date_range("2025-08-01", periods=50_000, freq="min"),
+                       "v": np.r_[np.zeros(25_000), np.ones(25_000)]})
+    result = timeseries.downsample(df, "ts", "v", width_px=100)
+    assert len(result["points"]) <= 100 and set(result["points"]["value"]) == {0.0, 1.0}
+    x, y = np.arange(1000.0), np.sin(np.arange(1000.0) / 50)
+    keep = timeseries.lttb(x, y, 50)
+    assert len(keep) == 50 and keep[0] == 0 and keep[-1] == 999 and np.all(np.diff(keep) > 0)
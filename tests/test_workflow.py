@@ -0,0 +1,40 @@
+"""
+Unit tests for the DAG workflow executor behind FCLMAgent.multi_step_task
+"""
+import duckdb, pytest
+from agent import FCLMAgent
+from services import workflow
+
+@pytest.fixture
+def agent(tmp_path):
+    path = str(tmp_path / "fclm.duckdb")
+    con = duckdb.connect(path)
+    con.execute("CREATE TABLE cure_table1 AS SELECT range AS Cure_No, "
+                "CASE WHEN range % 3 = 0 THEN 'Fail' ELSE 'Success' END AS Status, "
+                "'MC0' || (range % 2 + 1) AS Machine_ID FROM range(30)")
+    con.close()
+    workflow.clear_cache()
+    return FCLMAgent(path)
+
+def test_steps_reference_upstream_outputs_and_cache(agent):
+    steps = [
+        {"id": "fails", "action": "run_query",
+         "args": {"sql": "SELECT Machine_ID, COUNT(*) AS n FROM cure_table1 WHERE Status = 'Fail' GROUP BY 1"}},
+        {"id": "total", "action": "run_query", "args": {"sql": "SELECT SUM(n) AS n FROM $fails"}},
+        {"id": "broken", "action": "no_such_action"},
+        {"id": "after_broken", "action": "guide_workflow", "args": {"workflow_name": "x"}, "depends_on": ["broken"]},
+    ]
+    report = agent.run_workflow(steps)
+    assert report["results"]["total"].to_pylist() == [{"n": 10}]
+    assert report["status"] == {"fails": "ok", "total": "ok", "broken": "failed", "after_broken": "skipped"}
+    assert set(report["timings"]) == {"fails", "total", "broken", "after_broken"}
+
+    assert agent.run_workflow(steps)["cached"] == ["fails", "total"]
+    assert agent.multi_step_task(steps)[1]["n"].tolist() == [10]
+
+def test_cycles_and_unknown_dependencies_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        workflow.normalize([{"id": "a", "action": "run_query", "depends_on": ["b"]},
+                            {"id": "b", "action": "run_query", "args": {"sql": "SELECT * FROM $a"}}])
+    with pytest.raises(ValueError, match="unknown"):
+        workflow.normalize([{"id": "a", "action": "run_query", "depends_on": ["missing"]}])